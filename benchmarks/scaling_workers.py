@@ -0,0 +1,104 @@
+"""
+Benchmark of the scaling of the statistics computation with the number of worker processes.
+
+Synthetic sequences are generated once and the statistics of the same sequences are computed
+with each requested number of workers. Example:
+
+    python benchmarks/scaling_workers.py --workers 1 2 4 8 --n_sequences 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from genbenchQC.utils.encoding import SequenceBatch
+from genbenchQC.utils.statistics import SequenceStatistics
+
+
+def generate_sequences(n_sequences, min_length, max_length, seed=0):
+    """
+    Generate random ACGT sequences with uniformly distributed lengths.
+    @param n_sequences: Number of sequences.
+    @param min_length: Minimal length of a sequence.
+    @param max_length: Maximal length of a sequence.
+    @param seed: Seed of the random generator.
+    @return: SequenceBatch with the sequences.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(min_length, max_length + 1, size=n_sequences)
+    offsets = np.zeros(n_sequences + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    buffer = np.frombuffer(b'ACGT', dtype=np.uint8)[rng.integers(0, 4, size=int(offsets[-1]))]
+    return SequenceBatch(buffer, offsets)
+
+
+def time_statistics(sequences, workers, repeats, **kwargs):
+    """
+    Time the computation of the statistics of the sequences.
+    @param sequences: Sequences to compute the statistics of.
+    @param workers: Number of worker processes.
+    @param repeats: Number of repeated computations, the fastest one is reported.
+    @param kwargs: Other arguments of SequenceStatistics.
+    @return: The fastest time in seconds.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        SequenceStatistics(sequences, 'synthetic', 'synthetic', engine='numpy', workers=workers, **kwargs).compute()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(workers, n_sequences, min_length, max_length, repeats, kmer_sizes=None, seed=0):
+    """
+    Time the statistics of synthetic sequences for every number of workers and print the speedups.
+    @param workers: List of numbers of worker processes to time.
+    @param n_sequences: Number of synthetic sequences.
+    @param min_length: Minimal length of a sequence.
+    @param max_length: Maximal length of a sequence.
+    @param repeats: Number of repeated computations for each number of workers, the fastest one is reported.
+    @param kmer_sizes: K-mer sizes to count spectra for. Default: None.
+    @param seed: Seed of the synthetic sequences.
+    @return: A dictionary {workers: time in seconds}.
+    """
+    sequences = generate_sequences(n_sequences, min_length, max_length, seed)
+    print(f"{len(sequences)} sequences, {sequences.n_bases} bases")
+    print(f"{'workers':>8} {'time [s]':>10} {'speedup':>8} {'efficiency':>10}")
+
+    times = {}
+    for n_workers in workers:
+        times[n_workers] = time_statistics(sequences, n_workers, repeats, kmer_sizes=kmer_sizes)
+        speedup = times[workers[0]] / times[n_workers]
+        efficiency = speedup * workers[0] / n_workers
+        print(f"{n_workers:>8} {times[n_workers]:>10.2f} {speedup:>8.2f} {efficiency:>10.2f}")
+    return times
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the scaling of the statistics computation with the number of workers.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help='Numbers of worker processes to time, speedups are relative to the first one. Default: 1 2 4.')
+    parser.add_argument('--n_sequences', type=int, default=200000, help='Number of synthetic sequences. Default: 200000.')
+    parser.add_argument('--min_length', type=int, default=100, help='Minimal length of a sequence. Default: 100.')
+    parser.add_argument('--max_length', type=int, default=300, help='Maximal length of a sequence. Default: 300.')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Number of repeated computations for each number of workers, the fastest one is reported. Default: 3.')
+    parser.add_argument('--kmer_sizes', type=int, nargs='+', default=None, help='K-mer sizes to count spectra for. Default: none.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic sequences. Default: 0.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    run(workers = args.workers,
+        n_sequences = args.n_sequences,
+        min_length = args.min_length,
+        max_length = args.max_length,
+        repeats = args.repeats,
+        kmer_sizes = args.kmer_sizes,
+        seed = args.seed
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -31,6 +31,8 @@ setup(
     install_requires=requirements,
     extras_require={
         "develop": test_requirements,
+        "parquet": ['pyarrow>=10'],
+        "zstd": ['zstandard>=0.15'],
     },
     tests_require=["pytest"],
     test_suite='tests',
@@ -39,6 +41,8 @@ setup(
       evaluate_sequences=genbenchQC.evaluate_sequences:main
       evaluate_dataset=genbenchQC.evaluate_dataset:main
       evaluate_split=genbenchQC.evaluate_split:main
+      merge_statistics=genbenchQC.merge_statistics:main
+      pack_sequences=genbenchQC.pack_sequences:main
       ''',
     keywords=["genomic benchmarks", "deep learning", "machine learning",
       "computational biology", "bioinformatics", "genomics", "quality control"],
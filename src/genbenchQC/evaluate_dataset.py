@@ -3,19 +3,65 @@ import logging
 from pathlib import Path
 from itertools import combinations
 from typing import Optional
+import numpy as np
 import pandas as pd
 
-from genbenchQC.utils.statistics import SequenceStatistics
-from genbenchQC.utils.testing import flag_significant_differences
+from genbenchQC.utils.statistics import SequenceStatistics, accumulate_together
+from genbenchQC.utils.testing import flag_significant_differences, CHECK_STATISTICS
 from genbenchQC.report.report_generator import generate_json_report, generate_sequence_html_report, generate_simple_report, generate_dataset_html_report
-from genbenchQC.utils.input_utils import read_fasta, read_sequences_from_df, read_multisequence_df, read_csv_file, setup_logger
+from genbenchQC.report.report_generator import generate_columnar_report
+from genbenchQC.utils.input_utils import read_sequence_file, read_sequences_from_df, read_csv_file, setup_logger
+from genbenchQC.utils.input_utils import partition_by_label, iter_label_partitions
+from genbenchQC.utils.input_utils import iter_sequence_file, iter_csv_file, read_labels, is_sequence_file, INPUT_FORMATS, SEQUENCE_FORMATS
+from genbenchQC.utils.registry import STATISTIC_SLUGS
+from genbenchQC.utils.cache import StatisticsCache
+from genbenchQC.utils.snapshots import update_snapshots, snapshot_first_index
+from genbenchQC.utils.concatenation import concatenate_sequences
+from genbenchQC.utils.columnar import TABLE_FORMATS
+from genbenchQC.utils.fastq import QualityProfile
 
-def run_analysis(input_statistics, out_folder, report_types, seq_report_types, plot_type, flag_threshold):
+def get_requested_statistics(report_types, seq_report_types):
+    """
+    Statistics needed by the requested reports: all of them for per dataset reports,
+    otherwise only those compared by the checks and shown in the HTML report.
+    @return: List of statistic names, or None for all statistics.
+    """
+    if seq_report_types:
+        return None
+    statistics = {statistic for check in CHECK_STATISTICS.values() for statistic in check}
+    if 'html' in report_types:
+        statistics.add('Number of sequences left after deduplication')
+    # core statistics like 'Unique bases' are always computed
+    return [statistic for statistic in statistics if statistic != 'Unique bases']
+
+def use_cache(cache, input_statistics, input_files, accumulate=None, **selection):
+    """
+    Replace statistics by their cached version, or compute and cache them, see StatisticsCache.fetch_together.
+    @param input_statistics: List of SequenceStatistics, not computed yet.
+    @param input_files: List of paths to the input file of each of the statistics.
+    @param accumulate: Optional function accumulating a list of the statistics at once, e.g. in a single pass over their input.
+                       Without a cache, all statistics are accumulated with it.
+    @param selection: Other options selecting the sequences, they are part of the cache key.
+    @return: List of SequenceStatistics to compute.
+    """
+    if cache is None:
+        if accumulate is not None:
+            accumulate(input_statistics)
+        return input_statistics
+    keys = [cache.key([input_file], s, **selection) for input_file, s in zip(input_files, input_statistics)]
+    return cache.fetch_together(keys, input_statistics, accumulate)
+
+def run_analysis(input_statistics, out_folder, report_types, seq_report_types, plot_type, flag_threshold, kmer_threshold, snapshot_dir=None):
    
     out_folder = Path(out_folder)
 
+    if snapshot_dir is not None:
+        input_statistics = update_snapshots(input_statistics, snapshot_dir)
+
     # run individual analysis
-    for s in input_statistics:
+    for i, s in enumerate(input_statistics):
+        # keep the text of sequences shared with the previous datasets for the duplication check between them
+        s.track_shared_sequences(input_statistics[:i])
         stats, end_position = s.compute()
 
         if seq_report_types:
@@ -30,6 +76,10 @@ def run_analysis(input_statistics, out_folder, report_types, seq_report_types, p
                 json_report_path = out_folder / Path(filename + '_report.json')
                 generate_json_report(stats, json_report_path)
 
+            for table_format in TABLE_FORMATS:
+                if table_format in seq_report_types:
+                    generate_columnar_report(stats, out_folder / Path(filename + f'_report_{table_format}'), table_format)
+
             if 'html' in seq_report_types:
                 html_report_path = out_folder / Path(filename + '_report.html')
                 plots_path = out_folder / Path(filename + '_plots')
@@ -51,11 +101,14 @@ def run_analysis(input_statistics, out_folder, report_types, seq_report_types, p
             logging.debug(
                 f"Comparing datasets: {stat1.filename} vs {stat2.filename}")
 
+        # end position is unknown when sequence lengths were skipped, per position statistics are skipped with them
+        end_position = None if None in (stat1.end_position, stat2.end_position) else min(stat1.end_position, stat2.end_position)
         results = flag_significant_differences(
-            stat1.sequences, stat1.stats, 
-            stat2.sequences, stat2.stats, 
+            stat1.duplicates, stat1.stats, 
+            stat2.duplicates, stat2.stats, 
             threshold=flag_threshold, 
-            end_position=min(stat1.end_position, stat2.end_position)
+            kmer_threshold=kmer_threshold,
+            end_position=end_position
         )
         
         if 'simple' in report_types:
@@ -70,10 +123,77 @@ def run_analysis(input_statistics, out_folder, report_types, seq_report_types, p
                 html_report_path, 
                 plots_path=plots_path, 
                 threshold=flag_threshold,
-                end_position=min(stat1.end_position, stat2.end_position),
+                kmer_threshold=kmer_threshold,
+                end_position=end_position,
                 plot_type=plot_type
             )
 
+def run_streaming_single_file(input_file, format, sequence_column, label_column, label_list, regression,
+                              out_folder, report_types, seq_report_types, end_position, plot_type, chunk_size, workers, approximate_duplicates,
+                              max_sequences_for_distributions, sampling_seed, sketch_distributions, kmer_sizes, statistics, skip_stats, flag_threshold, kmer_threshold, cache,
+                              snapshot_dir):
+    """
+    Streaming counterpart of the single CSV/TSV file analysis in run().
+    Only the label column is loaded into memory to get the labels. The file is then read once in chunks, whose rows are split
+    by label and routed to the statistics of each label and each group of sequence columns, see iter_label_partitions.
+    """
+    label_transform = None
+    if regression:
+        label_values = pd.to_numeric(read_labels(input_file, format, label_column), errors='coerce')
+        threshold = label_values.median()
+        logging.debug(f"Inferred threshold for regression: {threshold}")
+        label_transform = lambda col: pd.Series(np.where(pd.to_numeric(col, errors='coerce') >= threshold, 'high', 'low'), index=col.index)
+        labels = ['high', 'low']
+    elif len(label_list) == 1 and label_list[0] == 'infer':
+        labels = read_labels(input_file, format, label_column).unique().tolist()
+        logging.debug(f"Inferred labels: {labels}")
+    else:
+        labels = label_list
+
+    # groups of sequence columns by the name of their statistics, multiple columns are concatenated
+    groups = {seq_col: [seq_col] for seq_col in sequence_column}
+    if len(sequence_column) > 1:
+        groups['_'.join(sequence_column)] = sequence_column
+
+    all_statistics = [SequenceStatistics.from_chunks(None, filename=Path(input_file).name, label=label,
+                                                     seq_column=seq_column, end_position=end_position, workers=workers, approximate_duplicates=approximate_duplicates,
+                                                     max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                                     sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics, skip_stats=skip_stats)
+                      for seq_column in groups for label in labels]
+
+    def accumulate(input_statistics):
+        if not input_statistics:
+            return
+        # new records continue the snapshots of their groups, which are updated in run_analysis
+        first_indices = [snapshot_first_index(snapshot_dir, s) for s in input_statistics] if snapshot_dir is not None else None
+        partitions = iter_label_partitions(input_file, format, sequence_column, label_column, labels,
+                                           label_transform=label_transform, chunk_size=chunk_size)
+        chunks = ([_group_sequences(partition.get(s.label), groups[s.seq_column]) for s in input_statistics] for partition in partitions)
+        accumulate_together(input_statistics, chunks, first_indices)
+
+    all_statistics = use_cache(cache, all_statistics, [input_file] * len(all_statistics), accumulate=accumulate,
+                               format=format, label_column=label_column, regression=regression)
+    for i in range(len(groups)):
+        run_analysis(
+            input_statistics = all_statistics[i * len(labels):(i + 1) * len(labels)], 
+            out_folder = out_folder, 
+            report_types = report_types, 
+            seq_report_types = seq_report_types, 
+            plot_type = plot_type, 
+            flag_threshold = flag_threshold,
+            kmer_threshold = kmer_threshold,
+            snapshot_dir = snapshot_dir
+        )
+
+def _group_sequences(columns, seq_columns):
+    """
+    @param columns: Dictionary {sequence column: SequenceBatch} of one label in a chunk, or None if the label has no rows in it.
+    @return: Sequences of the columns concatenated row by row, or None.
+    """
+    if columns is None:
+        return None
+    return concatenate_sequences([columns[seq_column] for seq_column in seq_columns])
+
 def run(input, 
         format, 
         out_folder='.', 
@@ -85,7 +205,23 @@ def run(input,
         seq_report_types: Optional[list[str]] = None,
         end_position: Optional[int] = None,
         plot_type: Optional[str] = 'boxen',
+        engine: Optional[str] = 'python',
+        streaming: Optional[bool] = False,
+        chunk_size: Optional[int] = 100000,
+        workers: Optional[int] = 1,
+        approximate_duplicates: Optional[bool] = False,
+        max_sequences_for_distributions: Optional[int] = None,
+        sampling_seed: Optional[int] = 0,
+        sketch_distributions: Optional[bool] = False,
+        kmer_sizes: Optional[list[int]] = None,
+        mean_quality: Optional[bool] = False,
+        skip_stats: Optional[list[str]] = None,
         flag_threshold: Optional[float] = 0.015,
+        kmer_threshold: Optional[float] = 0.01,
+        cache_dir: Optional[str] = None,
+        cache_max_size: Optional[int] = 1024,
+        clear_cache: Optional[bool] = False,
+        snapshot_dir: Optional[str] = None,
         log_level: Optional[str] = 'INFO',
         log_file: Optional[str] = None
     ):
@@ -94,7 +230,7 @@ def run(input,
     This function reads sequences from the provided input files, performs analysis, and generates reports about the sequences.
 
     @param input: List of paths to input files. Can be a list of files, each containing sequences from one class.
-    @param format: Format of the input files (fasta, csv, csv.gz, tsv, tsv.gz).
+    @param format: Format of the input files (fasta, fastq, fastq.gz, csv, csv.gz, tsv, tsv.gz, parquet, feather, arrow, packed).
     @param out_folder: Path to the output folder. Default: '.'.
     @param sequence_column: Name of the columns with sequences to analyze for datasets in CSV/TSV format. 
                             Either one column or list of columns. Default: ['sequences']
@@ -103,11 +239,50 @@ def run(input,
                       For datasets in CSV/TSV format.
     @param regression: If True, label column is considered as a regression target and values are split into 2 classes.
     @param report_types: Types of reports to generate. Default: ['html', 'simple'].
-    @param seq_report_types: Types of reports to generate for individual groups of sequences. Default: None.
+    @param seq_report_types: Types of reports to generate for individual groups of sequences: 'json', 'html',
+                             and 'parquet' or 'npz' for columnar statistic tables with a JSON manifest. Default: None.
     @param end_position: End position of the sequences to consider in per position statistics. 
                          If not provided, 75th percentile of sequence lengths will be used. Default: None.
     @param plot_type: Type of plot to use for visualizations. For bigger datasets, "boxen" is recommended. Default: 'boxen'.
+    @param engine: Engine used to compute the statistics, 'python' or 'numpy'. The numpy engine is much faster for bigger datasets. Default: 'python'.
+    @param streaming: If True, sequences are read and processed in chunks, so the whole dataset is never held in memory.
+                      Streaming always uses the numpy engine. Default: False.
+    @param chunk_size: Number of sequences (or rows for CSV/TSV) read in one chunk in streaming mode. Default: 100000.
+    @param workers: Number of worker processes used to compute the statistics. With more than one worker,
+                    the numpy engine is used and encoded sequences are shared with the workers through shared memory. Default: 1.
+    @param approximate_duplicates: If True, the number of unique sequences and the duplication levels are estimated in fixed memory
+                                   with HyperLogLog and SpaceSaving sketches. Error bounds are included in the reports, and duplicates
+                                   between datasets are searched only among the most frequent sequences. Default: False.
+    @param max_sequences_for_distributions: If provided, per sequence statistics (nucleotide, dinucleotide and GC content, lengths)
+                                            and the tests comparing them are computed from a seeded random sample of at most this many
+                                            sequences of each group. Counts, %GC content, per position statistics and duplication levels
+                                            still cover all sequences. Default: None.
+    @param sampling_seed: Seed of the sampling of sequences for per sequence statistics. Default: 0.
+    @param sketch_distributions: If True, per sequence statistics are summarized by fixed-size sketches of their distributions
+                                 (exact histogram of lengths, t-digests of the other statistics) and compared through them,
+                                 so their memory does not grow with the number of sequences. Default: False.
+    @param kmer_sizes: List of k-mer sizes to count k-mer spectra for, e.g. [3, 6]. Spectra of the groups are compared
+                       by their Jensen-Shannon divergence and the most differing k-mers are listed in the reports. Default: None.
+    @param mean_quality: If True, the mean Phred quality at each position of the reads of FASTQ inputs is computed
+                         and included in the reports of the individual files. Default: False.
+    @param skip_stats: List of optional statistics not to compute, e.g. ['per_position_nucleotide_content']. Statistics depending
+                       on a skipped statistic are skipped too, together with their checks. Statistics not needed by the
+                       requested reports are not computed either. Default: None.
     @param flag_threshold: Threshold for flagging significant differences in sequence statistics. Default: 0.015
+    @param kmer_threshold: Threshold of the Jensen-Shannon divergence in bits for flagging different k-mer spectra.
+                           Two random samples of the same composition with N k-mers each diverge by about (4^k - 1) / 2N bits,
+                           so the default stays above this noise for groups with more than 50 * 4^k k-mers (3200 for 3-mers),
+                           while shifts of the composition like between G4 positives and negatives (0.08 for 3-mers) are flagged.
+                           Default: 0.01
+    @param cache_dir: If provided, statistics are cached in this folder, keyed by the content of the input files, the selection
+                      of sequences and the options of the statistics. Later runs differing only in the flag or k-mer threshold, end position
+                      or plot type reuse the cached statistics instead of recomputing them. Default: None.
+    @param cache_max_size: Size bound of the cache in MB, least recently used statistics are removed above it. Default: 1024.
+    @param clear_cache: If True, the cache is cleared before the evaluation. Default: False.
+    @param snapshot_dir: Folder with snapshots of accumulated statistics, for datasets that grow by appending records.
+                         The input then holds only the new records: snapshots of the same label and sequence column are
+                         updated with them instead of recomputing from the full history, and the reports cover all records.
+                         Snapshots are created for groups without one and saved back updated. Default: None.
     @param log_level: Logging level, default to INFO.
     @param log_file: Path to the log file. If provided, logs will be written to this file as well as to the console.
     @return: None
@@ -120,27 +295,66 @@ def run(input,
         logging.info(f"Output folder {out_folder} does not exist. Creating it.")
         Path(out_folder).mkdir(parents=True, exist_ok=True)
 
-    # we have multiple fasta files with one label each
-    if format == 'fasta':
+    statistics = get_requested_statistics(report_types, seq_report_types)
+
+    if cache_dir is not None and snapshot_dir is not None:
+        raise ValueError("Statistics cache and snapshots cannot be used together, the cache is keyed by the input records only.")
+
+    cache = None
+    if cache_dir is not None:
+        cache = StatisticsCache(cache_dir, max_size=cache_max_size * 1024 ** 2)
+        if clear_cache:
+            cache.clear()
+    elif clear_cache:
+        logging.warning("No cache folder provided, there is no cache to clear.")
+
+    if mean_quality and not format.startswith('fastq'):
+        logging.error("Mean quality can be computed only for FASTQ input.")
+        raise ValueError("Mean quality can be computed only for FASTQ input.")
+
+    # we have multiple fasta or fastq files with one label each, possibly packed
+    if all(is_sequence_file(input_file, format) for input_file in input):
         seq_stats = []
         for input_file in input:
-            sequences = read_fasta(input_file)
-            logging.debug(f"Read {len(sequences)} sequences from FASTA file {input_file}.")
+            qualities = QualityProfile() if mean_quality else None
+            if streaming:
+                seq_stats += [SequenceStatistics.from_chunks(iter_sequence_file(input_file, format, chunk_size, qualities=qualities), filename=Path(input_file).name,
+                                                             label=Path(input_file).stem, end_position=end_position, workers=workers, approximate_duplicates=approximate_duplicates,
+                                                             max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                                             sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics, skip_stats=skip_stats,
+                                                             qualities=qualities)]
+                continue
+            sequences = read_sequence_file(input_file, format, qualities=qualities)
+            logging.debug(f"Read {len(sequences)} sequences from {format.upper()} file {input_file}.")
             seq_stats += [SequenceStatistics(sequences, filename=Path(input_file).name, 
-                                             label=Path(input_file).stem, end_position=end_position)]
+                                             label=Path(input_file).stem, end_position=end_position, engine=engine, workers=workers, approximate_duplicates=approximate_duplicates,
+                                             max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                             sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics, skip_stats=skip_stats,
+                                             qualities=qualities)]
+        seq_stats = use_cache(cache, seq_stats, input, format=format)
         run_analysis(
             input_statistics = seq_stats, 
             out_folder = out_folder, 
             report_types = report_types, 
             seq_report_types = seq_report_types, 
             plot_type = plot_type, 
-            flag_threshold = flag_threshold
+            flag_threshold = flag_threshold,
+            kmer_threshold = kmer_threshold,
+            snapshot_dir = snapshot_dir
         )
 
-    # we have CSV/TSV
+    # we have CSV/TSV or a columnar format
     else:
         # we have one file with multiple labels or regression target
-        if len(input) == 1:
+        if len(input) == 1 and streaming:
+            run_streaming_single_file(
+                input[0], format, sequence_column, label_column, label_list, regression,
+                out_folder, report_types, seq_report_types, end_position, plot_type, chunk_size, workers, approximate_duplicates,
+                max_sequences_for_distributions, sampling_seed, sketch_distributions, kmer_sizes, statistics, skip_stats, flag_threshold, kmer_threshold, cache,
+                snapshot_dir
+            )
+
+        elif len(input) == 1:
             df = read_csv_file(input[0], format, sequence_column, label_column)
 
             # if regression is True, we split the label column into two classes
@@ -152,83 +366,129 @@ def run(input,
                 # infer the threshold as the median of the label column
                 threshold = df[label_column].median()
                 logging.debug(f"Inferred threshold for regression: {threshold}")
-                df[label_column] = df[label_column].apply(lambda x: 'high' if x >= threshold else 'low')
+                df[label_column] = np.where(df[label_column] >= threshold, 'high', 'low')
                 labels = ['high', 'low']
 
-            # get the list of labels to consider
+            # get the list of labels to consider, None infers them from the label column
             elif len(label_list) == 1 and label_list[0] == 'infer':
-                labels = df[label_column].unique().tolist()
-                logging.debug(f"Inferred labels: {labels}")
+                labels = None
             else:
                 labels = label_list
 
+            # split the sequences of all columns by label at once, they are shared by all analyses below
+            partition = partition_by_label(df, sequence_column, label_column, labels)
+            del df
+            labels = list(partition)
+            logging.debug(f"Labels: {labels}")
+
             # loop over sequences with specific label and run statistics
+            column_statistics = {}
             for seq_col in sequence_column:
                 seq_stats = []
                 for label in labels:
-                    sequences = read_sequences_from_df(df, seq_col, label_column, label)
+                    sequences = partition[label][seq_col]
                     logging.debug(f"Read {len(sequences)} sequences for label '{label}' from column '{seq_col}'.")
                     seq_stats += [SequenceStatistics(sequences, filename=Path(input[0]).name, label=label, 
-                                                     seq_column=seq_col, end_position=end_position)]
+                                                     seq_column=seq_col, end_position=end_position, engine=engine, workers=workers, approximate_duplicates=approximate_duplicates,
+                                                     max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                                     sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics, skip_stats=skip_stats)]
+                seq_stats = use_cache(cache, seq_stats, [input[0]] * len(seq_stats), format=format, label_column=label_column, regression=regression)
+                column_statistics[seq_col] = seq_stats
                 run_analysis(
                     input_statistics = seq_stats, 
                     out_folder = out_folder, 
                     report_types = report_types, 
                     seq_report_types = seq_report_types, 
                     plot_type = plot_type, 
-                    flag_threshold = flag_threshold
+                    flag_threshold = flag_threshold,
+                    kmer_threshold = kmer_threshold,
+                    snapshot_dir = snapshot_dir
                 )
 
-            # handle multiple sequence columns by concatenating sequences and running statistics on them
+            # handle multiple sequence columns by concatenating sequences, their statistics are derived from the statistics of the columns
             if len(sequence_column) > 1:
                 seq_stats = []
-                for label in labels:
-                    sequences = read_multisequence_df(df, sequence_column, label_column, label)
-                    seq_stats += [SequenceStatistics(sequences, filename=Path(input[0]).name, label=label,
-                                                     seq_column='_'.join(sequence_column))]
+                for i, label in enumerate(labels):
+                    seq_stats += [SequenceStatistics.from_columns([column_statistics[seq_col][i] for seq_col in sequence_column],
+                                                     [partition[label][seq_col] for seq_col in sequence_column],
+                                                     filename=Path(input[0]).name, label=label,
+                                                     seq_column='_'.join(sequence_column), engine=engine, workers=workers, approximate_duplicates=approximate_duplicates,
+                                                     max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                                     sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics, skip_stats=skip_stats)]
+                seq_stats = use_cache(cache, seq_stats, [input[0]] * len(seq_stats), format=format, label_column=label_column, regression=regression)
                 run_analysis(
                     input_statistics = seq_stats, 
                     out_folder = out_folder, 
                     report_types = report_types, 
                     seq_report_types = seq_report_types, 
                     plot_type = plot_type, 
-                    flag_threshold = flag_threshold
+                    flag_threshold = flag_threshold,
+                    kmer_threshold = kmer_threshold,
+                    snapshot_dir = snapshot_dir
                 )
 
         # we have multiple files with one label each
         else:
             # run statistics across input files
+            column_statistics = {}
             for seq_col in sequence_column:
                 seq_stats = []
                 for input_file in input:
-                    sequences = read_sequences_from_df(read_csv_file(input_file, format, seq_col), seq_col)
+                    if streaming:
+                        seq_stats += [SequenceStatistics.from_chunks(iter_csv_file(input_file, format, [seq_col], chunk_size=chunk_size),
+                                                                     filename=Path(input_file).name, label=Path(input_file).stem,
+                                                                     seq_column=seq_col, end_position=end_position, workers=workers, approximate_duplicates=approximate_duplicates,
+                                                                     max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                                                     sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics, skip_stats=skip_stats)]
+                        continue
+                    sequences = read_sequences_from_df(read_csv_file(input_file, format, [seq_col]), seq_col)
                     logging.debug(f"Read {len(sequences)} sequences from file {input_file} in column '{seq_col}'.")
                     seq_stats += [SequenceStatistics(sequences, filename=Path(input_file).name, 
                                                      label=Path(input_file).stem, seq_column=seq_col,
-                                                     end_position=end_position)]
+                                                     end_position=end_position, engine=engine, workers=workers, approximate_duplicates=approximate_duplicates,
+                                                     max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                                     sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics, skip_stats=skip_stats)]
+                seq_stats = use_cache(cache, seq_stats, input, format=format)
+                column_statistics[seq_col] = seq_stats
                 run_analysis(
                     input_statistics = seq_stats, 
                     out_folder = out_folder, 
                     report_types = report_types, 
                     seq_report_types = seq_report_types, 
                     plot_type = plot_type, 
-                    flag_threshold = flag_threshold
+                    flag_threshold = flag_threshold,
+                    kmer_threshold = kmer_threshold,
+                    snapshot_dir = snapshot_dir
                 )
 
             # handle multiple sequence columns
             if len(sequence_column) > 1:
                 seq_stats = []
-                for input_file in input:
-                    sequences = read_multisequence_df(read_csv_file(input_file, format, sequence_column), sequence_column)
-                    seq_stats += [SequenceStatistics(sequences, filename=Path(input_file).name, label=Path(input_file).stem,
-                                                     seq_column='_'.join(sequence_column), end_position=end_position)]
+                for i, input_file in enumerate(input):
+                    if streaming:
+                        seq_stats += [SequenceStatistics.from_chunks(iter_csv_file(input_file, format, sequence_column, chunk_size=chunk_size),
+                                                                     filename=Path(input_file).name, label=Path(input_file).stem,
+                                                                     seq_column='_'.join(sequence_column), end_position=end_position, workers=workers, approximate_duplicates=approximate_duplicates,
+                                                                     max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                                                     sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics, skip_stats=skip_stats)]
+                        continue
+                    df = read_csv_file(input_file, format, sequence_column)
+                    seq_stats += [SequenceStatistics.from_columns([column_statistics[seq_col][i] for seq_col in sequence_column],
+                                                     [read_sequences_from_df(df, seq_col) for seq_col in sequence_column],
+                                                     filename=Path(input_file).name, label=Path(input_file).stem,
+                                                     seq_column='_'.join(sequence_column), end_position=end_position, engine=engine, workers=workers, approximate_duplicates=approximate_duplicates,
+                                                     max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                                     sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics, skip_stats=skip_stats)]
+                seq_stats = use_cache(cache, seq_stats, input, format=format)
                 run_analysis(
                     input_statistics = seq_stats, 
                     out_folder = out_folder, 
                     report_types = report_types, 
                     seq_report_types = seq_report_types, 
                     plot_type = plot_type, 
-                    flag_threshold = flag_threshold
+                    flag_threshold = flag_threshold,
+                    kmer_threshold = kmer_threshold,
+                    snapshot_dir = snapshot_dir
                 )
 
     logging.info("Dataset evaluation successfully completed.")
@@ -238,7 +498,7 @@ def parse_args():
     parser = argparse.ArgumentParser(description='A tool for evaluating sequence datasets.')
     parser.add_argument('--input', type=str, help='Path to the dataset file. '
                                                   'Can be a list of files, each containing sequences from one class.', nargs='+', required=True)
-    parser.add_argument('--format', help="Format of the input files.", choices=['fasta', 'csv', 'csv.gz', 'tsv', 'tsv.gz'], required=True) # potentially add HF support
+    parser.add_argument('--format', help="Format of the input files.", choices=INPUT_FORMATS, required=True) # potentially add HF support
     parser.add_argument('--sequence_column', type=str, help='Name of the columns with sequences to analyze for datasets in CSV/TSV format. '
                                                             'Either one column or list of columns.', nargs='+', default=['sequence'])
     parser.add_argument('--label_column', type=str, help='Name with the label column for datasets in CSV/TSV format.', default='label')
@@ -248,20 +508,57 @@ def parse_args():
     parser.add_argument('--out_folder', type=str, help='Path to the output folder.', default='.')
     parser.add_argument('--report_types', type=str, nargs='+', choices=['json', 'html', 'simple'], default=['html', 'simple'],
                         help='Types of reports to generate. Default: [html, simple].')
-    parser.add_argument('--seq_report_types', type=str, nargs='+', choices=['json', 'html'], default=[],
+    parser.add_argument('--seq_report_types', type=str, nargs='+', choices=['json', 'html'] + TABLE_FORMATS, default=[],
                         help='Types of reports to generate for individual groups of sequences. Default: [].')
     parser.add_argument('--end_position', type=int, default=None,
                         help='End position of the sequences to consider in per position statistics. If not provided, 75th percentile of sequence lengths will be used.')
     parser.add_argument('--plot_type', type=str, help='Type of plot to use for visualizations. For bigger datasets, "boxen" in recommended. Default: boxen.',
                         choices=['boxen', 'violin'], default='boxen')
+    parser.add_argument('--engine', type=str, help='Engine used to compute the statistics. The numpy engine is much faster for bigger datasets. Default: python.',
+                        choices=['python', 'numpy'], default='python')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Read and process sequences in chunks so the whole dataset is never held in memory. Always uses the numpy engine.')
+    parser.add_argument('--chunk_size', type=int, default=100000,
+                        help='Number of sequences (or rows for CSV/TSV) read in one chunk in streaming mode. Default: 100000.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes used to compute the statistics. More than one worker implies the numpy engine. Default: 1.')
+    parser.add_argument('--approximate_duplicates', action='store_true',
+                        help='Estimate the number of unique sequences and the duplication levels in fixed memory. '
+                             'Error bounds of the estimates are included in the reports.')
+    parser.add_argument('--max_sequences_for_distributions', type=int, default=None,
+                        help='Compute per sequence statistics, their plots and tests from a seeded random sample of at most this many sequences '
+                             'of each group. Counts, %%GC content, per position statistics and duplication levels still cover all sequences.')
+    parser.add_argument('--sampling_seed', type=int, default=0,
+                        help='Seed of the sampling of sequences for per sequence statistics. Default: 0.')
+    parser.add_argument('--sketch_distributions', action='store_true',
+                        help='Summarize per sequence statistics by fixed-size sketches of their distributions and compare them through the sketches, '
+                             'so their memory does not grow with the number of sequences.')
+    parser.add_argument('--kmer_sizes', type=int, nargs='+', default=None,
+                        help='Count k-mer spectra for these k-mer sizes, e.g. 3 6, and compare them between groups. Default: none.')
+    parser.add_argument('--mean_quality', action='store_true',
+                        help='Compute the mean Phred quality at each position of the reads of FASTQ inputs.')
+    parser.add_argument('--skip_stats', type=str, nargs='+', choices=STATISTIC_SLUGS, default=None,
+                        help='Optional statistics not to compute. Statistics depending on them and their checks are skipped too. Default: none.')
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help='Folder to cache statistics in. Runs on the same inputs with the same options reuse the cached statistics. Default: no cache.')
+    parser.add_argument('--cache_max_size', type=int, default=1024,
+                        help='Size bound of the cache in MB, least recently used statistics are removed above it. Default: 1024.')
+    parser.add_argument('--clear_cache', action='store_true',
+                        help='Clear the cache before the evaluation.')
+    parser.add_argument('--snapshot_dir', type=str, default=None,
+                        help='Folder with snapshots of accumulated statistics. Snapshots are updated with the input records, '
+                             'so only records appended since the last run need to be given. Default: no snapshots.')
     parser.add_argument('--flag_threshold', type=float, default=0.015,
                         help='Threshold for flagging significant differences in sequence statistics. Default: 0.015')
+    parser.add_argument('--kmer_threshold', type=float, default=0.01,
+                        help='Threshold of the Jensen-Shannon divergence in bits for flagging different k-mer spectra. '
+                             'It stays above the divergence of random samples of one composition with more than 50 * 4^k k-mers each. Default: 0.01')
     parser.add_argument('--log_level', type=str, help='Logging level, default to INFO.', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], default='INFO')
     parser.add_argument('--log_file', type=str, help='Path to the log file. If provided, logs will be written to this file as well as to the console.', default=None)
     args = parser.parse_args()
 
-    if args.format == 'fasta' and len(args.input) < 2:
-        parser.error("When format is 'fasta', the input must contain individual files for each class.")
+    if args.format in SEQUENCE_FORMATS and len(args.input) < 2:
+        parser.error(f"When format is '{args.format}', the input must contain individual files for each class.")
 
     return args
 
@@ -278,7 +575,23 @@ def main():
         seq_report_types = args.seq_report_types,
         end_position = args.end_position,
         plot_type = args.plot_type,
+        engine = args.engine,
+        streaming = args.streaming,
+        chunk_size = args.chunk_size,
+        workers = args.workers,
+        approximate_duplicates = args.approximate_duplicates,
+        max_sequences_for_distributions = args.max_sequences_for_distributions,
+        sampling_seed = args.sampling_seed,
+        sketch_distributions = args.sketch_distributions,
+        kmer_sizes = args.kmer_sizes,
+        mean_quality = args.mean_quality,
+        skip_stats = args.skip_stats,
         flag_threshold = args.flag_threshold,
+        kmer_threshold = args.kmer_threshold,
+        cache_dir = args.cache_dir,
+        cache_max_size = args.cache_max_size,
+        clear_cache = args.clear_cache,
+        snapshot_dir = args.snapshot_dir,
         log_level = args.log_level,
         log_file = args.log_file
     )
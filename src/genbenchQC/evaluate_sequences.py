@@ -4,26 +4,54 @@ from typing import Optional
 import logging
 
 from genbenchQC.utils.statistics import SequenceStatistics
-from genbenchQC.report.report_generator import generate_json_report, generate_sequence_html_report
-from genbenchQC.utils.input_utils import read_fasta, read_sequences_from_df, read_multisequence_df, read_csv_file, setup_logger
+from genbenchQC.report.report_generator import generate_json_report, generate_sequence_html_report, generate_columnar_report
+from genbenchQC.utils.input_utils import read_sequence_file, read_sequences_from_df, read_csv_file, setup_logger
+from genbenchQC.utils.input_utils import iter_sequence_file, iter_csv_file, parse_shard, is_sequence_file, INPUT_FORMATS
+from genbenchQC.utils.fastq import QualityProfile
+from genbenchQC.utils.registry import STATISTIC_SLUGS
+from genbenchQC.utils.snapshots import update_snapshots
+from genbenchQC.utils.columnar import TABLE_FORMATS
 
-def run_analysis(seq_stats, out_folder, report_types, plot_type):
+def get_report_filename(seq_stats):
+    filename = Path(seq_stats.filename).stem
+    if seq_stats.seq_column is not None:
+        filename += f'_{seq_stats.seq_column}'
+    if seq_stats.label is not None:
+        filename += f'_{seq_stats.label}'
+    return filename
+
+def run_partial_analysis(seq_stats, out_folder, shard):
+    """
+    Accumulate statistics for one shard of the input and save them to a partial statistics file.
+    Partial files of all shards can be combined into the final reports with merge_statistics.
+    """
+    if not Path(out_folder).exists():
+        logging.info(f"Output folder {out_folder} does not exist. Creating it.")
+        Path(out_folder).mkdir(parents=True, exist_ok=True)
+
+    seq_stats.accumulate(shard)
+    filename = get_report_filename(seq_stats) + f'_shard_{shard[0]}_of_{shard[1]}.npz'
+    seq_stats.save_partial(Path(out_folder, filename), shard=shard)
+
+def run_analysis(seq_stats, out_folder, report_types, plot_type, snapshot_dir=None):
 
     if not Path(out_folder).exists():
         logging.info(f"Output folder {out_folder} does not exist. Creating it.")
         Path(out_folder).mkdir(parents=True, exist_ok=True)
 
+    if snapshot_dir is not None:
+        update_snapshots([seq_stats], snapshot_dir)
+
     stats, end_position = seq_stats.compute()
 
-    filename = Path(seq_stats.filename).stem
-    if seq_stats.seq_column is not None:
-        filename += f'_{seq_stats.seq_column}'
-    if seq_stats.label is not None:
-        filename += f'_{seq_stats.label}'
+    filename = get_report_filename(seq_stats)
 
     if 'json' in report_types:
         json_report_path = Path(out_folder, filename + '_report.json')
         generate_json_report(stats, json_report_path)
+    for table_format in TABLE_FORMATS:
+        if table_format in report_types:
+            generate_columnar_report(stats, Path(out_folder, filename + f'_report_{table_format}'), table_format)
     if 'html' in report_types:
         html_report_path = Path(out_folder, filename + '_report.html')
         plots_path = out_folder / Path(filename + '_plots')
@@ -43,6 +71,19 @@ def run(input, format,
         report_types: Optional[list[str]] = ['html'],
         end_position: Optional[int] = None,
         plot_type: Optional[str] = 'boxen',
+        engine: Optional[str] = 'python',
+        streaming: Optional[bool] = False,
+        chunk_size: Optional[int] = 100000,
+        workers: Optional[int] = 1,
+        shard: Optional[str] = None,
+        approximate_duplicates: Optional[bool] = False,
+        max_sequences_for_distributions: Optional[int] = None,
+        sampling_seed: Optional[int] = 0,
+        sketch_distributions: Optional[bool] = False,
+        kmer_sizes: Optional[list[int]] = None,
+        mean_quality: Optional[bool] = False,
+        skip_stats: Optional[list[str]] = None,
+        snapshot_dir: Optional[str] = None,
         log_level: Optional[str] = 'INFO',
         log_file: Optional[str] = None
     ):
@@ -52,16 +93,45 @@ def run(input, format,
     This function reads sequences from the input file, performs analysis, and generates reports.
 
     @param input: Path to the input file containing sequences.
-    @param format: Format of the input file (fasta, csv, csv.gz, tsv, tsv.gz).
+    @param format: Format of the input file (fasta, fastq, fastq.gz, csv, csv.gz, tsv, tsv.gz, parquet, feather, arrow, packed).
     @param out_folder: Path to the output folder. Default: '.'.
     @param sequence_column: Name of the columns with sequences to analyze for datasets in CSV/TSV format. 
                             Default: ['sequence'].
     @param label_column: Name of the label column for datasets in CSV/TSV format. Needed only if you want to select a specific class from the dataset.
     @param label: Label of the class to select from the whole dataset. If not specified, the whole dataset is taken and analyzed as one piece.
-    @param report_types: Types of reports to generate. Default: ['html'].
+    @param report_types: Types of reports to generate: 'json', 'html', and 'parquet' or 'npz' for a folder with one columnar file
+                         per statistic table and a JSON manifest, see read_stats_columnar. Default: ['html'].
     @param end_position: End position of the sequences to plot in the per position plots. 
                          If not provided, 75th percentile of sequence lengths will be used. Default: None.
     @param plot_type: Type of the plot to generate for per sequence nucleotide content. For bigger datasets, "boxen" is recommended. Default: 'boxen'.
+    @param engine: Engine used to compute the statistics, 'python' or 'numpy'. The numpy engine is much faster for bigger datasets. Default: 'python'.
+    @param streaming: If True, sequences are read and processed in chunks, so the whole dataset is never held in memory.
+                      Streaming always uses the numpy engine. Default: False.
+    @param chunk_size: Number of sequences (or rows for CSV/TSV) read in one chunk in streaming mode. Default: 100000.
+    @param workers: Number of worker processes used to compute the statistics. With more than one worker,
+                    the numpy engine is used and encoded sequences are shared with the workers through shared memory. Default: 1.
+    @param shard: Shard of the input to process, given as 'i/N' with i from 1 to N. The input file is split into N parts
+                  and only the i-th part is processed in streaming mode. Instead of reports, a partial statistics file is written;
+                  partial files from all shards are combined into reports with merge_statistics. Default: None.
+    @param approximate_duplicates: If True, the number of unique sequences and the duplication levels are estimated in fixed memory
+                                   with HyperLogLog and SpaceSaving sketches. Error bounds are included in the reports. Default: False.
+    @param max_sequences_for_distributions: If provided, per sequence statistics (nucleotide, dinucleotide and GC content, lengths)
+                                            are computed from a seeded random sample of at most this many sequences. Counts, %GC content,
+                                            per position statistics and duplication levels still cover all sequences. Default: None.
+    @param sampling_seed: Seed of the sampling of sequences for per sequence statistics. Default: 0.
+    @param sketch_distributions: If True, per sequence statistics are summarized by fixed-size sketches of their distributions
+                                 (exact histogram of lengths, t-digests of the other statistics), so their memory does not grow
+                                 with the number of sequences. Plots show evenly spaced quantiles of the sketches. Default: False.
+    @param kmer_sizes: List of k-mer sizes to count k-mer spectra for, e.g. [3, 6]. K-mers are counted over A, C, G and T
+                       with a rolling 2-bit hash over the encoded sequences; spectra of k above 6 are stored sparsely. Default: None.
+    @param mean_quality: If True, the mean Phred quality (offset 33) at each position of the reads is computed
+                         from the quality strings of a FASTQ input, in the same pass as the sequences. Default: False.
+    @param skip_stats: List of optional statistics not to compute, e.g. ['per_position_nucleotide_content']. Statistics depending
+                       on a skipped statistic are skipped too, and skipped statistics are left out of the reports. Default: None.
+    @param snapshot_dir: Folder with snapshots of accumulated statistics, for datasets that grow by appending records.
+                         The input then holds only the new records: snapshots of the same label and sequence column are
+                         updated with them instead of recomputing from the full history, and the reports cover all records.
+                         Snapshots are created for groups without one and saved back updated. Default: None.
     @param log_level: Logging level, default to INFO.
     @param log_file: Path to the log file. If provided, logs will be written to this file as well as to the console.
     @return: None
@@ -70,31 +140,84 @@ def run(input, format,
     setup_logger(log_level, log_file)
     logging.info("Starting sequence evaluation.")
 
-    if format == 'fasta':
-        seqs = read_fasta(input)
-        logging.debug(f"Read {len(seqs)} sequences from FASTA file.")
+    if shard is not None:
+        shard = parse_shard(shard)
+        if snapshot_dir is not None:
+            raise ValueError("Snapshots cannot be updated with a shard of the input, use merge_statistics to combine shards.")
+
+    if mean_quality and not format.startswith('fastq'):
+        logging.error("Mean quality can be computed only for FASTQ input.")
+        raise ValueError("Mean quality can be computed only for FASTQ input.")
+    qualities = QualityProfile() if mean_quality else None
+
+    if streaming or shard is not None:
+        # partial statistics keep all distinct sequences, so duplicates spanning several shards can be reported after merging
+        keep_sequences = shard is not None
+        if is_sequence_file(input, format):
+            seq_stats = [SequenceStatistics.from_chunks(iter_sequence_file(input, format, chunk_size, shard=shard, qualities=qualities),
+                                                        Path(input).name, label=label, end_position=end_position, workers=workers,
+                                                        keep_sequences=keep_sequences, approximate_duplicates=approximate_duplicates,
+                                                        max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                                        sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, skip_stats=skip_stats,
+                                                        qualities=qualities)]
+        else:
+            seq_columns = [[seq_col] for seq_col in sequence_column]
+            if len(sequence_column) > 1:
+                seq_columns.append(sequence_column)
+            seq_stats = [
+                SequenceStatistics.from_chunks(iter_csv_file(input, format, seq_cols, label_column, label, chunk_size=chunk_size, shard=shard),
+                                               filename=Path(input).name, seq_column='_'.join(seq_cols),
+                                               label=label, end_position=end_position, workers=workers,
+                                               keep_sequences=keep_sequences, approximate_duplicates=approximate_duplicates,
+                                               max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                               sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, skip_stats=skip_stats)
+                for seq_cols in seq_columns
+            ]
+
+        for s in seq_stats:
+            if shard is not None:
+                run_partial_analysis(s, out_folder, shard)
+            else:
+                run_analysis(s, out_folder, report_types=report_types, plot_type=plot_type, snapshot_dir=snapshot_dir)
+
+    elif is_sequence_file(input, format):
+        seqs = read_sequence_file(input, format, qualities=qualities)
+        logging.debug(f"Read {len(seqs)} sequences from {format.upper()} file.")
         run_analysis(
-            SequenceStatistics(seqs, Path(input).name, label=label, end_position=end_position),
-            out_folder, report_types=report_types, plot_type=plot_type
+            SequenceStatistics(seqs, Path(input).name, label=label, end_position=end_position, engine=engine, workers=workers,
+                               approximate_duplicates=approximate_duplicates,
+                               max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                               sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, skip_stats=skip_stats,
+                               qualities=qualities),
+            out_folder, report_types=report_types, plot_type=plot_type, snapshot_dir=snapshot_dir
         )
     else:
-        df = read_csv_file(input, format, sequence_column, label_column)
+        df = read_csv_file(input, format, sequence_column, label_column, label)
 
+        columns = []
+        column_statistics = []
         for seq_col in sequence_column:
             sequences = read_sequences_from_df(df, seq_col, label_column, label)
             logging.debug(f"Read {len(sequences)} sequences from CSV/TSV file.")
-            run_analysis(
+            columns.append(sequences)
+            column_statistics.append(
                 SequenceStatistics(sequences, filename=Path(input).name, 
-                                   seq_column=seq_col, label=label, end_position=end_position), 
-                out_folder, report_types=report_types, plot_type=plot_type
+                                   seq_column=seq_col, label=label, end_position=end_position, engine=engine, workers=workers,
+                                   approximate_duplicates=approximate_duplicates,
+                                   max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                   sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, skip_stats=skip_stats)
             )
+            run_analysis(column_statistics[-1], out_folder, report_types=report_types, plot_type=plot_type, snapshot_dir=snapshot_dir)
 
+        # statistics of the concatenated columns are derived from the statistics of the columns
         if len(sequence_column) > 1:
-            sequences = read_multisequence_df(df, sequence_column, label_column, label)
             run_analysis(
-                SequenceStatistics(sequences, filename=Path(input).name, seq_column='_'.join(sequence_column), 
-                                   label=label, end_position=end_position), 
-                out_folder, report_types=report_types, plot_type=plot_type
+                SequenceStatistics.from_columns(column_statistics, columns, filename=Path(input).name, seq_column='_'.join(sequence_column), 
+                                   label=label, end_position=end_position, engine=engine, workers=workers,
+                                   approximate_duplicates=approximate_duplicates,
+                                   max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                                   sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, skip_stats=skip_stats), 
+                out_folder, report_types=report_types, plot_type=plot_type, snapshot_dir=snapshot_dir
             )
 
     logging.info("Sequence evaluation successfully completed.")
@@ -102,7 +225,7 @@ def run(input, format,
 def parse_args():
     parser = argparse.ArgumentParser(description='A tools for evaluating sequence data.')
     parser.add_argument('--input', type=str, help='Path to the input file.', required=True)
-    parser.add_argument('--format', help="Format of the input file.", choices=['fasta', 'csv', 'csv.gz', 'tsv', 'tsv.gz'], required=True)
+    parser.add_argument('--format', help="Format of the input file.", choices=INPUT_FORMATS, required=True)
     parser.add_argument('--sequence_column', type=str,
                         help='Name of the columns with sequences to analyze for datasets in CSV/TSV format. '
                              'Either one column or list of columns.', nargs='+', default=['sequence'])
@@ -111,12 +234,44 @@ def parse_args():
     parser.add_argument('--label', type=str,
                         help='Label of the class to select from the whole dataset. If not specified, the whole dataset is taken and analyzed as one piece.', default=None)
     parser.add_argument('--out_folder', type=str, help='Path to the output folder.', default='.')
-    parser.add_argument('--report_types', type=str, nargs='+', choices=['json', 'html'],
-                        help='Types of reports to generate. Default: [html]', default=['html'])
+    parser.add_argument('--report_types', type=str, nargs='+', choices=['json', 'html'] + TABLE_FORMATS,
+                        help='Types of reports to generate. parquet and npz write a folder with one columnar file per statistic table '
+                             'and a JSON manifest. Default: [html]', default=['html'])
     parser.add_argument('--end_position', type=int, default=None,
                         help='End position of the sequences to plot in the per position plots. If not provided, 75th percentile of sequence lengths will be used.')
     parser.add_argument('--plot_type', type=str, help='Type of the plot to generate for per sequence nucleotide content. For bigger datasets, "boxen" is recommended. Default: boxen.',
                         choices=['boxen', 'violin'], default='boxen')
+    parser.add_argument('--engine', type=str, help='Engine used to compute the statistics. The numpy engine is much faster for bigger datasets. Default: python.',
+                        choices=['python', 'numpy'], default='python')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Read and process sequences in chunks so the whole dataset is never held in memory. Always uses the numpy engine.')
+    parser.add_argument('--chunk_size', type=int, default=100000,
+                        help='Number of sequences (or rows for CSV/TSV) read in one chunk in streaming mode. Default: 100000.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes used to compute the statistics. More than one worker implies the numpy engine. Default: 1.')
+    parser.add_argument('--shard', type=str, default=None,
+                        help='Process only one shard of the input, given as i/N with i from 1 to N. Writes a partial statistics file '
+                             'instead of reports; combine partial files of all shards with merge_statistics. Requires uncompressed input other than FASTQ.')
+    parser.add_argument('--approximate_duplicates', action='store_true',
+                        help='Estimate the number of unique sequences and the duplication levels in fixed memory. '
+                             'Error bounds of the estimates are included in the reports.')
+    parser.add_argument('--max_sequences_for_distributions', type=int, default=None,
+                        help='Compute per sequence statistics and their plots from a seeded random sample of at most this many sequences. '
+                             'Counts, %%GC content, per position statistics and duplication levels still cover all sequences.')
+    parser.add_argument('--sampling_seed', type=int, default=0,
+                        help='Seed of the sampling of sequences for per sequence statistics. Default: 0.')
+    parser.add_argument('--sketch_distributions', action='store_true',
+                        help='Summarize per sequence statistics by fixed-size sketches of their distributions, '
+                             'so their memory does not grow with the number of sequences.')
+    parser.add_argument('--kmer_sizes', type=int, nargs='+', default=None,
+                        help='Count k-mer spectra for these k-mer sizes, e.g. 3 6. Default: none.')
+    parser.add_argument('--mean_quality', action='store_true',
+                        help='Compute the mean Phred quality at each position of the reads of a FASTQ input.')
+    parser.add_argument('--skip_stats', type=str, nargs='+', choices=STATISTIC_SLUGS, default=None,
+                        help='Optional statistics not to compute. Statistics depending on them are skipped too. Default: none.')
+    parser.add_argument('--snapshot_dir', type=str, default=None,
+                        help='Folder with snapshots of accumulated statistics. Snapshots are updated with the input records, '
+                             'so only records appended since the last run need to be given. Default: no snapshots.')
     parser.add_argument('--log_level', type=str, help='Logging level, default to INFO.',
                         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], default='INFO')
     parser.add_argument('--log_file', type=str, help='Path to the log file. If provided, logs will be written to this file as well as to the console.', default=None)
@@ -139,6 +294,19 @@ def main():
         report_types = args.report_types,
         end_position = args.end_position,
         plot_type = args.plot_type,
+        engine = args.engine,
+        streaming = args.streaming,
+        chunk_size = args.chunk_size,
+        workers = args.workers,
+        shard = args.shard,
+        approximate_duplicates = args.approximate_duplicates,
+        max_sequences_for_distributions = args.max_sequences_for_distributions,
+        sampling_seed = args.sampling_seed,
+        sketch_distributions = args.sketch_distributions,
+        kmer_sizes = args.kmer_sizes,
+        mean_quality = args.mean_quality,
+        skip_stats = args.skip_stats,
+        snapshot_dir = args.snapshot_dir,
         log_level = args.log_level,
         log_file = args.log_file
     )
@@ -0,0 +1,114 @@
+import argparse
+import logging
+from typing import Optional
+
+from genbenchQC.utils.statistics import SequenceStatistics
+from genbenchQC.utils.input_utils import setup_logger
+from genbenchQC.evaluate_sequences import run_analysis
+from genbenchQC.utils.columnar import TABLE_FORMATS
+
+def merge_partial_statistics(partials):
+    """
+    Merge partial statistics of one analysis in the order of their shards.
+    All shards 1 to N of one split of the input are required, each exactly once.
+    @param partials: List of tuples (shard, SequenceStatistics) as returned by SequenceStatistics.load_partial.
+    @return: The merged SequenceStatistics.
+    """
+    shards = [shard for shard, _ in partials]
+    if None in shards:
+        if len(partials) > 1:
+            logging.error("Statistics of the whole input cannot be merged with other partial statistics of the same input.")
+            raise ValueError("Statistics of the whole input cannot be merged with other partial statistics of the same input.")
+        return partials[0][1]
+
+    n_shards = {n for _, n in shards}
+    if len(n_shards) > 1:
+        logging.error(f"Partial statistics come from different splits of the input into {sorted(n_shards)} shards.")
+        raise ValueError(f"Partial statistics come from different splits of the input into {sorted(n_shards)} shards.")
+    n_shards = n_shards.pop()
+    indices = [index for index, _ in shards]
+    repeated = sorted({index for index in indices if indices.count(index) > 1})
+    if repeated:
+        logging.error(f"Partial statistics of shards {repeated} of {n_shards} are given more than once.")
+        raise ValueError(f"Partial statistics of shards {repeated} of {n_shards} are given more than once.")
+    missing = sorted(set(range(1, n_shards + 1)) - set(indices))
+    if missing:
+        logging.error(f"Missing partial statistics for shards {missing} of {n_shards}.")
+        raise ValueError(f"Missing partial statistics for shards {missing} of {n_shards}.")
+
+    partials = sorted(partials, key=lambda partial: partial[0][0])
+    merged = partials[0][1]
+    for _, seq_stats in partials[1:]:
+        merged.merge(seq_stats)
+    return merged
+
+def run(input,
+        out_folder: Optional[str] = '.',
+        report_types: Optional[list[str]] = ['html'],
+        end_position: Optional[int] = None,
+        plot_type: Optional[str] = 'boxen',
+        log_level: Optional[str] = 'INFO',
+        log_file: Optional[str] = None
+    ):
+    """
+    Merge partial statistics files into sequence reports.
+
+    Partial statistics files are written by evaluate_sequences with the shard option. Files are grouped by the input file,
+    sequence column and label they were computed for, and each group is merged into the same reports
+    that a single run of evaluate_sequences produces. Each group has to hold every shard of one split exactly once.
+
+    @param input: List of paths to partial statistics files.
+    @param out_folder: Path to the output folder. Default: '.'.
+    @param report_types: Types of reports to generate. Default: ['html'].
+    @param end_position: End position of the sequences to plot in the per position plots.
+                         If not provided, 75th percentile of sequence lengths will be used. Default: None.
+    @param plot_type: Type of the plot to generate for per sequence nucleotide content. For bigger datasets, "boxen" is recommended. Default: 'boxen'.
+    @param log_level: Logging level, default to INFO.
+    @param log_file: Path to the log file. If provided, logs will be written to this file as well as to the console.
+    @return: None
+    """
+
+    setup_logger(log_level, log_file)
+    logging.info("Starting merge of partial statistics.")
+
+    groups = {}
+    for path in input:
+        seq_stats, shard = SequenceStatistics.load_partial(path, end_position=end_position)
+        key = (seq_stats.filename, seq_stats.seq_column, seq_stats.label)
+        groups.setdefault(key, []).append((shard, seq_stats))
+
+    for (filename, seq_column, label), partials in groups.items():
+        logging.info(f"Merging {len(partials)} partial statistics for {filename}, sequence column: {seq_column}, label: {label}")
+        run_analysis(merge_partial_statistics(partials), out_folder, report_types=report_types, plot_type=plot_type)
+
+    logging.info("Merge of partial statistics successfully completed.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='A tool for merging partial statistics computed on shards of the input.')
+    parser.add_argument('--input', type=str, help='Paths to the partial statistics files written by evaluate_sequences --shard.', nargs='+', required=True)
+    parser.add_argument('--out_folder', type=str, help='Path to the output folder.', default='.')
+    parser.add_argument('--report_types', type=str, nargs='+', choices=['json', 'html'] + TABLE_FORMATS,
+                        help='Types of reports to generate. Default: [html]', default=['html'])
+    parser.add_argument('--end_position', type=int, default=None,
+                        help='End position of the sequences to plot in the per position plots. If not provided, 75th percentile of sequence lengths will be used.')
+    parser.add_argument('--plot_type', type=str, help='Type of the plot to generate for per sequence nucleotide content. For bigger datasets, "boxen" is recommended. Default: boxen.',
+                        choices=['boxen', 'violin'], default='boxen')
+    parser.add_argument('--log_level', type=str, help='Logging level, default to INFO.',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], default='INFO')
+    parser.add_argument('--log_file', type=str, help='Path to the log file. If provided, logs will be written to this file as well as to the console.', default=None)
+
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    run(input = args.input,
+        out_folder = args.out_folder,
+        report_types = args.report_types,
+        end_position = args.end_position,
+        plot_type = args.plot_type,
+        log_level = args.log_level,
+        log_file = args.log_file
+    )
+
+if __name__ == '__main__':
+    main()
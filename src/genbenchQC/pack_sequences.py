@@ -0,0 +1,95 @@
+import argparse
+import logging
+from pathlib import Path
+from typing import Optional
+
+from genbenchQC.utils.input_utils import setup_logger, iter_sequence_file, iter_csv_chunks
+from genbenchQC.utils.input_utils import INPUT_FORMATS, SEQUENCE_FORMATS, PACKED_FORMAT
+from genbenchQC.utils.packed import write_packed
+
+# sequences of FASTA/FASTQ files are packed into a column of this name, the default sequence column of the tools
+SEQUENCE_COLUMN = 'sequence'
+
+def run(input, format,
+        output: Optional[str] = None,
+        sequence_column: Optional[list[str]] = ['sequence'],
+        label_column: Optional[str] = None,
+        chunk_size: Optional[int] = 100000,
+        log_level: Optional[str] = 'INFO',
+        log_file: Optional[str] = None
+    ):
+    """
+    Pack the sequences of an input file into a packed sequence file.
+
+    Bases are stored as 2-bit codes with a list of exceptions for other bases than ACGT, together with the offsets
+    of the sequences and the labels. evaluate_sequences, evaluate_dataset and evaluate_split read the packed file
+    with the format 'packed' by memory-mapping it, instead of parsing the text input again in every run.
+    The format of the input is kept in the packed file, so packed FASTA/FASTQ files are reported like the original files.
+
+    @param input: Path to the input file.
+    @param format: Format of the input file (fasta, fastq, fastq.gz, csv, csv.gz, tsv, tsv.gz, parquet, feather, arrow).
+    @param output: Path to the packed sequence file. Default: the input path with the extension '.gbqc'.
+    @param sequence_column: Name of the columns with sequences to pack for datasets in CSV/TSV format. Sequences of FASTA
+                            and FASTQ files are packed into the column 'sequence'. Default: ['sequence'].
+    @param label_column: Name of the label column to pack for datasets in CSV/TSV format. Default: None.
+    @param chunk_size: Number of sequences (or rows for CSV/TSV) read and packed in one chunk. Default: 100000.
+    @param log_level: Logging level, default to INFO.
+    @param log_file: Path to the log file. If provided, logs will be written to this file as well as to the console.
+    @return: None
+    """
+
+    setup_logger(log_level, log_file)
+    logging.info(f"Packing sequences of {input}.")
+
+    if format == PACKED_FORMAT:
+        logging.error(f"{input} is already packed.")
+        raise ValueError(f"{input} is already packed.")
+    if output is None:
+        output = Path(input).with_suffix('.gbqc')
+
+    if format in SEQUENCE_FORMATS:
+        if label_column is not None:
+            logging.warning(f"{format.upper()} files have no label column, ignoring label column '{label_column}'.")
+        sequence_columns, label_column = [SEQUENCE_COLUMN], None
+        chunks = ({SEQUENCE_COLUMN: chunk} for chunk in iter_sequence_file(input, format, chunk_size))
+    else:
+        sequence_columns = sequence_column
+        columns = sequence_column + ([label_column] if label_column is not None else [])
+        chunks = iter_csv_chunks(input, format, columns, sequence_column, chunk_size=chunk_size)
+
+    write_packed(chunks, output, sequence_columns, label_column=label_column, source=Path(input).name, source_format=format)
+    logging.info("Packing successfully completed.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='A tool for packing sequences into a memory-mapped file read by the other tools with --format packed.')
+    parser.add_argument('--input', type=str, help='Path to the input file.', required=True)
+    parser.add_argument('--format', help="Format of the input file.", choices=[f for f in INPUT_FORMATS if f != PACKED_FORMAT], required=True)
+    parser.add_argument('--output', type=str, default=None,
+                        help='Path to the packed sequence file. Default: the input path with the extension .gbqc.')
+    parser.add_argument('--sequence_column', type=str,
+                        help='Name of the columns with sequences to pack for datasets in CSV/TSV format. '
+                             'Sequences of FASTA/FASTQ files are packed into the column sequence.', nargs='+', default=['sequence'])
+    parser.add_argument('--label_column', type=str, default=None,
+                        help='Name of the label column to pack for datasets in CSV/TSV format.')
+    parser.add_argument('--chunk_size', type=int, default=100000,
+                        help='Number of sequences (or rows for CSV/TSV) read and packed in one chunk. Default: 100000.')
+    parser.add_argument('--log_level', type=str, help='Logging level, default to INFO.',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], default='INFO')
+    parser.add_argument('--log_file', type=str, help='Path to the log file. If provided, logs will be written to this file as well as to the console.', default=None)
+
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    run(input = args.input,
+        format = args.format,
+        output = args.output,
+        sequence_column = args.sequence_column,
+        label_column = args.label_column,
+        chunk_size = args.chunk_size,
+        log_level = args.log_level,
+        log_file = args.log_file
+    )
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 from datetime import datetime
 
+from genbenchQC.utils.kmers import differential_kmers
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="en">
@@ -157,6 +159,7 @@ HTML_TEMPLATE = """
                 <a href="#per-position-reversed-nucleotide-content">Per Position Reversed Nucleotide Content</a>
                 <a href="#per-sequence-gc-content">Per Sequence GC Content</a>
             </div>
+            {{kmer_spectrum_link}}
         </div>
 
         <div class="content">
@@ -213,7 +216,7 @@ HTML_TEMPLATE = """
 
                 <h3 id="sequence-lengths">Sequence lengths</h3>
                 <!-- This will be populated with png plot --->
-                <img src={{sequence_length_plot}} alt="Sequence Lengths Plot" style="max-width: 50%; height: auto; display: block; margin: 0 auto;">
+                {{sequence_length_plot}}
 
                 <div id="sequence-duplication-levels">
                     <h3>Duplicate sequences</h3>
@@ -235,23 +238,25 @@ HTML_TEMPLATE = """
 
             <section id="per-sequence-descriptive-stats">
                 <h2>Per Sequence Descriptive Stats</h2>
+                {{distributions_note}}
 
                 <h3 id="per-sequence-nucleotide-content">Per Sequence Nucleotide Content</h3>
-                <img src={{per-sequence-nucleotide-content}} alt="Per Sequence Nucleotide Content" style="max-width: 100%; height: auto;">
+                {{per-sequence-nucleotide-content}}
 
                 <h3 id="per-sequence-dinucleotide-content">Per Sequence Dinucleotide Content</h3>
-                <img src={{per-sequence-dinucleotide-content}} alt="Per Sequence Dinucleotide Content" style="max-width: 100%; height: auto;">
+                {{per-sequence-dinucleotide-content}}
 
                 <h3 id="per-position-nucleotide-content">Per Position Nucleotide Content</h3>
-                <img src={{per-position-nucleotide-content}} alt="Per Position Nucleotide Content" style="max-width: 100%; height: auto;">
+                {{per-position-nucleotide-content}}
 
                 <h3 id="per-position-reversed-nucleotide-content">Per Position Reversed Nucleotide Content</h3>
-                <img src={{per-position-reversed-nucleotide-content}} alt="Per Position Reversed Nucleotide Content" style="max-width: 100%; height: auto;">
+                {{per-position-reversed-nucleotide-content}}
 
                 <h3 id="per-sequence-gc-content">Per Sequence GC Content</h3>
-                <img src={{per-sequence-gc-content}} alt="Per Sequence GC Content" style="max-width: 50%; height: auto; display: block; margin: 0 auto;">
+                {{per-sequence-gc-content}}
 
             </section>
+            {{kmer_spectrum_section}}
         </div>
     </div>
 
@@ -319,12 +324,80 @@ def put_data(html_template, placeholder, data):
     # Replace all occurrences of the placeholder with the data
     return html_template.replace(placeholder, data)
 
+def get_plot_html(plots_path, name, alt, style):
+    """
+    Image of a plot, or a note when its statistic was not computed.
+    """
+    if name not in plots_path:
+        return "<p>Not computed.</p>"
+    return f'<img src={plots_path[name]} alt="{alt}" style="{style}">'
+
 def escape_str(s):
     """
     Add \" around the string to escape it for HTML.
     """
     return '"' + s + '"'
 
+def get_distributions_note(stats1, stats2):
+    """
+    Note about how the per sequence statistics and their tests were summarized,
+    empty when they cover all sequences of both datasets.
+    """
+    if 'Distribution sketches' in stats1.stats or 'Distribution sketches' in stats2.stats:
+        return ("<p>Sequence lengths and per sequence statistics are summarized by fixed-size sketches "
+                "(exact histograms of lengths, t-digests of the other statistics) and compared through them. "
+                "Plots show evenly spaced quantiles of the sketches. Per position statistics cover all sequences.</p>")
+    notes = []
+    for seq_stats in [stats1, stats2]:
+        if 'Distribution sampling' in seq_stats.stats:
+            sampling = seq_stats.stats['Distribution sampling']
+            notes.append(f"{sampling['Sample size']} of {sampling['Number of sequences']} sequences of {seq_stats.label}")
+    if not notes:
+        return ""
+    return (f"<p>Sequence lengths, per sequence statistics and their comparison are computed from random samples: "
+            f"{', '.join(notes)}. Per position statistics cover all sequences.</p>")
+
+def get_kmer_spectrum_section(stats1, stats2, plots_path, results, n_kmers=10):
+    """
+    Navigation link and section comparing the k-mer spectra, empty when they were not counted for both datasets
+    or no k-mer size was compared, see flag_kmer_spectrum.
+    @return: A tuple (link, section) of HTML strings.
+    """
+    if 'K-mer spectrum' not in results or not results['K-mer spectrum'][0]:
+        return "", ""
+
+    rows = []
+    for k, divergence in results['K-mer spectrum'][0].items():
+        ratios = differential_kmers(stats1.stats['K-mer spectrum'][k], stats2.stats['K-mer spectrum'][k], n=n_kmers)
+        kmers = ', '.join(f"{kmer} ({ratio:+.2f})" for kmer, ratio in ratios.items())
+        rows.append(f"""
+                    <tr>
+                        <td style="text-align: center;">{k}</td>
+                        <td style="text-align: center;">{divergence:.4f}</td>
+                        <td class="sequence_column">{kmers}</td>
+                    </tr>""")
+
+    link = '<a href="#kmer-spectrum">K-mer Spectrum</a>'
+    section = f"""
+            <section id="kmer-spectrum">
+                <h2>K-mer Spectrum</h2>
+                <p>Jensen-Shannon divergence of the k-mer frequencies and the k-mers with the most different frequencies,
+                   with the log2 ratio of their frequencies in {stats1.label} and {stats2.label}.</p>
+                <table style="width: 100%; border-collapse: collapse; margin: 20px 0;">
+                    <thead>
+                        <tr>
+                            <th>k</th>
+                            <th>Divergence</th>
+                            <th class="sequence_column">Most different k-mers</th>
+                        </tr>
+                    </thead>
+                    <tbody>{''.join(rows)}
+                    </tbody>
+                </table>
+                <img src={plots_path['K-mer spectrum']} alt="K-mer Spectrum" style="max-width: 100%; height: auto;">
+            </section>"""
+    return link, section
+
 def get_dataset_html_template(stats1, stats2, plots_path, results):
     """
     Returns the HTML template for the report.
@@ -339,30 +412,35 @@ def get_dataset_html_template(stats1, stats2, plots_path, results):
     html_template = put_data(html_template, "{{seq_col2}}", str(stats2.seq_column) if stats2.seq_column is not None else "N/A")
     html_template = put_data(html_template, "{{number_of_sequences1}}", str(stats1.stats['Number of sequences']))
     html_template = put_data(html_template, "{{number_of_sequences2}}", str(stats2.stats['Number of sequences']))
-    html_template = put_data(html_template, "{{dedup_sequences1}}", str(stats1.stats['Number of sequences left after deduplication']))
-    html_template = put_data(html_template, "{{dedup_sequences2}}", str(stats2.stats['Number of sequences left after deduplication']))
+    html_template = put_data(html_template, "{{dedup_sequences1}}", str(stats1.stats.get('Number of sequences left after deduplication', "N/A")))
+    html_template = put_data(html_template, "{{dedup_sequences2}}", str(stats2.stats.get('Number of sequences left after deduplication', "N/A")))
     html_template = put_data(html_template, "{{number_of_bases1}}", str(stats1.stats['Number of bases']))
     html_template = put_data(html_template, "{{number_of_bases2}}", str(stats2.stats['Number of bases']))
     html_template = put_data(html_template, "{{unique_bases1}}", ', '.join(x for x in stats1.stats['Unique bases']))
     html_template = put_data(html_template, "{{unique_bases2}}", ', '.join(x for x in stats2.stats['Unique bases']))
     html_template = put_data(html_template, "{{gc_content1}}", f"{(stats1.stats['%GC content']*100):.2f}")  
     html_template = put_data(html_template, "{{gc_content2}}", f"{(stats2.stats['%GC content']*100):.2f}")
-
-    html_template = put_data(html_template, "{{sequence_length_plot}}", str(plots_path['Sequence lengths']))
-    html_template = put_data(html_template, "{{per-sequence-nucleotide-content}}", str(plots_path['Per sequence nucleotide content']))
-    html_template = put_data(html_template, "{{per-sequence-dinucleotide-content}}", str(plots_path['Per sequence dinucleotide content']))
-    html_template = put_data(html_template, "{{per-position-nucleotide-content}}", str(plots_path['Per position nucleotide content']))
-    html_template = put_data(html_template, "{{per-position-reversed-nucleotide-content}}", str(plots_path['Per position reversed nucleotide content']))
-    html_template = put_data(html_template, "{{per-sequence-gc-content}}", str(plots_path['Per sequence GC content']))
+    html_template = put_data(html_template, "{{distributions_note}}", get_distributions_note(stats1, stats2))
+
+    html_template = put_data(html_template, "{{sequence_length_plot}}", get_plot_html(plots_path, 'Sequence lengths', "Sequence Lengths Plot", "max-width: 50%; height: auto; display: block; margin: 0 auto;"))
+    html_template = put_data(html_template, "{{per-sequence-nucleotide-content}}", get_plot_html(plots_path, 'Per sequence nucleotide content', "Per Sequence Nucleotide Content", "max-width: 100%; height: auto;"))
+    html_template = put_data(html_template, "{{per-sequence-dinucleotide-content}}", get_plot_html(plots_path, 'Per sequence dinucleotide content', "Per Sequence Dinucleotide Content", "max-width: 100%; height: auto;"))
+    html_template = put_data(html_template, "{{per-position-nucleotide-content}}", get_plot_html(plots_path, 'Per position nucleotide content', "Per Position Nucleotide Content", "max-width: 100%; height: auto;"))
+    html_template = put_data(html_template, "{{per-position-reversed-nucleotide-content}}", get_plot_html(plots_path, 'Per position reversed nucleotide content', "Per Position Reversed Nucleotide Content", "max-width: 100%; height: auto;"))
+    html_template = put_data(html_template, "{{per-sequence-gc-content}}", get_plot_html(plots_path, 'Per sequence GC content', "Per Sequence GC Content", "max-width: 50%; height: auto; display: block; margin: 0 auto;"))
+    kmer_spectrum_link, kmer_spectrum_section = get_kmer_spectrum_section(stats1, stats2, plots_path, results)
+    html_template = put_data(html_template, "{{kmer_spectrum_link}}", kmer_spectrum_link)
+    html_template = put_data(html_template, "{{kmer_spectrum_section}}", kmer_spectrum_section)
 
     # take max 10 sequences for sequence duplication levels, results['Sequence duplication levels'][0] is a list of sequences
-    sequence_duplication_levels = results['Duplication between labels'][0][:10]
+    duplicates = results['Duplication between labels'][0] if 'Duplication between labels' in results else []
+    sequence_duplication_levels = duplicates[:10]
     html_template = put_data(html_template, "{{sequence_duplication_levels}}",
                              '[' + ', '.join(escape_str(seq) for seq in sequence_duplication_levels) + ']')
-    if len(results['Duplication between labels'][0]) > 10:
+    if len(duplicates) > 10:
         # If there are more than 10 sequences, we show how many more there are
         # and set the rest to a placeholder
-        html_template = put_data(html_template, "{{sequence_duplication_levels_rest}}", str(len(results['Duplication between labels'][0]) - 10))
+        html_template = put_data(html_template, "{{sequence_duplication_levels_rest}}", str(len(duplicates) - 10))
     else:
         # If there are 10 or fewer sequences, we set the rest to 0
         html_template = put_data(html_template, "{{sequence_duplication_levels_rest}}", "0")
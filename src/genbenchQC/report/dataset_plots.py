@@ -3,6 +3,8 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import logging
 
+from genbenchQC.utils.kmers import differential_kmers
+
 def plot_lengths(stats1, stats2, result, dist_thresh, plot_type='boxen'):
     """
     Plot the sequence lengths of two sequences.
@@ -274,6 +276,44 @@ def plot_per_base_sequence_comparison(stats1, stats2, stats_name, result, p_valu
 
     return fig
 
+def plot_kmer_spectrum(stats1, stats2, result, divergence_thresh, n_labels=5):
+    """
+    Plot the k-mer frequencies of two sequences against each other, one panel per k-mer size.
+    K-mers with the most different frequencies are labeled, panels with a divergence above the threshold are highlighted.
+    """
+    spectra1 = stats1.stats['K-mer spectrum']
+    spectra2 = stats2.stats['K-mer spectrum']
+    sizes = sorted(result[0])
+
+    fig, axs = plt.subplots(1, len(sizes), figsize=(5 * len(sizes), 5), dpi=300, squeeze=False)
+    red_flag = False
+    for ax, k in zip(axs[0], sizes):
+        df = pd.concat([spectra1[k].frequencies(), spectra2[k].frequencies()], axis=1).fillna(0)
+        limits = [df.values[df.values > 0].min() / 2, df.values.max() * 2]
+        # k-mers missing in one dataset are drawn at the lower limit of the log scale
+        df = df.clip(lower=limits[0])
+        ax.scatter(df[0], df[1], s=4, alpha=0.5, color='grey')
+        ax.plot(limits, limits, color='black', linewidth=0.5, linestyle='--')
+        ax.set_xscale('log')
+        ax.set_yscale('log')
+
+        for kmer in differential_kmers(spectra1[k], spectra2[k], n=n_labels):
+            ax.annotate(kmer, (df.loc[kmer, 0], df.loc[kmer, 1]), fontsize=8)
+
+        if result[0][k] > divergence_thresh:
+            red_flag = True
+            ax.set_facecolor((1, 0, 0, 0.1))
+        ax.set_title(f'{k}-mers (JS divergence {result[0][k]:.4f})', fontsize=14)
+        ax.set_xlabel(f'Frequency in {stats1.label}', fontsize=12)
+        ax.set_ylabel(f'Frequency in {stats2.label}', fontsize=12)
+
+    if red_flag:
+        fig.legend(handles=[plt.Rectangle((0, 0), 1, 1, color='red', alpha=0.1)], labels=[f'Divergence > {divergence_thresh}'],
+                   loc='upper center', bbox_to_anchor=(0.5, 0), fontsize='12')
+    fig.tight_layout()
+
+    return fig
+
 def melt_stats(stats1, stats2, stats_name, var_name='Metric', value_name='Value', keep_positions=False):
     """
     Melt the stats DataFrame to long format and add a label column.
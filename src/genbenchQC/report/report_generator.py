@@ -11,6 +11,7 @@ from genbenchQC.report.sequence_html_report import get_sequence_html_template
 from genbenchQC.report.dataset_html_report import get_dataset_html_template
 from genbenchQC.report.split_html_report import get_train_test_html_template
 from genbenchQC.utils.input_utils import write_stats_json
+from genbenchQC.utils.columnar import write_stats_columnar
 from genbenchQC.report import dataset_plots
 from genbenchQC.report import sequences_plots
 
@@ -24,56 +25,68 @@ def generate_sequence_plots(stats_dict, output_path, end_position, plot_type='bo
     nucleotides = sorted(stats_dict['Unique bases'])
 
     plots_paths = {}
-    fig = sequences_plots.hist_plot_one_stat(
-        stats_dict,
-        stats_name='Sequence lengths',
-        x_label='Sequence lengths',
-        title='Sequence lengths'
-    )
-
-    plots_paths['Sequence lengths'] = Path(output_path.name) / 'sequence_lengths.png'
-    fig.savefig(output_path / 'sequence_lengths.png', bbox_inches='tight')
-    plt.close(fig)
-
-    fig = sequences_plots.hist_plot_one_stat(
-        stats_dict,
-        stats_name='Per sequence GC content',
-        x_label='GC content (%)',
-        title='Per sequence GC content'
-    )
-    plots_paths['Per sequence GC content'] = Path(output_path.name) / 'per_sequence_gc_content.png'
-    fig.savefig(output_path / 'per_sequence_gc_content.png', bbox_inches='tight')
-    plt.close(fig)
-
-    fig = sequences_plots.plot_nucleotides(stats_dict, nucleotides=nucleotides, plot_type=plot_type)
-    plots_paths['Per sequence nucleotide content'] = Path(output_path.name) / 'per_sequence_nucleotide_content.png'
-    fig.savefig(output_path / 'per_sequence_nucleotide_content.png', bbox_inches='tight')
-    plt.close(fig)  
-
-    fig = sequences_plots.plot_dinucleotides(stats_dict, nucleotides=nucleotides, plot_type=plot_type)
-    plots_paths['Per sequence dinucleotide content'] = Path(output_path.name) / 'per_sequence_dinucleotide_content.png'
-    fig.savefig(output_path / 'per_sequence_dinucleotide_content.png', bbox_inches='tight')
-    plt.close(fig)
-
-    fig = sequences_plots.plot_per_position_nucleotide_content(
-        stats_dict,
-        stat_name='Per position nucleotide content',
-        nucleotides=nucleotides,
-        end_position=end_position,
-    )
-    plots_paths['Per position nucleotide content'] = Path(output_path.name) / 'per_position_nucleotide_content.png'
-    fig.savefig(output_path / 'per_position_nucleotide_content.png', bbox_inches='tight')
-    plt.close(fig)
-
-    fig = sequences_plots.plot_per_position_nucleotide_content(
-        stats_dict,
-        stat_name='Per position reversed nucleotide content',
-        nucleotides=nucleotides,
-        end_position=end_position,
-    )
-    plots_paths['Per position reversed nucleotide content'] = Path(output_path.name) / 'per_position_reversed_nucleotide_content.png'
-    fig.savefig(output_path / 'per_position_reversed_nucleotide_content.png', bbox_inches='tight')
-    plt.close(fig)
+    if 'Sequence lengths' in stats_dict:
+        fig = sequences_plots.hist_plot_one_stat(
+            stats_dict,
+            stats_name='Sequence lengths',
+            x_label='Sequence lengths',
+            title='Sequence lengths'
+        )
+
+        plots_paths['Sequence lengths'] = Path(output_path.name) / 'sequence_lengths.png'
+        fig.savefig(output_path / 'sequence_lengths.png', bbox_inches='tight')
+        plt.close(fig)
+
+    if 'Per sequence GC content' in stats_dict:
+        fig = sequences_plots.hist_plot_one_stat(
+            stats_dict,
+            stats_name='Per sequence GC content',
+            x_label='GC content (%)',
+            title='Per sequence GC content'
+        )
+        plots_paths['Per sequence GC content'] = Path(output_path.name) / 'per_sequence_gc_content.png'
+        fig.savefig(output_path / 'per_sequence_gc_content.png', bbox_inches='tight')
+        plt.close(fig)
+
+    if 'Per sequence nucleotide content' in stats_dict:
+        fig = sequences_plots.plot_nucleotides(stats_dict, nucleotides=nucleotides, plot_type=plot_type)
+        plots_paths['Per sequence nucleotide content'] = Path(output_path.name) / 'per_sequence_nucleotide_content.png'
+        fig.savefig(output_path / 'per_sequence_nucleotide_content.png', bbox_inches='tight')
+        plt.close(fig)  
+
+    if 'Per sequence dinucleotide content' in stats_dict:
+        fig = sequences_plots.plot_dinucleotides(stats_dict, nucleotides=nucleotides, plot_type=plot_type)
+        plots_paths['Per sequence dinucleotide content'] = Path(output_path.name) / 'per_sequence_dinucleotide_content.png'
+        fig.savefig(output_path / 'per_sequence_dinucleotide_content.png', bbox_inches='tight')
+        plt.close(fig)
+
+    if 'Per position nucleotide content' in stats_dict:
+        fig = sequences_plots.plot_per_position_nucleotide_content(
+            stats_dict,
+            stat_name='Per position nucleotide content',
+            nucleotides=nucleotides,
+            end_position=end_position,
+        )
+        plots_paths['Per position nucleotide content'] = Path(output_path.name) / 'per_position_nucleotide_content.png'
+        fig.savefig(output_path / 'per_position_nucleotide_content.png', bbox_inches='tight')
+        plt.close(fig)
+
+    if 'Per position reversed nucleotide content' in stats_dict:
+        fig = sequences_plots.plot_per_position_nucleotide_content(
+            stats_dict,
+            stat_name='Per position reversed nucleotide content',
+            nucleotides=nucleotides,
+            end_position=end_position,
+        )
+        plots_paths['Per position reversed nucleotide content'] = Path(output_path.name) / 'per_position_reversed_nucleotide_content.png'
+        fig.savefig(output_path / 'per_position_reversed_nucleotide_content.png', bbox_inches='tight')
+        plt.close(fig)
+
+    if 'Per position mean quality' in stats_dict:
+        fig = sequences_plots.plot_per_position_mean_quality(stats_dict, end_position=end_position)
+        plots_paths['Per position mean quality'] = Path(output_path.name) / 'per_position_mean_quality.png'
+        fig.savefig(output_path / 'per_position_mean_quality.png', bbox_inches='tight')
+        plt.close(fig)
 
     return plots_paths
 
@@ -105,14 +118,14 @@ def generate_train_test_html_report(clusters, train_filename, train_seq, test_fi
     with open(output_path, 'w') as file:
         file.write(template)
 
-def generate_dataset_html_report(stats1, stats2, results, output_path, plots_path, threshold, end_position, plot_type):
+def generate_dataset_html_report(stats1, stats2, results, output_path, plots_path, threshold, kmer_threshold, end_position, plot_type):
     """
     Generate an HTML report comparing the statistics of two datasets.
     """
     plots_path.mkdir(parents=True, exist_ok=True)
 
     # generate 
-    plots_paths = generate_dataset_plots(stats1, stats2, results, plots_path, threshold, end_position, plot_type)
+    plots_paths = generate_dataset_plots(stats1, stats2, results, plots_path, threshold, kmer_threshold, end_position, plot_type)
 
     # Load the HTML template
     template = get_dataset_html_template(stats1, stats2, plots_paths, results)
@@ -120,7 +133,7 @@ def generate_dataset_html_report(stats1, stats2, results, output_path, plots_pat
     with open(output_path, 'w') as file:
         file.write(template)
 
-    if results['Duplication between labels'][0]:
+    if 'Duplication between labels' in results and results['Duplication between labels'][0]:
         # save duplicate sequences to a file
         duplicate_seqs = results['Duplication between labels'][0]
         # remove extension from output path, add '_duplicates.txt'
@@ -133,6 +146,12 @@ def generate_dataset_html_report(stats1, stats2, results, output_path, plots_pat
 def generate_json_report(stats_dict, output_path):
     write_stats_json(stats_dict, output_path)
 
+def generate_columnar_report(stats_dict, output_path, table_format):
+    """
+    Write the statistics as columnar tables (parquet or npz) with a JSON manifest, see write_stats_columnar.
+    """
+    write_stats_columnar(stats_dict, output_path, table_format)
+
 def generate_simple_report(results, output_path):
 
     logging.info(f"Generating simple report: {output_path}")
@@ -147,7 +166,7 @@ def generate_simple_report(results, output_path):
     # save to csv
     df.to_csv(output_path, index=False, header=False)
 
-def generate_dataset_plots(stats1, stats2, results, output_path, threshold, end_position, plot_type='boxen'):
+def generate_dataset_plots(stats1, stats2, results, output_path, threshold, kmer_threshold, end_position, plot_type='boxen'):
 
     logging.info(f"Generating PNG plots at: {output_path}")
 
@@ -156,85 +175,103 @@ def generate_dataset_plots(stats1, stats2, results, output_path, threshold, end_
     bases_overlap = list(set(stats1.stats['Unique bases']) & set(stats2.stats['Unique bases']))
 
     # Plot per sequence nucleotide content
-    fig = dataset_plots.plot_nucleotides(
-        stats1,
-        stats2,
-        nucleotides = bases_overlap,
-        result=results['Per sequence nucleotide content'],
-        dist_thresh=threshold,
-        plot_type=plot_type
-    )
-    plots_paths['Per sequence nucleotide content'] = Path(output_path.name) / 'per_sequence_nucleotide_content.png'
-    fig.savefig(output_path / 'per_sequence_nucleotide_content.png', bbox_inches='tight')
-    plt.close(fig)
+    if 'Per sequence nucleotide content' in results:
+        fig = dataset_plots.plot_nucleotides(
+            stats1,
+            stats2,
+            nucleotides = bases_overlap,
+            result=results['Per sequence nucleotide content'],
+            dist_thresh=threshold,
+            plot_type=plot_type
+        )
+        plots_paths['Per sequence nucleotide content'] = Path(output_path.name) / 'per_sequence_nucleotide_content.png'
+        fig.savefig(output_path / 'per_sequence_nucleotide_content.png', bbox_inches='tight')
+        plt.close(fig)
 
     # Plot per sequence dinucleotide content
-    fig = dataset_plots.plot_dinucleotides(
-        stats1,
-        stats2,
-        nucleotides = bases_overlap,
-        result=results['Per sequence dinucleotide content'],
-        dist_thresh=threshold,
-        plot_type=plot_type
-    )
-    plots_paths['Per sequence dinucleotide content'] = Path(output_path.name) / 'per_sequence_dinucleotide_content.png'
-    fig.savefig(output_path / 'per_sequence_dinucleotide_content.png', bbox_inches='tight')
-    plt.close(fig)
+    if 'Per sequence dinucleotide content' in results:
+        fig = dataset_plots.plot_dinucleotides(
+            stats1,
+            stats2,
+            nucleotides = bases_overlap,
+            result=results['Per sequence dinucleotide content'],
+            dist_thresh=threshold,
+            plot_type=plot_type
+        )
+        plots_paths['Per sequence dinucleotide content'] = Path(output_path.name) / 'per_sequence_dinucleotide_content.png'
+        fig.savefig(output_path / 'per_sequence_dinucleotide_content.png', bbox_inches='tight')
+        plt.close(fig)
     
     # Plot per position nucleotide content
-    fig = dataset_plots.plot_per_base_sequence_comparison(
-        stats1,
-        stats2,
-        stats_name='Per position nucleotide content',
-        result=results['Per position nucleotide content'],
-        p_value_thresh=threshold,
-        nucleotides = bases_overlap,
-        end_position=end_position,
-        x_label='Position in sequence',
-        title='Nucleotide composition per position',
-    )
-    plots_paths['Per position nucleotide content'] = Path(output_path.name) / 'per_position_nucleotide_content.png'
-    fig.savefig(output_path / 'per_position_nucleotide_content.png', bbox_inches='tight')   
-    plt.close(fig)
+    if 'Per position nucleotide content' in results:
+        fig = dataset_plots.plot_per_base_sequence_comparison(
+            stats1,
+            stats2,
+            stats_name='Per position nucleotide content',
+            result=results['Per position nucleotide content'],
+            p_value_thresh=threshold,
+            nucleotides = bases_overlap,
+            end_position=end_position,
+            x_label='Position in sequence',
+            title='Nucleotide composition per position',
+        )
+        plots_paths['Per position nucleotide content'] = Path(output_path.name) / 'per_position_nucleotide_content.png'
+        fig.savefig(output_path / 'per_position_nucleotide_content.png', bbox_inches='tight')   
+        plt.close(fig)
 
     # Plot per reversed position nucleotide content
-    fig = dataset_plots.plot_per_base_sequence_comparison(
-        stats1,
-        stats2,
-        stats_name='Per position reversed nucleotide content',
-        result=results['Per position reversed nucleotide content'],
-        p_value_thresh=threshold,
-        nucleotides = bases_overlap,
-        end_position=end_position,
-        x_label='Position in reversed sequence',
-        title='Reversed nucleotide composition per position',
-    )
-    plots_paths['Per position reversed nucleotide content'] = Path(output_path.name) / 'per_position_reversed_nucleotide_content.png'
-    fig.savefig(output_path / 'per_position_reversed_nucleotide_content.png', bbox_inches='tight')
-    plt.close(fig)
+    if 'Per position reversed nucleotide content' in results:
+        fig = dataset_plots.plot_per_base_sequence_comparison(
+            stats1,
+            stats2,
+            stats_name='Per position reversed nucleotide content',
+            result=results['Per position reversed nucleotide content'],
+            p_value_thresh=threshold,
+            nucleotides = bases_overlap,
+            end_position=end_position,
+            x_label='Position in reversed sequence',
+            title='Reversed nucleotide composition per position',
+        )
+        plots_paths['Per position reversed nucleotide content'] = Path(output_path.name) / 'per_position_reversed_nucleotide_content.png'
+        fig.savefig(output_path / 'per_position_reversed_nucleotide_content.png', bbox_inches='tight')
+        plt.close(fig)
 
     # Plot length distribution
-    fig = dataset_plots.plot_lengths(
-        stats1,
-        stats2,
-        result=results['Sequence lengths'],
-        dist_thresh=threshold,
-        plot_type=plot_type,
-    )
-    plots_paths['Sequence lengths'] = Path(output_path.name) / 'sequence_lengths.png'
-    fig.savefig(output_path / 'sequence_lengths.png', bbox_inches='tight')
-    plt.close(fig)
+    if 'Sequence lengths' in results:
+        fig = dataset_plots.plot_lengths(
+            stats1,
+            stats2,
+            result=results['Sequence lengths'],
+            dist_thresh=threshold,
+            plot_type=plot_type,
+        )
+        plots_paths['Sequence lengths'] = Path(output_path.name) / 'sequence_lengths.png'
+        fig.savefig(output_path / 'sequence_lengths.png', bbox_inches='tight')
+        plt.close(fig)
 
     # Plot per sequence GC content
-    fig = dataset_plots.plot_gc_content(
-        stats1,
-        stats2,
-        result=results['Per sequence GC content'],
-        dist_thresh=threshold,
-        plot_type=plot_type,
-    )
-    plots_paths['Per sequence GC content'] = Path(output_path.name) / 'per_sequence_gc_content.png'
-    fig.savefig(output_path / 'per_sequence_gc_content.png', bbox_inches='tight')
-    plt.close(fig)
+    if 'Per sequence GC content' in results:
+        fig = dataset_plots.plot_gc_content(
+            stats1,
+            stats2,
+            result=results['Per sequence GC content'],
+            dist_thresh=threshold,
+            plot_type=plot_type,
+        )
+        plots_paths['Per sequence GC content'] = Path(output_path.name) / 'per_sequence_gc_content.png'
+        fig.savefig(output_path / 'per_sequence_gc_content.png', bbox_inches='tight')
+        plt.close(fig)
+
+    # Plot k-mer spectra, only when they were counted for both datasets and at least one k-mer size was compared
+    if 'K-mer spectrum' in results and results['K-mer spectrum'][0]:
+        fig = dataset_plots.plot_kmer_spectrum(
+            stats1,
+            stats2,
+            result=results['K-mer spectrum'],
+            divergence_thresh=kmer_threshold,
+        )
+        plots_paths['K-mer spectrum'] = Path(output_path.name) / 'kmer_spectrum.png'
+        fig.savefig(output_path / 'kmer_spectrum.png', bbox_inches='tight')
+        plt.close(fig)
 
     return plots_paths
\ No newline at end of file
@@ -168,7 +168,7 @@ HTML_TEMPLATE = """
 
                 <h3 id="sequence-lengths">Sequence lengths</h3>
                 <!-- This will be populated with png plot --->
-                <img src={{sequence_length_plot}} alt="Sequence Lengths Plot" style="max-width: 100%; height: auto;">
+                {{sequence_length_plot}}
 
                 <div id="sequence-duplication-levels">
                     <h3>Sequence duplication levels</h3>
@@ -185,27 +185,30 @@ HTML_TEMPLATE = """
                     </table>
                     <div id="sequence-duplication-levels-info">
                         <p>And {{sequence_duplication_levels_rest}} more</p>
+                        {{sequence_duplication_levels_note}}
                     </div>
                 </div>
             </section>
 
             <section id="per-sequence-descriptive-stats">
                 <h2>Per Sequence Descriptive Stats</h2>
+                {{distributions_note}}
 
                 <h3 id="per-sequence-nucleotide-content">Per Sequence Nucleotide Content</h3>
-                <img src={{per-sequence-nucleotide-content}} alt="Per Sequence Nucleotide Content" style="max-width: 100%; height: auto;">
+                {{per-sequence-nucleotide-content}}
 
                 <h3 id="per-sequence-dinucleotide-content">Per Sequence Dinucleotide Content</h3>
-                <img src={{per-sequence-dinucleotide-content}} alt="Per Sequence Dinucleotide Content" style="max-width: 100%; height: auto;">
+                {{per-sequence-dinucleotide-content}}
 
                 <h3 id="per-position-nucleotide-content">Per Position Nucleotide Content</h3>
-                <img src={{per-position-nucleotide-content}} alt="Per Position Nucleotide Content" style="max-width: 100%; height: auto;">
+                {{per-position-nucleotide-content}}
 
                 <h3 id="per-position-reversed-nucleotide-content">Per Position Reversed Nucleotide Content</h3>
-                <img src={{per-position-reversed-nucleotide-content}} alt="Per Position Reversed Nucleotide Content" style="max-width: 100%; height: auto;">
+                {{per-position-reversed-nucleotide-content}}
+                {{per-position-mean-quality}}
 
                 <h3 id="per-sequence-gc-content">Per Sequence GC Content</h3>
-                <img src={{per-sequence-gc-content}} alt="Per Sequence GC Content" style="max-width: 100%; height: auto;">
+                {{per-sequence-gc-content}}
 
             </section>
         </div>
@@ -277,12 +280,67 @@ def put_data(html_template, placeholder, data):
     # Replace all occurrences of the placeholder with the data
     return html_template.replace(placeholder, data)
 
+def get_plot_html(plots_path, name, alt, style):
+    """
+    Image of a plot, or a note when its statistic was not computed.
+    """
+    if name not in plots_path:
+        return "<p>Not computed.</p>"
+    return f'<img src={plots_path[name]} alt="{alt}" style="{style}">'
+
 def escape_str(s):
     """
     Add \" around the string to escape it for HTML.
     """
     return '"' + s + '"'
 
+def get_dedup_sequences_text(stats):
+    """
+    Number of unique sequences, with its error bound when it was estimated.
+    """
+    if 'Number of sequences left after deduplication' not in stats:
+        return "N/A"
+    dedup_sequences = str(stats['Number of sequences left after deduplication'])
+    if 'Approximation error bounds' not in stats:
+        return dedup_sequences
+    bounds = stats['Approximation error bounds']['Number of sequences left after deduplication']
+    return f"~{dedup_sequences} (estimated with {bounds['Method']}, relative standard error {bounds['Relative standard error'] * 100:.2f}%)"
+
+def get_duplication_levels_note(stats):
+    """
+    Note about the accuracy of estimated duplication levels, empty when they were counted exactly.
+    """
+    if 'Approximation error bounds' not in stats:
+        return ""
+    bounds = stats['Approximation error bounds']['Sequence duplication levels']
+    return (f"<p>Counts are estimated with {bounds['Method']} tracking the {bounds['Tracked sequences']} most frequent sequences. "
+            f"Each count overestimates the true count by at most {bounds['Maximal overestimate of reported counts']} "
+            f"(guaranteed bound: {bounds['Guaranteed maximal overestimate']}).</p>")
+
+def get_distributions_note(stats):
+    """
+    Note about how the per sequence statistics were summarized, empty when they list all sequences.
+    """
+    if 'Distribution sketches' in stats:
+        return ("<p>Sequence lengths and per sequence statistics are summarized by fixed-size sketches: "
+                + ", ".join(f"{name}: {method}" for name, method in stats['Distribution sketches'].items())
+                + ". Plots show evenly spaced quantiles of the sketches. Per position statistics cover all sequences.</p>")
+    if 'Distribution sampling' not in stats:
+        return ""
+    sampling = stats['Distribution sampling']
+    return (f"<p>Sequence lengths and per sequence statistics are computed from a random sample of {sampling['Sample size']} "
+            f"of {sampling['Number of sequences']} sequences (seed {sampling['Seed']}). "
+            f"Per position statistics cover all sequences.</p>")
+
+def get_mean_quality_html(plots_path):
+    """
+    Section with the per position mean quality plot, empty for inputs without quality scores.
+    """
+    if 'Per position mean quality' not in plots_path:
+        return ""
+    return ('<h3 id="per-position-mean-quality">Per Position Mean Quality</h3>\n                '
+            + get_plot_html(plots_path, 'Per position mean quality', "Per Position Mean Quality", "max-width: 100%; height: auto;"))
+
 def get_sequence_html_template(stats, plots_path):
     """
     Returns the HTML template for the report.
@@ -296,18 +354,21 @@ def get_sequence_html_template(stats, plots_path):
     html_template = put_data(html_template, "{{number_of_bases}}", str(stats['Number of bases']))
     html_template = put_data(html_template, "{{unique_bases}}", ', '.join(x for x in stats['Unique bases']))
     html_template = put_data(html_template, "{{gc_content}}", f"{(stats['%GC content']*100):.2f}")  
-    html_template = put_data(html_template, "{{dedup_sequences}}", str(stats['Number of sequences left after deduplication']))  
-
-    html_template = put_data(html_template, "{{sequence_length_plot}}", str(plots_path['Sequence lengths']))
-    html_template = put_data(html_template, "{{per-sequence-nucleotide-content}}", str(plots_path['Per sequence nucleotide content']))
-    html_template = put_data(html_template, "{{per-sequence-dinucleotide-content}}", str(plots_path['Per sequence dinucleotide content']))
-    html_template = put_data(html_template, "{{per-position-nucleotide-content}}", str(plots_path['Per position nucleotide content']))
-    html_template = put_data(html_template, "{{per-position-reversed-nucleotide-content}}", str(plots_path['Per position reversed nucleotide content']))
-    html_template = put_data(html_template, "{{per-sequence-gc-content}}", str(plots_path['Per sequence GC content']))
+    html_template = put_data(html_template, "{{dedup_sequences}}", get_dedup_sequences_text(stats))
+    html_template = put_data(html_template, "{{sequence_duplication_levels_note}}", get_duplication_levels_note(stats))
+    html_template = put_data(html_template, "{{distributions_note}}", get_distributions_note(stats))
+
+    html_template = put_data(html_template, "{{sequence_length_plot}}", get_plot_html(plots_path, 'Sequence lengths', "Sequence Lengths Plot", "max-width: 100%; height: auto;"))
+    html_template = put_data(html_template, "{{per-sequence-nucleotide-content}}", get_plot_html(plots_path, 'Per sequence nucleotide content', "Per Sequence Nucleotide Content", "max-width: 100%; height: auto;"))
+    html_template = put_data(html_template, "{{per-sequence-dinucleotide-content}}", get_plot_html(plots_path, 'Per sequence dinucleotide content', "Per Sequence Dinucleotide Content", "max-width: 100%; height: auto;"))
+    html_template = put_data(html_template, "{{per-position-nucleotide-content}}", get_plot_html(plots_path, 'Per position nucleotide content', "Per Position Nucleotide Content", "max-width: 100%; height: auto;"))
+    html_template = put_data(html_template, "{{per-position-reversed-nucleotide-content}}", get_plot_html(plots_path, 'Per position reversed nucleotide content', "Per Position Reversed Nucleotide Content", "max-width: 100%; height: auto;"))
+    html_template = put_data(html_template, "{{per-position-mean-quality}}", get_mean_quality_html(plots_path))
+    html_template = put_data(html_template, "{{per-sequence-gc-content}}", get_plot_html(plots_path, 'Per sequence GC content', "Per Sequence GC Content", "max-width: 100%; height: auto;"))
 
     # take max 10 sequences for sequence duplication levels - stats['Sequence duplication levels'] is a dictionary
     # with sequence as key and count as value, we convert it to a list of tuples
-    sequence_duplication_levels = list(stats['Sequence duplication levels'].items())
+    sequence_duplication_levels = list(stats.get('Sequence duplication levels', {}).items())
     # Sort by count in descending order and take the top 10
     sequence_duplication_levels.sort(key=lambda x: x[1], reverse=True)
     # Limit to the first 10 sequences if there are more than 10
@@ -101,13 +101,12 @@ def plot_per_position_nucleotide_content(stats, stat_name, nucleotides, end_posi
     If end_position is specified, it will be used to limit the x-axis.
     """
 
+    seq_lengths = stats['Sequence lengths'].values.flatten()
     if not end_position:
         # Find the maximum sequence length from the stats
-        seq_lengths = stats['Sequence lengths'].values.flatten()
         end_position = max(seq_lengths)
     else:
         # Ensure end_position is not greater than the maximum sequence length
-        seq_lengths = stats['Sequence lengths'].values.flatten()
         max_length = int(max(seq_lengths))
         if end_position > max_length:
             logging.warning(f"end_position {end_position} is greater than the maximum sequence length {max_length}. Setting end_position to {max_length}.")
@@ -164,3 +163,20 @@ def plot_per_position_nucleotide_content(stats, stat_name, nucleotides, end_posi
     plt.subplots_adjust(wspace=0, hspace=0)
 
     return fig
+
+def plot_per_position_mean_quality(stats, end_position=None):
+    """
+    Plot the mean Phred quality at each position of the reads, up to end_position if given.
+    """
+    df = stats['Per position mean quality']
+    if end_position:
+        df = df.iloc[:end_position]
+
+    fig, ax = plt.subplots(1, 1, figsize=(10, 4), dpi=300)
+    ax.plot(df.index, df['Mean quality'], color='tab:blue', linewidth=2)
+    ax.set_xlabel('Position in sequence', fontsize=14)
+    ax.set_ylabel('Mean quality (Phred)', fontsize=14)
+    ax.set_title('Per position mean quality', fontsize=16)
+    ax.set_ylim(bottom=0)
+
+    return fig
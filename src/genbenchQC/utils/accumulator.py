@@ -0,0 +1,563 @@
+import numpy as np
+import pandas as pd
+
+from genbenchQC.utils.encoding import (SequenceBatch, encode_sequences, build_lookup_table, sequence_ids, count_per_position,
+                                       index_dtype, iter_sequence_chunks)
+from genbenchQC.utils.tables import CountTable, SketchTable, compact_counts
+from genbenchQC.utils.sketches import TDigest, IntegerHistogram
+from genbenchQC.utils.duplicates import DuplicationIndex, ApproximateDuplicationIndex, duplication_index_from_arrays
+from genbenchQC.utils.sampling import sampling_keys, select_sample
+from genbenchQC.utils.kmers import KmerSpectrum
+from genbenchQC.utils.fastq import QualityProfile
+from genbenchQC.utils.registry import STATISTICS
+
+class StatisticsAccumulator:
+    """
+    Accumulates sequence statistics from chunks of sequences.
+
+    Each call to update() encodes one chunk and adds its counts to the accumulated state,
+    so the chunk itself can be discarded afterwards. finalize() turns the counts into
+    the same statistics as SequenceStatistics computes from a list of sequences.
+    The alphabet is discovered on the fly; newly seen bases are appended to it.
+    It can also be given in advance with the symbols argument, to keep the order of bases fixed.
+    Duplicates are counted in a DuplicationIndex, which can be passed in to control which sequence texts are kept.
+
+    With max_sequences, per sequence statistics are kept only for a seeded random sample of at most max_sequences
+    sequences, while all other statistics still cover every sequence. The sample is the same however the sequences
+    are split into chunks, provided first_index is the index of the first sequence of this accumulator.
+
+    With sketch_distributions, per sequence statistics are not kept per sequence at all: each chunk is added
+    to fixed-size sketches of their distributions (SketchTable), so memory does not grow with the number of sequences.
+
+    With kmer_sizes, the k-mer spectrum of all sequences is counted for each of the given k-mer sizes (KmerSpectrum).
+
+    qualities holds the QualityProfile of FASTQ reads, if any. It is filled by the reader of the sequences rather than
+    by update(), as the chunks hold only the sequences, and is merged and exported with the other statistics.
+
+    statistics lists the optional statistics to compute (see registry.STATISTICS), counts needed only by other
+    statistics are not accumulated at all. Per sequence nucleotide counts and lengths are always kept, as they are cheap
+    and the sample and the per sequence GC content are built on them.
+    """
+
+    def __init__(self, symbols=None, duplicates=None, max_sequences=None, seed=0, first_index=0, sketch_distributions=False,
+                 kmer_sizes=None, statistics=None):
+        self.statistics = list(statistics) if statistics is not None else list(STATISTICS)
+        self.symbols = list(symbols) if symbols is not None else []
+        self.lookup = build_lookup_table(self.symbols)
+        self.n_sequences = 0
+        self.n_bases = 0
+        # total count of each base
+        self.base_counts = np.zeros(0, dtype=np.int64)
+        # per sequence counts are kept per chunk, each with the alphabet size at the time of the update
+        # and the smallest unsigned dtype that holds the lengths of the chunk
+        self.nucleotide_counts = []
+        self.dinucleotide_counts = []
+        self.lengths = []
+        self.per_position = np.zeros((0, 0), dtype=np.int64)
+        self.per_position_reversed = np.zeros((0, 0), dtype=np.int64)
+        self.duplicates = duplicates
+        if duplicates is None and self.counts_duplicates:
+            self.duplicates = DuplicationIndex()
+        # per sequence statistic -> SketchTable, or None if per sequence counts are kept
+        self.distributions = None
+        if sketch_distributions:
+            self.distributions = {
+                name: SketchTable(IntegerHistogram if name == 'Sequence lengths' else TDigest)
+                for name in _SKETCH_PREFIXES if name in self.statistics
+            }
+        # sketches already have a fixed size, there is nothing to sample
+        self.max_sequences = max_sequences if not sketch_distributions else None
+        self.seed = seed
+        self.first_index = first_index
+        # sampling keys of the sequences with per sequence counts, per chunk like the counts
+        self.sample_keys = []
+        # k -> KmerSpectrum
+        self.kmer_spectra = {}
+        if kmer_sizes and 'K-mer spectrum' in self.statistics:
+            self.kmer_spectra = {k: KmerSpectrum(k) for k in kmer_sizes}
+        self.qualities = None
+
+    @property
+    def counts_duplicates(self):
+        return 'Number of sequences left after deduplication' in self.statistics or 'Sequence duplication levels' in self.statistics
+
+    @property
+    def counts_per_position(self):
+        return 'Per position nucleotide content' in self.statistics or 'Per position reversed nucleotide content' in self.statistics
+
+    def update(self, sequences):
+        """
+        Add a chunk of sequences to the accumulated statistics.
+        Large chunks, e.g. a whole dataset, are encoded and counted in parts of bounded size, see iter_sequence_chunks,
+        so the temporaries of the counts do not grow with the input.
+        @param sequences: A list of sequences (str) or a SequenceBatch, whose buffer is used without encoding it again.
+        """
+        for chunk in iter_sequence_chunks(sequences):
+            buffer, offsets = encode_sequences(chunk)
+            self._update_encoded_chunk(buffer, offsets)
+            if self.duplicates is not None:
+                self.duplicates.update(chunk)
+
+    def update_encoded(self, buffer, offsets):
+        """
+        Add a chunk of encoded sequences to the accumulated statistics, in parts of bounded size like update().
+        Duplication levels are not updated, as they are counted on the sequences themselves, see update().
+        @param buffer: uint8 buffer with the concatenated sequences.
+        @param offsets: int64 offsets of the sequences in the buffer, see encode_sequences.
+        """
+        for chunk in iter_sequence_chunks(SequenceBatch(buffer, offsets)):
+            self._update_encoded_chunk(*chunk.encoded())
+
+    def _update_encoded_chunk(self, buffer, offsets):
+        """
+        Add encoded sequences to the accumulated statistics. Codes are int8 and sequence ids and count keys int32,
+        see build_lookup_table and index_dtype, pairs of bases int16.
+        """
+        if len(offsets) < 2:
+            return
+
+        self.add_symbols(buffer)
+
+        n_symbols = len(self.symbols)
+        n_sequences = len(offsets) - 1
+        codes = self.lookup[buffer]
+        lengths = np.diff(offsets)
+        max_length = int(lengths.max())
+        ids = sequence_ids(offsets)
+
+        self.base_counts = _resize(self.base_counts[None, :], 1, n_symbols)[0]
+        self.base_counts += np.bincount(codes, minlength=n_symbols)
+
+        keys = ids.astype(index_dtype(n_sequences * n_symbols))
+        keys *= n_symbols
+        keys += codes
+        nucleotide_counts = compact_counts(np.bincount(
+            keys, minlength=n_sequences * n_symbols
+        ).reshape(n_sequences, n_symbols), max_length)
+        del keys
+
+        dinucleotide_counts = None
+        if 'Per sequence dinucleotide content' in self.statistics:
+            # pairs of neighbouring bases, excluding pairs spanning two sequences
+            pairs = codes[:-1].astype(np.int16)
+            pairs *= n_symbols
+            pairs += codes[1:]
+            within_sequence = ids[:-1] == ids[1:]
+            keys = ids[:-1][within_sequence].astype(index_dtype(n_sequences * n_symbols ** 2))
+            keys *= n_symbols ** 2
+            keys += pairs[within_sequence]
+            del pairs, within_sequence
+            dinucleotide_counts = compact_counts(np.bincount(
+                keys, minlength=n_sequences * n_symbols ** 2
+            ).reshape(n_sequences, n_symbols ** 2), max_length)
+            del keys
+
+        if self.distributions is not None:
+            tables = _per_sequence_tables(nucleotide_counts, dinucleotide_counts, compact_counts(lengths, max_length), self.symbols)
+            for name, sketches in self.distributions.items():
+                sketches.update(tables[name].values(np.float64), tables[name].columns)
+        else:
+            self.nucleotide_counts.append(nucleotide_counts)
+            if dinucleotide_counts is not None:
+                self.dinucleotide_counts.append(dinucleotide_counts)
+            self.lengths.append(compact_counts(lengths, max_length))
+        if self.max_sequences is not None:
+            indices = self.first_index + self.n_sequences + np.arange(n_sequences)
+            self.sample_keys.append(sampling_keys(indices, self.seed))
+            self._reduce_sample(2 * self.max_sequences)
+
+        if self.counts_per_position:
+            per_position = count_per_position(codes, offsets, n_symbols)
+            self.per_position = _resize(self.per_position, max_length, n_symbols)
+            self.per_position[:max_length] += per_position[0]
+            self.per_position_reversed = _resize(self.per_position_reversed, max_length, n_symbols)
+            self.per_position_reversed[:max_length] += per_position[1]
+        for spectrum in self.kmer_spectra.values():
+            spectrum.update_encoded(buffer, offsets)
+
+        self.n_sequences += n_sequences
+        self.n_bases += int(offsets[-1])
+
+    def add_symbols(self, buffer):
+        """
+        Extend the alphabet with the bases present in the encoded buffer.
+        """
+        present = np.flatnonzero(np.bincount(buffer, minlength=256))
+        for byte in present:
+            self._symbol_code(chr(byte))
+
+    def _symbol_code(self, symbol):
+        if self.lookup[ord(symbol)] < 0:
+            self.lookup[ord(symbol)] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.lookup[ord(symbol)]
+
+    def merge(self, other):
+        """
+        Merge the state of another accumulator into this one.
+        The result is the same as if the sequences of the other accumulator were added after the sequences of this one.
+        @param other: A StatisticsAccumulator.
+        @return: self
+        """
+        mapping = np.array([self._symbol_code(symbol) for symbol in other.symbols], dtype=np.int64)
+        n_symbols = len(self.symbols)
+
+        if (self.max_sequences is None) != (other.max_sequences is None):
+            raise ValueError("Cannot merge sampled and complete per sequence statistics.")
+        if (self.distributions is None) != (other.distributions is None):
+            raise ValueError("Cannot merge sketched and complete per sequence statistics.")
+        if self.statistics != other.statistics:
+            raise ValueError(f"Cannot merge different statistics: {self.statistics} and {other.statistics}.")
+        if self.kmer_spectra.keys() != other.kmer_spectra.keys():
+            raise ValueError(f"Cannot merge k-mer spectra of sizes {sorted(self.kmer_spectra)} and {sorted(other.kmer_spectra)}.")
+        if (self.qualities is None) != (other.qualities is None):
+            raise ValueError("Cannot merge statistics with and without a quality profile.")
+
+        self.nucleotide_counts += [_remap_columns(counts, mapping, n_symbols) for counts in other.nucleotide_counts]
+        self.dinucleotide_counts += [_remap_pair_columns(counts, mapping, n_symbols) for counts in other.dinucleotide_counts]
+        self.lengths += other.lengths
+        if self.distributions is not None:
+            for name, table in self.distributions.items():
+                table.merge(other.distributions[name])
+        if self.max_sequences is not None:
+            self.max_sequences = min(self.max_sequences, other.max_sequences)
+            self.sample_keys += other.sample_keys
+            self._reduce_sample(2 * self.max_sequences)
+
+        self.base_counts = _resize(self.base_counts[None, :], 1, n_symbols)[0]
+        self.base_counts[mapping[:len(other.base_counts)]] += other.base_counts
+        for name in ['per_position', 'per_position_reversed']:
+            counts = getattr(other, name)
+            merged = _resize(getattr(self, name), counts.shape[0], n_symbols)
+            merged[:counts.shape[0], mapping[:counts.shape[1]]] += counts
+            setattr(self, name, merged)
+        for k, spectrum in self.kmer_spectra.items():
+            spectrum.merge(other.kmer_spectra[k])
+        if self.qualities is not None:
+            self.qualities.merge(other.qualities)
+
+        # partial results of worker processes do not count duplicates
+        if other.duplicates is not None and other.duplicates.n_sequences > 0:
+            self.duplicates.merge(other.duplicates)
+        self.n_sequences += other.n_sequences
+        self.n_bases += other.n_bases
+        return self
+
+    def to_arrays(self):
+        """
+        Export the accumulated state as a dictionary of numpy arrays, e.g. to save it with np.savez.
+        """
+        sample = {}
+        if self.max_sequences is not None:
+            self._reduce_sample(self.max_sequences)
+            sample = {
+                'sample_max_sequences': np.array(self.max_sequences, dtype=np.int64),
+                'sample_keys': np.concatenate(self.sample_keys) if self.sample_keys else np.zeros(0, dtype=np.uint64),
+            }
+        if self.distributions is not None:
+            for name, sketches in self.distributions.items():
+                sample.update(sketches.to_arrays(_SKETCH_PREFIXES[name]))
+        if self.kmer_spectra:
+            sample['kmer_sizes'] = np.array(list(self.kmer_spectra), dtype=np.int64)
+            for k, spectrum in self.kmer_spectra.items():
+                sample.update(spectrum.to_arrays(f'kmer_{k}'))
+        if self.qualities is not None:
+            sample.update(self.qualities.to_arrays('quality'))
+        nucleotide_counts, dinucleotide_counts, lengths = self._per_sequence_counts()
+        return {
+            'symbols': np.array([ord(symbol) for symbol in self.symbols], dtype=np.uint8),
+            'n_sequences': np.array(self.n_sequences, dtype=np.int64),
+            'n_bases': np.array(self.n_bases, dtype=np.int64),
+            'statistics': np.array(self.statistics),
+            'base_counts': self.base_counts,
+            'nucleotide_counts': nucleotide_counts,
+            'dinucleotide_counts': dinucleotide_counts,
+            'lengths': lengths,
+            'per_position': self.per_position,
+            'per_position_reversed': self.per_position_reversed,
+            **(self.duplicates.to_arrays() if self.duplicates is not None else {}),
+            **sample,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Restore an accumulator from the arrays created by to_arrays.
+        """
+        accumulator = cls(statistics=arrays['statistics'].tolist() if 'statistics' in arrays else None)
+        for byte in arrays['symbols']:
+            accumulator._symbol_code(chr(byte))
+        accumulator.n_sequences = int(arrays['n_sequences'])
+        accumulator.n_bases = int(arrays['n_bases'])
+        accumulator.nucleotide_counts = [arrays['nucleotide_counts']]
+        if 'Per sequence dinucleotide content' in accumulator.statistics:
+            accumulator.dinucleotide_counts = [arrays['dinucleotide_counts']]
+        accumulator.lengths = [arrays['lengths']]
+        accumulator.per_position = arrays['per_position']
+        accumulator.per_position_reversed = arrays['per_position_reversed']
+        # files written before base counts were kept have per position counts of all bases
+        accumulator.base_counts = arrays['base_counts'] if 'base_counts' in arrays else arrays['per_position'].sum(axis=0)
+        accumulator.duplicates = duplication_index_from_arrays(arrays) if accumulator.counts_duplicates else None
+        if any(f'{prefix}_values' in arrays for prefix in _SKETCH_PREFIXES.values()):
+            accumulator.distributions = {
+                name: SketchTable.from_arrays(arrays, prefix, IntegerHistogram if name == 'Sequence lengths' else TDigest)
+                for name, prefix in _SKETCH_PREFIXES.items() if f'{prefix}_values' in arrays
+            }
+        if 'sample_keys' in arrays:
+            accumulator.max_sequences = int(arrays['sample_max_sequences'])
+            accumulator.sample_keys = [arrays['sample_keys']]
+        if 'kmer_sizes' in arrays:
+            accumulator.kmer_spectra = {k: KmerSpectrum.from_arrays(arrays, f'kmer_{k}', k) for k in arrays['kmer_sizes'].tolist()}
+        if 'quality_sums' in arrays:
+            accumulator.qualities = QualityProfile.from_arrays(arrays, 'quality')
+        return accumulator
+
+    @classmethod
+    def from_columns(cls, accumulators, columns, duplicates=None):
+        """
+        Build the statistics of sequences concatenated row by row from several sequence columns
+        out of the accumulated statistics of each column, without accumulating the concatenated sequences again.
+
+        Counts of bases, per sequence counts, lengths and k-mer spectra of the columns are added up. Only the pairs of bases
+        and k-mers crossing the junctions between columns are counted, from the ends of the neighbouring columns.
+        Per position counts take one pass over the columns, with the offset of each column in the concatenated sequences.
+        Duplicates are counted on the concatenated sequences, built in chunks, as equal concatenations can be split
+        differently between the columns. The result is the same as from accumulating the concatenated sequences at once.
+
+        @param accumulators: StatisticsAccumulator of each column, with the same options and without sketched distributions.
+        @param columns: ConcatenatedColumns with the sequences of the columns.
+        @param duplicates: Optional DuplicationIndex to count duplicates in, see StatisticsAccumulator.
+        @return: A StatisticsAccumulator.
+        """
+        first = accumulators[0]
+        for other in accumulators:
+            if other.distributions is not None:
+                raise ValueError("Cannot derive concatenated statistics from sketched per sequence statistics.")
+            if other.statistics != first.statistics or other.max_sequences != first.max_sequences \
+                    or other.kmer_spectra.keys() != first.kmer_spectra.keys():
+                raise ValueError("Cannot derive concatenated statistics from columns accumulated with different options.")
+            if other.n_sequences != columns.n_sequences:
+                raise ValueError(f"Statistics of a column hold {other.n_sequences} sequences, expected {columns.n_sequences}.")
+
+        accumulator = cls(symbols=sorted({symbol for other in accumulators for symbol in other.symbols}), duplicates=duplicates,
+                          max_sequences=first.max_sequences, seed=first.seed, first_index=first.first_index,
+                          kmer_sizes=list(first.kmer_spectra), statistics=first.statistics)
+        n_symbols = len(accumulator.symbols)
+        n_sequences = columns.n_sequences
+        mappings = [np.array([accumulator.lookup[ord(symbol)] for symbol in other.symbols], dtype=np.int64) for other in accumulators]
+        accumulator.n_sequences = n_sequences
+        accumulator.n_bases = int(columns.lengths.sum())
+        accumulator.base_counts = np.zeros(n_symbols, dtype=np.int64)
+        for other, mapping in zip(accumulators, mappings):
+            accumulator.base_counts[mapping[:len(other.base_counts)]] += other.base_counts
+
+        # rows with per sequence counts, the sample of every column holds the same rows as its keys depend only on the row
+        selected = np.arange(n_sequences)
+        if accumulator.max_sequences is not None:
+            keys = sampling_keys(accumulator.first_index + np.arange(n_sequences), accumulator.seed)
+            selected = select_sample(keys, accumulator.max_sequences)
+            accumulator.sample_keys = [keys[selected]]
+        max_length = int(columns.lengths.max()) if n_sequences else 0
+        counts_dinucleotides = 'Per sequence dinucleotide content' in accumulator.statistics
+
+        nucleotide_counts = np.zeros((len(selected), n_symbols), dtype=np.int64)
+        dinucleotide_counts = np.zeros((len(selected), n_symbols ** 2), dtype=np.int64) if counts_dinucleotides else None
+        for other, mapping in zip(accumulators, mappings):
+            column_nucleotides, column_dinucleotides, _ = other._per_sequence_counts()
+            rows = slice(None)
+            if accumulator.max_sequences is not None:
+                rows = np.searchsorted(select_sample(keys, other.n_sampled), selected)
+            nucleotide_counts += _remap_columns(column_nucleotides, mapping, n_symbols)[rows]
+            if counts_dinucleotides:
+                dinucleotide_counts += _remap_pair_columns(column_dinucleotides, mapping, n_symbols)[rows]
+        if counts_dinucleotides:
+            # pairs of bases crossing the junctions between columns
+            buffer, offsets, rows = columns.junction_windows(1)
+            codes = accumulator.lookup[buffer]
+            sample_rows = np.full(n_sequences, -1, dtype=np.int64)
+            sample_rows[selected] = np.arange(len(selected))
+            in_sample = sample_rows[rows] >= 0
+            pairs = codes[offsets[:-1]].astype(np.int64) * n_symbols + codes[offsets[:-1] + 1]
+            dinucleotide_counts += np.bincount(
+                sample_rows[rows][in_sample] * n_symbols ** 2 + pairs[in_sample], minlength=len(selected) * n_symbols ** 2
+            ).reshape(len(selected), n_symbols ** 2)
+            accumulator.dinucleotide_counts = [compact_counts(dinucleotide_counts, max_length)]
+        accumulator.nucleotide_counts = [compact_counts(nucleotide_counts, max_length)]
+        accumulator.lengths = [compact_counts(columns.lengths[selected], max_length)]
+
+        if accumulator.counts_per_position:
+            accumulator.per_position, accumulator.per_position_reversed = columns.count_per_position(accumulator.lookup, n_symbols)
+        for k, spectrum in accumulator.kmer_spectra.items():
+            for other in accumulators:
+                spectrum.merge(other.kmer_spectra[k])
+            # k-mers crossing the junctions between columns
+            buffer, offsets, _ = columns.junction_windows(k - 1)
+            spectrum.update_encoded(buffer, offsets)
+        if accumulator.duplicates is not None:
+            for chunk in columns.iter_sequences():
+                accumulator.duplicates.update(chunk)
+        return accumulator
+
+    @property
+    def n_sampled(self):
+        """
+        Number of sequences with per sequence counts.
+        """
+        return sum(len(lengths) for lengths in self.lengths)
+
+    def _reduce_sample(self, limit):
+        """
+        Keep per sequence counts only for the max_sequences sequences with the smallest sampling keys,
+        once there are more than limit of them. Sampled sequences stay in their original order.
+        """
+        if self.n_sampled <= limit:
+            return
+        nucleotide_counts, dinucleotide_counts, lengths = self._per_sequence_counts()
+        selected = select_sample(np.concatenate(self.sample_keys), self.max_sequences)
+        self.nucleotide_counts = [nucleotide_counts[selected]]
+        if self.dinucleotide_counts:
+            self.dinucleotide_counts = [dinucleotide_counts[selected]]
+        self.lengths = [lengths[selected]]
+        self.sample_keys = [np.concatenate(self.sample_keys)[selected]]
+
+    def _per_sequence_counts(self):
+        n_symbols = len(self.symbols)
+        nucleotide_counts = np.concatenate(
+            [_pad_columns(counts, n_symbols) for counts in self.nucleotide_counts]
+        ) if self.nucleotide_counts else np.zeros((0, n_symbols), dtype=np.uint16)
+        dinucleotide_counts = np.concatenate(
+            [_pad_pair_columns(counts, n_symbols) for counts in self.dinucleotide_counts]
+        ) if self.dinucleotide_counts else np.zeros((0, n_symbols ** 2), dtype=np.uint16)
+        lengths = np.concatenate(self.lengths) if self.lengths else np.zeros(0, dtype=np.uint16)
+        return nucleotide_counts, dinucleotide_counts, lengths
+
+    def finalize(self):
+        """
+        Turn the accumulated counts into statistics.
+        Per sequence statistics are returned as CountTables holding the compact counts and one shared lengths vector,
+        or as SketchTables with sketch_distributions.
+        @return: A dictionary with the same keys as SequenceStatistics.stats,
+                 without the Filename, Label and Sequence column entries.
+        """
+        if self.max_sequences is not None:
+            self._reduce_sample(self.max_sequences)
+        nucleotides = list(self.symbols)
+        if self.distributions is not None:
+            if 'Per sequence nucleotide content' in self.distributions:
+                self.distributions['Per sequence nucleotide content'].reorder(nucleotides)
+            if 'Per sequence dinucleotide content' in self.distributions:
+                self.distributions['Per sequence dinucleotide content'].reorder([n1 + n2 for n1 in nucleotides for n2 in nucleotides])
+            tables = self.distributions
+        else:
+            tables = _per_sequence_tables(*self._per_sequence_counts(), nucleotides)
+
+        stats = {}
+        stats['Number of sequences'] = self.n_sequences
+        stats['Number of bases'] = self.n_bases
+        stats['Unique bases'] = nucleotides
+        # totals over all sequences, per sequence counts may cover only a sample
+        gc_total = sum(int(self.base_counts[nucleotides.index(nucleotide)]) for nucleotide in ['G', 'C'] if nucleotide in nucleotides)
+        stats['%GC content'] = gc_total / self.n_bases if self.n_bases else np.nan
+        if self.duplicates is not None:
+            stats['Number of sequences left after deduplication'] = len(self.duplicates)
+        stats['Per sequence nucleotide content'] = tables.get('Per sequence nucleotide content')
+        stats['Per sequence dinucleotide content'] = tables.get('Per sequence dinucleotide content')
+        if self.counts_per_position:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                stats['Per position nucleotide content'] = pd.DataFrame(
+                    self.per_position / self.per_position.sum(axis=1, keepdims=True), columns=nucleotides)
+                stats['Per position reversed nucleotide content'] = pd.DataFrame(
+                    self.per_position_reversed / self.per_position_reversed.sum(axis=1, keepdims=True), columns=nucleotides)
+        stats['Per sequence GC content'] = tables.get('Per sequence GC content')
+        stats['Sequence lengths'] = tables.get('Sequence lengths')
+        if self.duplicates is not None:
+            stats['Sequence duplication levels'] = self.duplicates.duplication_levels()
+        if isinstance(self.duplicates, ApproximateDuplicationIndex):
+            stats['Approximation error bounds'] = self.duplicates.error_bounds()
+        if self.qualities is not None:
+            stats['Per position mean quality'] = self.qualities.to_frame()
+        if self.kmer_spectra:
+            stats['K-mer spectrum'] = dict(self.kmer_spectra)
+        if self.distributions is not None:
+            stats['Distribution sketches'] = {name: table.describe() for name, table in self.distributions.items()}
+
+        # keep only the requested optional statistics, the core statistics are always reported
+        return {name: value for name, value in stats.items() if name not in STATISTICS or name in self.statistics}
+
+# keys of the sketches of per sequence statistics in exported arrays
+_SKETCH_PREFIXES = {
+    'Per sequence nucleotide content': 'nucleotide_sketch',
+    'Per sequence dinucleotide content': 'dinucleotide_sketch',
+    'Per sequence GC content': 'gc_sketch',
+    'Sequence lengths': 'length_sketch',
+}
+
+def _per_sequence_tables(nucleotide_counts, dinucleotide_counts, lengths, nucleotides):
+    """
+    Build the per sequence statistics as CountTables sharing one lengths vector.
+    @param dinucleotide_counts: Per sequence dinucleotide counts, or None if they are not counted.
+    """
+    nucleotides = list(nucleotides)
+    dinucleotides = [n1 + n2 for n1 in nucleotides for n2 in nucleotides]
+    lengths = compact_counts(lengths)
+
+    # G + C never exceeds the length, so the sum fits into the dtype of the counts
+    gc_counts = np.zeros(len(lengths), dtype=nucleotide_counts.dtype)
+    for nucleotide in ['G', 'C']:
+        if nucleotide in nucleotides:
+            gc_counts += nucleotide_counts[:, nucleotides.index(nucleotide)]
+
+    tables = {
+        'Per sequence nucleotide content': CountTable(nucleotide_counts, nucleotides, totals=lengths),
+        'Per sequence GC content': CountTable(gc_counts[:, None], ['Per sequence GC content'], totals=lengths, scale=100),
+        'Sequence lengths': CountTable(lengths[:, None], ['Sequence lengths']),
+    }
+    if dinucleotide_counts is not None:
+        tables['Per sequence dinucleotide content'] = CountTable(dinucleotide_counts, dinucleotides, totals='rows')
+    return tables
+
+def _resize(matrix, n_rows, n_columns):
+    """
+    Grow a count matrix with zeros to at least n_rows x n_columns.
+    """
+    if matrix.shape[0] >= n_rows and matrix.shape[1] >= n_columns:
+        return matrix
+    resized = np.zeros((max(matrix.shape[0], n_rows), max(matrix.shape[1], n_columns)), dtype=matrix.dtype)
+    resized[:matrix.shape[0], :matrix.shape[1]] = matrix
+    return resized
+
+def _pad_columns(counts, n_symbols):
+    """
+    Extend per sequence nucleotide counts to the final alphabet size.
+    """
+    return _resize(counts, counts.shape[0], n_symbols)
+
+def _pad_pair_columns(counts, n_symbols):
+    """
+    Extend per sequence dinucleotide counts to the final alphabet size.
+    Pair columns are laid out as first * n_symbols + second, so they have to be regrouped.
+    """
+    chunk_symbols = int(round(np.sqrt(counts.shape[1])))
+    if chunk_symbols == n_symbols:
+        return counts
+    padded = np.zeros((counts.shape[0], n_symbols, n_symbols), dtype=counts.dtype)
+    padded[:, :chunk_symbols, :chunk_symbols] = counts.reshape(counts.shape[0], chunk_symbols, chunk_symbols)
+    return padded.reshape(counts.shape[0], n_symbols ** 2)
+
+def _remap_columns(counts, mapping, n_symbols):
+    """
+    Reorder per sequence nucleotide counts from another alphabet into this one.
+    """
+    remapped = np.zeros((counts.shape[0], n_symbols), dtype=counts.dtype)
+    remapped[:, mapping[:counts.shape[1]]] = counts
+    return remapped
+
+def _remap_pair_columns(counts, mapping, n_symbols):
+    """
+    Reorder per sequence dinucleotide counts from another alphabet into this one.
+    """
+    chunk_symbols = int(round(np.sqrt(counts.shape[1])))
+    chunk_mapping = mapping[:chunk_symbols]
+    remapped = np.zeros((counts.shape[0], n_symbols, n_symbols), dtype=counts.dtype)
+    remapped[:, chunk_mapping[:, None], chunk_mapping[None, :]] = counts.reshape(counts.shape[0], chunk_symbols, chunk_symbols)
+    return remapped.reshape(counts.shape[0], n_symbols ** 2)
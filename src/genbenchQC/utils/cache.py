@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import os
+import zipfile
+from importlib.metadata import version, PackageNotFoundError
+from pathlib import Path
+
+from genbenchQC.utils.statistics import SequenceStatistics
+
+# version of the cached statistics, increase it whenever the way statistics are accumulated changes
+CACHE_FORMAT = 1
+# default bound of the total size of cached statistics, in bytes
+DEFAULT_MAX_SIZE = 1024 ** 3
+
+def _package_version():
+    try:
+        return version('genbenchQC')
+    except PackageNotFoundError:
+        return 'unknown'
+
+class StatisticsCache:
+    """
+    Content-addressed on-disk cache of accumulated statistics.
+
+    Entries are keyed by a digest of the content of the input files, the selection of sequences (format, sequence column,
+    label) and the options the statistics were computed with, together with the package version and CACHE_FORMAT.
+    Options that only affect the comparison and the reports, like the end position or the flag threshold,
+    are not part of the key, so runs differing only in them reuse the cached statistics.
+
+    Entries are partial statistics files (see SequenceStatistics.save_partial), saved uncompressed for fast loading.
+    They keep the text of all distinct sequences, so duplicates between datasets can be reported with any other dataset.
+    The least recently used entries are removed when the total size of the cache exceeds max_size bytes.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        # (path, size, modification time) -> content digest, so files shared by several entries are read once
+        self.file_digests = {}
+
+    def file_digest(self, path):
+        """
+        Digest of the content of a file, read in blocks.
+        """
+        status = os.stat(path)
+        memo_key = (os.path.abspath(path), status.st_size, status.st_mtime_ns)
+        if memo_key not in self.file_digests:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            self.file_digests[memo_key] = digest.hexdigest()
+        return self.file_digests[memo_key]
+
+    def key(self, input_files, seq_stats, **selection):
+        """
+        Key of the statistics of sequences selected from the input files.
+        @param input_files: List of paths to the input files the sequences are read from.
+        @param seq_stats: SequenceStatistics, not computed yet, whose options are part of the key.
+        @param selection: Other options selecting the sequences, e.g. format, label_column or regression.
+        @return: A hexadecimal string.
+        """
+        description = {
+            'cache_format': CACHE_FORMAT,
+            'version': _package_version(),
+            'inputs': [self.file_digest(path) for path in input_files],
+            'selection': selection,
+            'filename': seq_stats.filename,
+            'label': seq_stats.label,
+            'seq_column': seq_stats.seq_column,
+            'approximate_duplicates': seq_stats.approximate_duplicates,
+            'max_sequences_for_distributions': seq_stats.max_sequences_for_distributions,
+            'sampling_seed': seq_stats.sampling_seed,
+            'sketch_distributions': seq_stats.sketch_distributions,
+            'kmer_sizes': seq_stats.kmer_sizes,
+            'statistics': seq_stats.statistics,
+            'mean_quality': seq_stats.qualities is not None,
+        }
+        return hashlib.blake2b(json.dumps(description, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+    def path(self, key):
+        return self.directory / f'{key}.npz'
+
+    def load(self, key, end_position=None):
+        """
+        Load cached statistics and mark them as recently used.
+        @param end_position: End position to use when computing the statistics.
+        @return: SequenceStatistics, or None if the key is not cached.
+        """
+        path = self.path(key)
+        if not path.exists():
+            return None
+        try:
+            seq_stats, _ = SequenceStatistics.load_partial(path, end_position=end_position)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            logging.warning(f"Removing unreadable cached statistics {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)
+        return seq_stats
+
+    def store(self, key, seq_stats):
+        """
+        Accumulate the statistics and save them under the key, then evict the least recently used entries.
+        """
+        path = self.path(key)
+        # write to a temporary file first, so concurrent runs never read a half-written entry
+        temporary = self.directory / f'{key}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            seq_stats.save_partial(f, compressed=False)
+        os.replace(temporary, path)
+        self.evict()
+
+    def fetch(self, key, seq_stats):
+        """
+        Return the cached statistics for the key, or accumulate seq_stats and cache them.
+        @param seq_stats: SequenceStatistics, not computed yet, used when the key is not cached.
+        @return: SequenceStatistics to compute.
+        """
+        return self.fetch_together([key], [seq_stats])[0]
+
+    def fetch_together(self, keys, input_statistics, accumulate=None):
+        """
+        Same as fetch for several statistics, whose statistics missing from the cache are accumulated together before they are cached.
+        @param keys: List of keys of the statistics.
+        @param input_statistics: List of SequenceStatistics, not computed yet.
+        @param accumulate: Optional function accumulating a list of the missing SequenceStatistics at once,
+                           e.g. in a single pass over their common input. By default, each of them is accumulated on its own.
+        @return: List of SequenceStatistics to compute.
+        """
+        cached = [self.load(key, end_position=seq_stats.end_position) for key, seq_stats in zip(keys, input_statistics)]
+        missing = [seq_stats for seq_stats, entry in zip(input_statistics, cached) if entry is None]
+        for seq_stats in missing:
+            # keep the text of all distinct sequences, the entry may be compared with any other dataset later
+            seq_stats.keep_sequences = True
+        if accumulate is not None:
+            accumulate(missing)
+
+        fetched = []
+        for key, seq_stats, entry in zip(keys, input_statistics, cached):
+            if entry is not None:
+                logging.info(f"Using cached statistics for {seq_stats.filename}, label {seq_stats.label}, "
+                             f"sequence column: {seq_stats.seq_column}")
+                fetched.append(entry)
+            else:
+                self.store(key, seq_stats)
+                fetched.append(seq_stats)
+        return fetched
+
+    def entries(self):
+        """
+        @return: List of paths to the cached statistics, from the least to the most recently used.
+        """
+        return sorted(self.directory.glob('*.npz'), key=lambda path: path.stat().st_mtime)
+
+    def size(self):
+        return sum(path.stat().st_size for path in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(path.stat().st_size for path in entries)
+        # the most recent entry is kept even if it alone exceeds the bound
+        for path in entries[:-1]:
+            if total <= self.max_size:
+                break
+            total -= path.stat().st_size
+            logging.debug(f"Evicting cached statistics {path}")
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        """
+        Remove all cached statistics.
+        """
+        logging.info(f"Clearing statistics cache: {self.directory}")
+        for path in list(self.directory.glob('*.npz')) + list(self.directory.glob('*.tmp')):
+            path.unlink(missing_ok=True)
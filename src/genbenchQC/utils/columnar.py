@@ -0,0 +1,187 @@
+import json
+import logging
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from genbenchQC.utils.encoding import decode_kmers
+from genbenchQC.utils.kmers import KmerSpectrum
+from genbenchQC.utils.registry import statistic_slug
+from genbenchQC.utils.sketches import TDigest, IntegerHistogram
+from genbenchQC.utils.tables import CountTable, SketchTable, LazyStatistics
+
+TABLE_FORMATS = ['parquet', 'npz']
+MANIFEST = 'manifest.json'
+# column with the per sequence totals of count tables, see CountTable
+TOTALS_COLUMN = '__totals__'
+SKETCHES = {'TDigest': TDigest, 'IntegerHistogram': IntegerHistogram}
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("The parquet report type requires pyarrow. Install it with 'pip install pyarrow' or use the npz report type.")
+    return pyarrow
+
+def _write_table(columns, path, table_format):
+    """
+    Write a table given as a dictionary {name: 1D numpy array} with its column types kept.
+    """
+    if table_format == 'parquet':
+        pyarrow = _pyarrow()
+        pyarrow.parquet.write_table(pyarrow.table(columns), path)
+    else:
+        with open(path, 'wb') as f:
+            np.savez(f, **columns)
+
+def _read_table(path, table_format):
+    """
+    Read a table written by _write_table.
+    Parquet files are memory mapped and numeric columns without nulls are returned without copying them.
+    @return: A dictionary {name: 1D numpy array}.
+    """
+    if table_format == 'parquet':
+        table = _pyarrow().parquet.read_table(path, memory_map=True)
+        return {name: column.to_numpy() for name, column in zip(table.column_names, table.columns)}
+    with np.load(path, allow_pickle=False) as arrays:
+        return {name: arrays[name] for name in arrays.files}
+
+def _table_columns(value):
+    """
+    Split a statistic into typed columns and a description of how to rebuild it.
+    @return: A tuple (columns, description), or None if the statistic is not a table.
+    """
+    if isinstance(value, pd.DataFrame):
+        columns = {str(column): value[column].to_numpy() for column in value.columns}
+        return columns, {'Kind': 'frame', 'Columns': [str(column) for column in value.columns]}
+    if isinstance(value, CountTable):
+        # compact counts are stored as they are, values are derived again after loading
+        columns = {column: value.counts[:, i] for i, column in enumerate(value.columns)}
+        totals = value.totals
+        if isinstance(totals, np.ndarray):
+            columns[TOTALS_COLUMN] = totals
+            totals = 'column'
+        return columns, {'Kind': 'counts', 'Columns': value.columns, 'Totals': totals, 'Scale': value.scale}
+    if isinstance(value, SketchTable):
+        # one row per centroid or bin of the sketch of each column
+        sketches = list(value.sketches.values())
+        columns = {
+            'Column': np.repeat(np.array(value.columns, dtype=str), [len(sketch.values) for sketch in sketches]),
+            'Value': np.concatenate([sketch.values for sketch in sketches] or [np.zeros(0)]).astype(np.float64),
+            'Weight': np.concatenate([sketch.weights for sketch in sketches] or [np.zeros(0)]).astype(np.float64),
+        }
+        return columns, {
+            'Kind': 'sketches',
+            'Columns': value.columns,
+            'Sketch': value.sketch.__name__,
+            'Number of values': value.n_values,
+            'Min': [float(sketch.min) for sketch in sketches],
+            'Max': [float(sketch.max) for sketch in sketches],
+        }
+    return None
+
+def write_stats_columnar(stats, output_path, table_format='parquet'):
+    """
+    Write statistics into a folder with one columnar file per table and a JSON manifest with all other statistics.
+
+    Tables keep their column types: per sequence counts of the numpy engine are stored as compact unsigned integers,
+    sketches as their centroids or bins with weights, k-mer spectra and duplication levels as one row per k-mer or sequence.
+    The manifest lists the order of the statistics, the values of statistics that are not tables,
+    and the file and the layout of each table, so read_stats_columnar() rebuilds the same statistics.
+
+    @param stats: Dictionary of statistics, see SequenceStatistics.compute().
+    @param output_path: Path to the output folder.
+    @param table_format: 'parquet' (requires pyarrow) or 'npz'.
+    """
+    if table_format not in TABLE_FORMATS:
+        raise ValueError(f"Unsupported table format: {table_format}. Supported formats are {TABLE_FORMATS}.")
+    if table_format == 'parquet':
+        _pyarrow()
+    output_path = Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+    logging.info(f"Generating {table_format} report: {output_path}")
+
+    manifest = {'Format': table_format, 'Order': list(stats), 'Statistics': {}, 'Tables': {}}
+    for name in stats:
+        # compact tables are exported directly from their counts or sketches
+        value = stats.raw(name) if isinstance(stats, LazyStatistics) else stats[name]
+        table = _table_columns(value)
+        if name == 'Sequence duplication levels':
+            table = ({'Sequence': np.array(list(value.keys()), dtype=str),
+                      'Count': np.array(list(value.values()), dtype=np.int64)}, {'Kind': 'duplication levels'})
+        if name == 'K-mer spectrum':
+            files = {}
+            for k, spectrum in value.items():
+                kmers, counts = spectrum.sparse()
+                filename = f'{statistic_slug(name)}_{k}.{table_format}'
+                _write_table({'Kmer': np.array(decode_kmers(kmers, k), dtype=str), 'Hash': kmers, 'Count': counts},
+                             output_path / filename, table_format)
+                files[str(k)] = filename
+            manifest['Tables'][name] = {'Kind': 'k-mer spectrum', 'Files': files}
+            continue
+        if table is None:
+            manifest['Statistics'][name] = value
+            continue
+        columns, description = table
+        description['File'] = f'{statistic_slug(name)}.{table_format}'
+        _write_table(columns, output_path / description['File'], table_format)
+        manifest['Tables'][name] = description
+
+    with open(output_path / MANIFEST, 'w') as file:
+        json.dump(manifest, file, indent=4)
+
+def _rebuild(description, columns):
+    kind = description['Kind']
+    if kind == 'frame':
+        return pd.DataFrame({column: columns[column] for column in description['Columns']}, copy=False)
+    if kind == 'counts':
+        counts = np.column_stack([columns[column] for column in description['Columns']])
+        totals = columns[TOTALS_COLUMN] if description['Totals'] == 'column' else description['Totals']
+        return CountTable(counts, description['Columns'], totals=totals, scale=description['Scale'])
+    if kind == 'sketches':
+        sketch = SKETCHES[description['Sketch']]
+        table = SketchTable(sketch)
+        table.n_values = description['Number of values']
+        names = columns['Column']
+        for i, column in enumerate(description['Columns']):
+            selected = names == column
+            restored = sketch()
+            restored.values = columns['Value'][selected].astype(restored.values.dtype)
+            restored.weights = columns['Weight'][selected].astype(restored.weights.dtype)
+            if sketch is TDigest:
+                restored.min, restored.max = description['Min'][i], description['Max'][i]
+            table.sketches[column] = restored
+        return table
+    if kind == 'duplication levels':
+        return dict(zip(columns['Sequence'].tolist(), columns['Count'].tolist()))
+    raise ValueError(f"Unknown kind of table in the manifest: {kind}")
+
+def read_stats_columnar(path):
+    """
+    Load statistics written by write_stats_columnar().
+    Per sequence counts and sketches are restored in their compact form, so they are derived into DataFrames
+    only on access, see LazyStatistics. Parquet tables are memory mapped.
+    @param path: Path to the folder with the manifest.
+    @return: LazyStatistics with the same statistics as were written.
+    """
+    path = Path(path)
+    with open(path / MANIFEST) as file:
+        manifest = json.load(file)
+    table_format = manifest['Format']
+
+    stats = LazyStatistics()
+    for name in manifest['Order']:
+        value = manifest['Tables'].get(name)
+        if value is None:
+            stats[name] = manifest['Statistics'][name]
+        elif value['Kind'] == 'k-mer spectrum':
+            spectra = {}
+            for k, filename in value['Files'].items():
+                columns = _read_table(path / filename, table_format)
+                arrays = {'kmer_kmers': columns['Hash'], 'kmer_counts': columns['Count']}
+                spectra[int(k)] = KmerSpectrum.from_arrays(arrays, 'kmer', int(k))
+            stats[name] = spectra
+        else:
+            stats[name] = _rebuild(value, _read_table(path / value['File'], table_format))
+    return stats
@@ -0,0 +1,251 @@
+import io
+import logging
+import os
+import queue
+import struct
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# compressed bytes read from the file at once
+READ_SIZE = 1 << 24
+# independently compressed units (BGZF blocks, zstd frames) decompressed together by one thread
+BATCH_SIZE = 1 << 22
+DECOMPRESSION_THREADS = min(8, os.cpu_count() or 1)
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+def detect_compression(file_path):
+    """
+    Detect the compression of a file from its first bytes, independently of its extension.
+    @return: 'bgzf', 'gzip', 'zstd' or None for uncompressed files. Pipes and other non-regular files are not read and give None.
+    """
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'rb') as file:
+        header = file.read(18)
+    if header.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    if header.startswith(GZIP_MAGIC):
+        return 'bgzf' if _bgzf_block_size(header, 0) is not None else 'gzip'
+    return None
+
+def iter_decompressed(file_path, threads=DECOMPRESSION_THREADS):
+    """
+    Decompress a file into consecutive pieces of bytes.
+    BGZF blocks and zstd frames are independent, so batches of them are decompressed on several threads.
+    Plain gzip members and single zstd frames can only be decompressed sequentially; they are decompressed
+    on a background thread, so decompression overlaps with the parsing of the previous pieces.
+    Uncompressed files are read as they are.
+    @param file_path: Path to the file.
+    @param threads: Number of decompression threads.
+    @return: A generator yielding bytes.
+    """
+    compression = detect_compression(file_path)
+    logging.debug(f"Reading {file_path} with compression: {compression}")
+    if compression == 'bgzf':
+        yield from _map_ordered(_decompress_gzip_members, _iter_batches(file_path, _bgzf_block_size), threads)
+    elif compression == 'zstd' and _has_small_zstd_frames(file_path):
+        yield from _map_ordered(_decompress_zstd_frames, _iter_batches(file_path, _zstd_frame_size), threads)
+    elif compression == 'zstd':
+        yield from _prefetch(_iter_zstd(file_path))
+    elif compression == 'gzip':
+        yield from _prefetch(_iter_gzip(file_path))
+    else:
+        with open(file_path, 'rb') as file:
+            yield from iter(lambda: file.read(READ_SIZE), b'')
+
+def open_decompressed(file_path, threads=DECOMPRESSION_THREADS):
+    """
+    Open a possibly compressed file as a binary file object of its decompressed content, see iter_decompressed.
+    """
+    return io.BufferedReader(_ChunkReader(iter_decompressed(file_path, threads)), buffer_size=1 << 20)
+
+class _ChunkReader(io.RawIOBase):
+    """
+    Raw binary stream reading from a generator of bytes.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.chunk = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.chunk:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.chunk = memoryview(chunk)
+        size = min(len(buffer), len(self.chunk))
+        buffer[:size] = self.chunk[:size]
+        self.chunk = self.chunk[size:]
+        return size
+
+    def close(self):
+        self.chunks.close()
+        super().close()
+
+def _map_ordered(function, items, threads):
+    """
+    Apply a function to items on a thread pool and yield the results in the order of the items,
+    keeping at most two batches per thread in flight.
+    """
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= 2 * threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _prefetch(chunks, depth=4):
+    """
+    Run a generator on a background thread, at most depth items ahead of the consumer.
+    """
+    items = queue.Queue(maxsize=depth)
+    done = object()
+
+    def produce():
+        try:
+            for chunk in chunks:
+                items.put(chunk)
+            items.put(done)
+        except BaseException as e:
+            items.put(e)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = items.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+def _iter_batches(file_path, unit_size):
+    """
+    Split a file into batches of whole independently compressed units, without decompressing them.
+    @param unit_size: Function returning the size of the unit starting at a position of a buffer, or None
+                      if the buffer does not hold enough bytes to tell.
+    @return: A generator yielding lists of units (bytes) of about BATCH_SIZE compressed bytes.
+    """
+    with open(file_path, 'rb') as file:
+        data = b''
+        batch, batch_size = [], 0
+        for piece in iter(lambda: file.read(READ_SIZE), b''):
+            data += piece
+            position = 0
+            while True:
+                size = unit_size(data, position)
+                if size is None or position + size > len(data):
+                    break
+                batch.append(data[position:position + size])
+                batch_size += size
+                position += size
+                if batch_size >= BATCH_SIZE:
+                    yield batch
+                    batch, batch_size = [], 0
+            data = data[position:]
+        if data:
+            logging.error(f"Truncated compressed file: {file_path}")
+            raise ValueError(f"Truncated compressed file: {file_path}")
+        if batch:
+            yield batch
+
+def _bgzf_block_size(data, position):
+    """
+    Size of the BGZF block starting at the position, taken from the BSIZE field of its gzip header.
+    Returns None if the block is not a BGZF block or its header is incomplete.
+    """
+    if len(data) < position + 12 or data[position:position + 2] != GZIP_MAGIC or not data[position + 3] & 4:
+        return None
+    extra_length, = struct.unpack_from('<H', data, position + 10)
+    extra = data[position + 12:position + 12 + extra_length]
+    offset = 0
+    while offset + 4 <= len(extra):
+        field_length, = struct.unpack_from('<H', extra, offset + 2)
+        if extra[offset:offset + 2] == b'BC' and field_length == 2 and offset + 6 <= len(extra):
+            return struct.unpack_from('<H', extra, offset + 4)[0] + 1
+        offset += 4 + field_length
+    return None
+
+def _decompress_gzip_members(members):
+    return b''.join(zlib.decompress(member, 31) for member in members)
+
+def _iter_gzip(file_path):
+    """
+    Decompress a gzip file with any number of members sequentially.
+    """
+    with open(file_path, 'rb') as file:
+        decompressor = zlib.decompressobj(31)
+        for piece in iter(lambda: file.read(READ_SIZE), b''):
+            while piece:
+                yield decompressor.decompress(piece)
+                if not decompressor.eof:
+                    break
+                # the next gzip member starts right after the end of this one
+                piece = decompressor.unused_data
+                decompressor = zlib.decompressobj(31)
+        yield decompressor.flush()
+
+def _zstd_frame_size(data, position):
+    """
+    Size of the zstd frame starting at the position, found by walking its block headers.
+    Returns None if the frame is not complete in the buffer.
+    """
+    if len(data) < position + 8:
+        return None
+    magic, = struct.unpack_from('<I', data, position)
+    if magic & 0xFFFFFFF0 == 0x184D2A50:
+        # skippable frame
+        return 8 + struct.unpack_from('<I', data, position + 4)[0]
+    if data[position:position + 4] != ZSTD_MAGIC:
+        raise ValueError(f"Invalid zstd frame at byte {position}.")
+    descriptor = data[position + 4]
+    single_segment = descriptor >> 5 & 1
+    content_size_bytes = [single_segment, 2, 4, 8][descriptor >> 6]
+    dictionary_bytes = [0, 1, 2, 4][descriptor & 3]
+    offset = position + 5 + (1 - single_segment) + dictionary_bytes + content_size_bytes
+    while True:
+        if len(data) < offset + 3:
+            return None
+        header = int.from_bytes(data[offset:offset + 3], 'little')
+        block_type = header >> 1 & 3
+        offset += 3 + (1 if block_type == 1 else header >> 3)
+        if header & 1:
+            break
+    checksum_bytes = 4 if descriptor >> 2 & 1 else 0
+    return offset + checksum_bytes - position
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading zstd compressed files requires zstandard. Install it with 'pip install genbenchQC[zstd]'.")
+    return zstandard
+
+def _has_small_zstd_frames(file_path):
+    """
+    Whether the first zstd frame of a file ends within the first READ_SIZE bytes, so the frames can be decompressed in batches.
+    Files compressed into a single large frame are decompressed as a stream instead.
+    """
+    with open(file_path, 'rb') as file:
+        data = file.read(READ_SIZE)
+    size = _zstd_frame_size(data, 0)
+    return size is not None and size < len(data)
+
+def _iter_zstd(file_path):
+    with open(file_path, 'rb') as file:
+        reader = _zstandard().ZstdDecompressor().stream_reader(file, read_across_frames=True)
+        yield from iter(lambda: reader.read(READ_SIZE), b'')
+
+def _decompress_zstd_frames(frames):
+    # decompressors are not thread-safe, each batch uses its own
+    decompressor = _zstandard().ZstdDecompressor()
+    return b''.join(decompressor.decompressobj().decompress(frame) for frame in frames)
@@ -0,0 +1,119 @@
+import numpy as np
+
+from genbenchQC.utils.encoding import encode_sequences, sequence_ids, positions_in_sequence, SequenceBatch
+
+def concatenate_sequences(all_sequences):
+    """
+    Concatenate sequences from multiple columns row by row.
+    @param all_sequences: List of lists of sequences, one list per column. Columns given as SequenceBatch are joined
+                          in their buffers, see SequenceBatch.join_rows, and a SequenceBatch is returned.
+    """
+    if all_sequences and all(isinstance(sequences, SequenceBatch) for sequences in all_sequences):
+        return SequenceBatch.join_rows(all_sequences)
+    return [''.join(seqs) for seqs in zip(*all_sequences)]
+
+class ConcatenatedColumns:
+    """
+    Sequences concatenated row by row from several sequence columns, without building the concatenated strings.
+
+    Each column is encoded once into its own buffer. Positions in the concatenated sequences are derived
+    from the offsets of the columns, and only the ends of neighbouring columns are gathered to count
+    the pairs of bases and k-mers crossing the junctions between columns.
+    """
+
+    def __init__(self, columns):
+        if len({len(column) for column in columns}) > 1:
+            raise ValueError(f"Sequence columns have different numbers of sequences: {[len(column) for column in columns]}.")
+        self.columns = columns
+        self.n_sequences = len(columns[0]) if columns else 0
+        self.encoded = [encode_sequences(column) for column in columns]
+        # lengths of the sequences of each column, shape (number of columns, number of sequences)
+        self.column_lengths = np.array([np.diff(offsets) for _, offsets in self.encoded]).reshape(len(columns), self.n_sequences)
+        # start of each column in the concatenated sequences
+        self.column_starts = np.cumsum(self.column_lengths, axis=0) - self.column_lengths
+        self.lengths = self.column_lengths.sum(axis=0)
+
+    def iter_sequences(self, chunk_size=100000):
+        """
+        Build the concatenated sequences in chunks.
+        @return: A generator yielding lists of sequences.
+        """
+        for start in range(0, self.n_sequences, chunk_size):
+            yield concatenate_sequences([column[start:start + chunk_size] for column in self.columns])
+
+    def count_per_position(self, lookup, n_symbols):
+        """
+        Count the symbols at each position of the concatenated sequences, from the start and from the end,
+        in one pass over the columns, see encoding.count_per_position.
+        @param lookup: Table translating bytes into symbol indices, see build_lookup_table.
+        @param n_symbols: Size of the alphabet.
+        @return: An int64 array of shape (2, max_length, n_symbols).
+        """
+        max_length = int(self.lengths.max()) if self.n_sequences else 0
+        counts = np.zeros((2, max_length * n_symbols), dtype=np.int64)
+        for (buffer, offsets), starts in zip(self.encoded, self.column_starts):
+            ids = sequence_ids(offsets)
+            forward = positions_in_sequence(offsets) + starts[ids]
+            reverse = self.lengths[ids] - 1 - forward
+            codes = lookup[buffer]
+            for direction, positions in enumerate([forward, reverse]):
+                counts[direction] += np.bincount(positions * n_symbols + codes, minlength=max_length * n_symbols)
+        return counts.reshape(2, max_length, n_symbols)
+
+    def _ends(self, column, width, last):
+        """
+        First (or with last=True, last) at most width bytes of each sequence of a column.
+        @return: A tuple (bytes, lengths) with a left-aligned (number of sequences, width) uint8 matrix and the number of valid bytes per row.
+        """
+        buffer, offsets = self.encoded[column]
+        lengths = np.minimum(self.column_lengths[column], width)
+        starts = offsets[1:] - lengths if last else offsets[:-1]
+        index = starts[:, None] + np.arange(width)
+        valid = np.arange(width) < lengths[:, None]
+        ends = np.zeros((self.n_sequences, width), dtype=np.uint8)
+        ends[valid] = buffer[index[valid]]
+        return ends, lengths
+
+    def junction_windows(self, width):
+        """
+        Windows of the concatenated sequences around the junctions between columns, holding exactly the k-mers
+        (k = width + 1) that cross a junction. The window of the junction after column c holds the last at most width
+        bases of column c and the next at most width bases of the following columns, so every crossing k-mer belongs
+        to the window of the column it starts in and is counted once, also when a column is shorter than width.
+        @param width: Number of bases taken on each side of a junction.
+        @return: A tuple (buffer, offsets, rows) with the windows encoded as in encode_sequences
+                 and the row of the concatenated sequences each window belongs to.
+        """
+        windows, rows = [], []
+        if width > 0 and len(self.columns) > 1:
+            # first bases following each junction, built from the last column backwards
+            following = np.zeros((self.n_sequences, width), dtype=np.uint8)
+            following_lengths = np.zeros(self.n_sequences, dtype=np.int64)
+            for column in range(len(self.columns) - 1, 0, -1):
+                heads, head_lengths = self._ends(column, width, last=False)
+                following, following_lengths = _join(heads, head_lengths, following, following_lengths, width)
+                tails, tail_lengths = self._ends(column - 1, width, last=True)
+                window, window_lengths = _join(tails, tail_lengths, following, following_lengths, 2 * width)
+                crossing = (tail_lengths > 0) & (following_lengths > 0)
+                windows.append((window[crossing], window_lengths[crossing]))
+                rows.append(np.flatnonzero(crossing))
+
+        lengths = np.concatenate([window_lengths for _, window_lengths in windows] or [np.zeros(0, dtype=np.int64)])
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        buffer = np.concatenate([window[np.arange(window.shape[1]) < window_lengths[:, None]]
+                                 for window, window_lengths in windows] or [np.zeros(0, dtype=np.uint8)])
+        return buffer, offsets, np.concatenate(rows or [np.zeros(0, dtype=np.int64)])
+
+def _join(left, left_lengths, right, right_lengths, width):
+    """
+    Join two left-aligned byte matrices row by row, keeping at most width bytes of each row.
+    @return: A tuple (bytes, lengths) like the inputs.
+    """
+    positions = np.arange(width)
+    from_right = positions >= left_lengths[:, None]
+    right_positions = np.clip(positions - left_lengths[:, None], 0, right.shape[1] - 1)
+    left_positions = np.minimum(positions, left.shape[1] - 1)
+    rows = np.arange(len(left))[:, None]
+    joined = np.where(from_right, right[rows, right_positions], left[rows, left_positions])
+    return joined, np.minimum(left_lengths + right_lengths, width)
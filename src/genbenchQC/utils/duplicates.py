@@ -0,0 +1,383 @@
+import hashlib
+import logging
+import numpy as np
+
+from genbenchQC.utils.encoding import encode_sequences, index_dtype, SequenceBatch
+from genbenchQC.utils.sketches import HyperLogLog, SpaceSaving
+
+# digests of 16 bytes (128 bits) are the minimum: sequences are identified by their digests alone, also across chunks
+# and merged indexes whose texts were not kept, and a collision among 10^12 distinct sequences has a probability below 10^-14
+DIGEST_SIZE = 16
+# initial number of slots of the hash table of a DuplicationIndex, a power of two
+MIN_SLOTS = 1 << 10
+
+class DuplicationIndex:
+    """
+    Counts occurrences of sequences by their digests instead of holding the sequences themselves.
+
+    Each distinct sequence is identified by its 128-bit blake2b digest, see DIGEST_SIZE. The digests, the indices
+    of the first occurrences and the counts of the distinct sequences are held in numpy arrays in the order
+    the sequences were first seen, and found through an open-addressing hash table of their positions
+    with linear probing, vectorized over the distinct sequences of each chunk. This takes about 50 bytes
+    per distinct sequence. The text of a sequence is kept only when reports need it:
+    - when the sequence occurs more than once,
+    - when it also occurs in one of the indexes in shared_with, i.e. in datasets it will be compared with,
+    - for all sequences with keep_sequences=True, e.g. for partial statistics that are merged later.
+    """
+
+    def __init__(self, keep_sequences=False, shared_with=None):
+        self.keep_sequences = keep_sequences
+        self.shared_with = list(shared_with) if shared_with is not None else []
+        self.n_sequences = 0
+        self.n_distinct = 0
+        # digests as pairs of uint64, first occurrences and counts of the distinct sequences, with spare capacity
+        self.keys = np.zeros((0, 2), dtype=np.uint64)
+        self.first_indices = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        # hash table of the positions of the distinct sequences plus one, 0 for empty slots
+        self.slots = np.zeros(MIN_SLOTS, dtype=index_dtype(MIN_SLOTS))
+        # position of a distinct sequence -> sequence, only for sequences whose text is needed
+        self.texts = {}
+
+    def __len__(self):
+        """
+        Number of distinct sequences.
+        """
+        return self.n_distinct
+
+    @staticmethod
+    def digests(sequences):
+        """
+        Compute the digests of a chunk of sequences, e.g. in a worker process, to pass them to update().
+        @param sequences: A list of sequences (str) or a SequenceBatch, hashed straight from its buffer.
+        @return: A uint8 array of shape (number of sequences, DIGEST_SIZE).
+        """
+        data = sequences.iter_bytes() if isinstance(sequences, SequenceBatch) else (sequence.encode('ascii') for sequence in sequences)
+        digests = b''.join(hashlib.blake2b(sequence_bytes, digest_size=DIGEST_SIZE).digest() for sequence_bytes in data)
+        return np.frombuffer(digests, dtype=np.uint8).reshape(len(sequences), DIGEST_SIZE)
+
+    def update(self, sequences, digests=None):
+        """
+        Add a chunk of sequences to the index.
+        @param sequences: A list of sequences (str) or a SequenceBatch. Sequences of a batch are hashed straight
+                          from its buffer and decoded only when their text is kept.
+        @param digests: Optional digests of the sequences computed by digests(), so they are not hashed again.
+        """
+        if digests is None:
+            digests = self.digests(sequences)
+        if digests.shape != (len(sequences), DIGEST_SIZE):
+            raise ValueError(f"Expected digests of shape {(len(sequences), DIGEST_SIZE)}, got {digests.shape}.")
+        if len(sequences) == 0:
+            return
+
+        keys, positions, chunk_counts = _distinct_keys(digests)
+        ids = self._lookup(keys)
+        new = ids < 0
+        ids[new] = self._add(keys[new], self.n_sequences + positions[new])
+        previous_counts = self.counts[ids]
+        self.counts[ids] += chunk_counts
+
+        keep = np.zeros(len(ids), dtype=bool)
+        if self.keep_sequences:
+            keep[new] = True
+        else:
+            for other in self.shared_with:
+                keep[new] |= other._lookup(keys[new]) >= 0
+        # sequences occurring more than once for the first time
+        keep |= (previous_counts < 2) & (previous_counts + chunk_counts > 1)
+        for i, position in zip(ids[keep].tolist(), positions[keep].tolist()):
+            if i not in self.texts:
+                self.texts[i] = sequences[position]
+        self.n_sequences += len(sequences)
+
+    def _lookup(self, keys):
+        """
+        Find distinct keys in the hash table.
+        @param keys: uint64 array of shape (n, 2) of distinct digests.
+        @return: int64 array of the positions of the keys, -1 for keys not in the index.
+        """
+        mask = len(self.slots) - 1
+        ids = np.full(len(keys), -1, dtype=np.int64)
+        slots = (keys[:, 0] & np.uint64(mask)).astype(np.int64)
+        pending = np.arange(len(keys))
+        while len(pending):
+            slot = slots[pending]
+            occupant = self.slots[slot].astype(np.int64) - 1
+            occupied = occupant >= 0
+            match = np.zeros(len(pending), dtype=bool)
+            match[occupied] = (self.keys[occupant[occupied]] == keys[pending[occupied]]).all(axis=1)
+            ids[pending[match]] = occupant[match]
+            # keys reaching an empty slot are not in the index
+            probe = occupied & ~match
+            slots[pending[probe]] = (slot[probe] + 1) & mask
+            pending = pending[probe]
+        return ids
+
+    def _add(self, keys, first_indices):
+        """
+        Add keys missing from the index, with a count of zero.
+        @return: int64 array of their positions.
+        """
+        n = self.n_distinct + len(keys)
+        if n > len(self.first_indices):
+            capacity = max(n, len(self.first_indices) * 3 // 2)
+            self.keys = _resize_rows(self.keys, capacity)
+            self.first_indices = _resize_rows(self.first_indices, capacity)
+            self.counts = _resize_rows(self.counts, capacity)
+        ids = np.arange(self.n_distinct, n, dtype=np.int64)
+        self.keys[ids] = keys
+        self.first_indices[ids] = first_indices
+        self.counts[ids] = 0
+        self.n_distinct = n
+        # keep at most half of the slots occupied, so probe sequences stay short
+        if 2 * n > len(self.slots):
+            size = 1 << (2 * n - 1).bit_length()
+            self.slots = np.zeros(size, dtype=index_dtype(size))
+            self._place(np.arange(n, dtype=np.int64))
+        else:
+            self._place(ids)
+        return ids
+
+    def _place(self, ids):
+        """
+        Put the positions of keys not in the hash table yet into empty slots.
+        """
+        mask = len(self.slots) - 1
+        slots = (self.keys[ids, 0] & np.uint64(mask)).astype(np.int64)
+        pending = np.arange(len(ids))
+        while len(pending):
+            slot = slots[pending]
+            empty = self.slots[slot] == 0
+            # of several keys probing the same empty slot, one takes it and the others probe on
+            self.slots[slot[empty]] = ids[pending[empty]] + 1
+            placed = empty.copy()
+            placed[empty] = self.slots[slot[empty]] == ids[pending[empty]] + 1
+            slots[pending[~empty]] = (slot[~empty] + 1) & mask
+            pending = pending[~placed]
+
+    def merge(self, other):
+        """
+        Merge another index into this one, as if its sequences were added after the sequences of this one.
+        @param other: A DuplicationIndex.
+        @return: self
+        """
+        if not isinstance(other, DuplicationIndex):
+            raise ValueError("Cannot merge exact and approximate duplication statistics.")
+
+        n = other.n_distinct
+        ids = self._lookup(other.keys[:n])
+        new = ids < 0
+        ids[new] = self._add(other.keys[:n][new], self.n_sequences + other.first_indices[:n][new])
+        self.counts[ids] += other.counts[:n]
+        for i, text in other.texts.items():
+            self.texts.setdefault(int(ids[i]), text)
+        self.n_sequences += other.n_sequences
+        return self
+
+    def _text(self, i):
+        text = self.texts.get(i)
+        if text is None:
+            logging.warning(f"Text of the sequence at index {self.first_indices[i]} was not kept.")
+            return f"<sequence {self.first_indices[i]}>"
+        return text
+
+    def duplication_levels(self):
+        """
+        @return: A dictionary {sequence: count} of sequences occurring more than once,
+                 sorted by their counts and then by their first occurrence.
+        """
+        repeated = np.flatnonzero(self.counts[:self.n_distinct] > 1)
+        repeated = repeated[np.lexsort((self.first_indices[repeated], -self.counts[repeated]))]
+        return {self._text(i): count for i, count in zip(repeated.tolist(), self.counts[repeated].tolist())}
+
+    def shared_sequences(self, other):
+        """
+        @return: List of sequences occurring in both this and the other index, in the order of their first occurrence here.
+        """
+        other_ids = other._lookup(self.keys[:self.n_distinct])
+        shared = np.flatnonzero(other_ids >= 0)
+        shared = shared[np.argsort(self.first_indices[shared], kind='stable')]
+        return [self.texts[i] if i in self.texts else other._text(j) for i, j in zip(shared.tolist(), other_ids[shared].tolist())]
+
+    def to_arrays(self):
+        """
+        Export the index as a dictionary of numpy arrays, e.g. to save it with np.savez.
+        """
+        n = self.n_distinct
+        with_text = sorted(self.texts)
+        text_buffer, text_offsets = encode_sequences([self.texts[i] for i in with_text])
+        return {
+            'digest_size': np.array(DIGEST_SIZE, dtype=np.int64),
+            'indexed_sequences': np.array(self.n_sequences, dtype=np.int64),
+            'sequence_digests': np.ascontiguousarray(self.keys[:n]).view(np.uint8).reshape(n, DIGEST_SIZE),
+            'sequence_first_indices': self.first_indices[:n].copy(),
+            'sequence_counts': self.counts[:n].copy(),
+            'sequence_text_ids': np.array(with_text, dtype=np.int64),
+            'sequence_buffer': text_buffer,
+            'sequence_offsets': text_offsets,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Restore an index from the arrays created by to_arrays.
+        """
+        if int(arrays['digest_size']) != DIGEST_SIZE:
+            logging.error(f"Duplication index with {int(arrays['digest_size'])}-byte digests is not supported, recompute the statistics.")
+            raise ValueError(f"Duplication index with {int(arrays['digest_size'])}-byte digests is not supported, recompute the statistics.")
+        index = cls()
+        index.n_sequences = int(arrays['indexed_sequences'])
+        ids = index._add(_as_keys(arrays['sequence_digests']), arrays['sequence_first_indices'])
+        index.counts[ids] = arrays['sequence_counts']
+        index.texts = dict(zip(arrays['sequence_text_ids'].tolist(), _decode(arrays['sequence_buffer'], arrays['sequence_offsets'])))
+        return index
+
+def _as_keys(digests):
+    """
+    View digests of DIGEST_SIZE bytes as pairs of uint64.
+    """
+    return np.ascontiguousarray(digests).view(np.uint64).reshape(len(digests), 2)
+
+def _distinct_keys(digests):
+    """
+    @return: A tuple (keys, positions, counts) of the distinct digests of a chunk as pairs of uint64
+             in the order of their first occurrence, the positions of their first occurrences and their counts in the chunk.
+    """
+    keys = _as_keys(digests)
+    # stable, so equal keys are sorted by their positions
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], (sorted_keys[1:] != sorted_keys[:-1]).any(axis=1)]))
+    counts = np.diff(np.append(starts, len(keys)))
+    positions = order[starts]
+    first = np.argsort(positions)
+    return sorted_keys[starts[first]], positions[first], counts[first]
+
+def _resize_rows(array, n_rows):
+    resized = np.zeros((n_rows,) + array.shape[1:], dtype=array.dtype)
+    resized[:len(array)] = array
+    return resized
+
+class ApproximateDuplicationIndex:
+    """
+    Approximate counterpart of DuplicationIndex in fixed memory, for datasets where even one digest per sequence is too large.
+
+    The number of distinct sequences is estimated with a HyperLogLog sketch and the duplication levels
+    of the most frequent sequences with a SpaceSaving sketch. Sequences are added in blocks of at most block_size,
+    so memory does not grow with the size of the dataset. error_bounds() describes the accuracy of both estimates.
+    """
+
+    block_size = 100000
+
+    def __init__(self, precision=14, capacity=1000):
+        self.distinct = HyperLogLog(precision)
+        self.frequent = SpaceSaving(capacity)
+        self.n_sequences = 0
+
+    def __len__(self):
+        """
+        Estimated number of distinct sequences.
+        """
+        return self.distinct.estimate()
+
+    def update(self, sequences):
+        """
+        Add a chunk of sequences to the sketches.
+        @param sequences: A list of sequences (str) or a SequenceBatch.
+        """
+        for start in range(0, len(sequences), self.block_size):
+            block = sequences[start:start + self.block_size]
+            if isinstance(block, SequenceBatch):
+                # the SpaceSaving sketch is keyed by the sequences themselves
+                block = block.tolist()
+            self.distinct.update(block)
+            self.frequent.update(block)
+        self.n_sequences += len(sequences)
+
+    def merge(self, other):
+        if not isinstance(other, ApproximateDuplicationIndex):
+            raise ValueError("Cannot merge exact and approximate duplication statistics.")
+        self.distinct.merge(other.distinct)
+        self.frequent.merge(other.frequent)
+        self.n_sequences += other.n_sequences
+        return self
+
+    def duplication_levels(self):
+        """
+        @return: A dictionary {sequence: estimated count} of tracked sequences with an estimated count above one,
+                 sorted by their counts.
+        """
+        return self.frequent.top(min_count=2)
+
+    def shared_sequences(self, other):
+        """
+        @return: List of sequences tracked by the sketches of both indexes. All of them occur in both datasets,
+                 but sequences too infrequent to be tracked are missed.
+        """
+        logging.info("Approximate duplication statistics: only the most frequent sequences are compared between datasets.")
+        return [sequence for sequence in self.frequent.items if sequence in other.frequent.items]
+
+    def error_bounds(self):
+        """
+        @return: A dictionary describing the accuracy of the estimates, keyed by the statistics they belong to.
+        """
+        return {
+            'Number of sequences left after deduplication': {
+                'Method': 'HyperLogLog',
+                'Relative standard error': float(self.distinct.relative_error),
+            },
+            'Sequence duplication levels': {
+                'Method': 'SpaceSaving',
+                'Tracked sequences': self.frequent.capacity,
+                'Maximal overestimate of reported counts': int(self.frequent.max_error),
+                'Guaranteed maximal overestimate': self.n_sequences // self.frequent.capacity,
+            },
+        }
+
+    def to_arrays(self):
+        """
+        Export the sketches as a dictionary of numpy arrays, e.g. to save them with np.savez.
+        """
+        sequences = list(self.frequent.items.keys())
+        buffer, offsets = encode_sequences(sequences)
+        return {
+            'indexed_sequences': np.array(self.n_sequences, dtype=np.int64),
+            'hll_registers': self.distinct.registers,
+            'spacesaving_capacity': np.array(self.frequent.capacity, dtype=np.int64),
+            'spacesaving_sequences': np.array(self.frequent.n_sequences, dtype=np.int64),
+            'spacesaving_truncated': np.array(self.frequent.truncated),
+            'spacesaving_buffer': buffer,
+            'spacesaving_offsets': offsets,
+            'spacesaving_counts': np.array([self.frequent.items[sequence][0] for sequence in sequences], dtype=np.int64),
+            'spacesaving_errors': np.array([self.frequent.items[sequence][1] for sequence in sequences], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Restore an index from the arrays created by to_arrays.
+        """
+        registers = arrays['hll_registers']
+        index = cls(precision=int(np.log2(len(registers))), capacity=int(arrays['spacesaving_capacity']))
+        index.n_sequences = int(arrays['indexed_sequences'])
+        index.distinct.registers = registers.copy()
+        index.frequent.n_sequences = int(arrays['spacesaving_sequences'])
+        index.frequent.truncated = bool(arrays['spacesaving_truncated'])
+        index.frequent.items = {
+            sequence: [count, error] for sequence, count, error in zip(
+                _decode(arrays['spacesaving_buffer'], arrays['spacesaving_offsets']),
+                arrays['spacesaving_counts'].tolist(), arrays['spacesaving_errors'].tolist())
+        }
+        return index
+
+def duplication_index_from_arrays(arrays):
+    """
+    Restore an exact or approximate duplication index from the arrays created by its to_arrays.
+    """
+    if 'hll_registers' in arrays:
+        return ApproximateDuplicationIndex.from_arrays(arrays)
+    return DuplicationIndex.from_arrays(arrays)
+
+def _decode(buffer, offsets):
+    text = buffer.tobytes().decode('ascii')
+    return [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
@@ -0,0 +1,385 @@
+import numpy as np
+
+# bases encoded and counted at once when large inputs are split into chunks, see iter_sequence_chunks
+CHUNK_BASES = 1 << 20
+
+def encode_sequences(sequences):
+    """
+    Encode a list of sequences into one flat uint8 buffer and an offsets array.
+    Sequence i occupies buffer[offsets[i]:offsets[i + 1]].
+    @param sequences: A list of sequences (str), or a SequenceBatch, whose buffer is returned without a copy.
+    @return: A tuple (buffer, offsets) with a uint8 buffer and int64 offsets of length len(sequences) + 1.
+    """
+    if isinstance(sequences, SequenceBatch):
+        return sequences.encoded()
+    lengths = np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences))
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    buffer = np.frombuffer(''.join(sequences).encode('ascii'), dtype=np.uint8)
+    return buffer, offsets
+
+class SequenceBatch:
+    """
+    Sequences held as one contiguous uint8 buffer and int64 offsets, see encode_sequences, instead of a list of str.
+
+    Sequence i occupies buffer[offsets[i]:offsets[i + 1]]. Offsets do not have to start at zero, so a contiguous slice
+    of a batch is a view sharing the buffer of the batch. Rows selected by a boolean mask or by indices are gathered
+    into a new buffer in a single vectorized copy, see take().
+    A batch can be used where a list of sequences is read: len(), iteration and integer indexing give str.
+    """
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_sequences(cls, sequences):
+        """
+        Encode sequences (str) into a batch. A batch is returned as it is, and sequences held by Arrow,
+        e.g. a pandas column of Arrow strings, are taken from the Arrow buffers, see from_arrow.
+        """
+        if isinstance(sequences, SequenceBatch):
+            return sequences
+        values = getattr(sequences, 'array', sequences)
+        pyarrow = _pyarrow()
+        if pyarrow is not None and hasattr(values, '__arrow_array__'):
+            return cls.from_arrow(pyarrow.array(values))
+        return cls(*encode_sequences(sequences))
+
+    @classmethod
+    def from_arrow(cls, array):
+        """
+        Build a batch from an Arrow string array or chunked array without creating a string per sequence.
+        The offsets and data buffers of a single large_string array are used without a copy. Missing values become empty sequences.
+        """
+        pyarrow = _pyarrow()
+        if isinstance(array, pyarrow.ChunkedArray):
+            if array.num_chunks != 1:
+                return cls.concatenate([cls.from_arrow(chunk) for chunk in array.chunks])
+            array = array.chunk(0)
+        array = array.cast(pyarrow.large_string())
+        _, offsets, data = array.buffers()
+        offsets = np.frombuffer(offsets, dtype=np.int64)[array.offset:array.offset + len(array) + 1] \
+            if offsets is not None else np.zeros(1, dtype=np.int64)
+        buffer = np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, dtype=np.uint8)
+        return cls(buffer, offsets)
+
+    @classmethod
+    def from_bytes(cls, sequences):
+        """
+        Build a batch from a list of sequences (bytes), e.g. parsed from a FASTA file, without decoding them.
+        """
+        lengths = np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences))
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(np.frombuffer(b''.join(sequences), dtype=np.uint8), offsets)
+
+    @classmethod
+    def from_integers(cls, numbers):
+        """
+        Build a batch of the decimal representations of non-negative integers without creating a string per number.
+        The digits of all numbers are computed at once, from the position of each digit counted from the end of its number.
+        """
+        numbers = np.asarray(numbers, dtype=np.int64)
+        lengths = np.ones(len(numbers), dtype=np.int64)
+        for power in range(1, 19):
+            lengths += numbers >= 10 ** power
+        offsets = np.zeros(len(numbers) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        powers = 10 ** positions_in_sequence(offsets, reverse=True).astype(np.int64)
+        digits = np.repeat(numbers, lengths) // powers % 10
+        return cls((digits + ord('0')).astype(np.uint8), offsets)
+
+    @classmethod
+    def repeat(cls, sequence, n):
+        """
+        Build a batch holding the same sequence (str or bytes) n times.
+        """
+        if isinstance(sequence, str):
+            sequence = sequence.encode('ascii')
+        buffer = np.tile(np.frombuffer(sequence, dtype=np.uint8), n)
+        return cls(buffer, np.arange(n + 1, dtype=np.int64) * len(sequence))
+
+    @classmethod
+    def concatenate(cls, batches):
+        """
+        Append batches one after another into a new batch.
+        """
+        encoded = [batch.encoded() for batch in batches]
+        if not encoded:
+            return cls(np.zeros(0, dtype=np.uint8), np.zeros(1, dtype=np.int64))
+        starts = np.cumsum([0] + [len(buffer) for buffer, _ in encoded])
+        offsets = np.concatenate([encoded[0][1][:1]] + [offsets[1:] + start for (_, offsets), start in zip(encoded, starts)])
+        return cls(np.concatenate([buffer for buffer, _ in encoded]), offsets)
+
+    @classmethod
+    def join_rows(cls, batches):
+        """
+        Concatenate the sequences of batches with the same number of rows row by row, like concatenate_sequences.
+        Each batch is copied once into its place in the joined buffer.
+        """
+        if len({len(batch) for batch in batches}) > 1:
+            raise ValueError(f"Sequence columns have different numbers of sequences: {[len(batch) for batch in batches]}.")
+        if len(batches) == 1:
+            return batches[0]
+        encoded = [batch.encoded() for batch in batches]
+        lengths = sum(np.diff(offsets) for _, offsets in encoded)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        buffer = np.empty(offsets[-1], dtype=np.uint8)
+        # position in the joined sequences where the next column starts
+        starts = offsets[:-1].copy()
+        for column, column_offsets in encoded:
+            column_lengths = np.diff(column_offsets)
+            buffer[np.repeat(starts - column_offsets[:-1], column_lengths) + np.arange(len(column))] = column
+            starts += column_lengths
+        return cls(buffer, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __repr__(self):
+        return f"SequenceBatch({len(self)} sequences, {self.n_bases} bases)"
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def n_bases(self):
+        return int(self.offsets[-1] - self.offsets[0])
+
+    @property
+    def nbytes(self):
+        return self.n_bases + self.offsets.nbytes
+
+    def encoded(self):
+        """
+        @return: A tuple (buffer, offsets) as from encode_sequences. The buffer is a view of the buffer of the batch.
+        """
+        first, last = int(self.offsets[0]), int(self.offsets[-1])
+        if first == 0 and last == len(self.buffer):
+            return self.buffer, self.offsets
+        return self.buffer[first:last], self.offsets - first
+
+    def __getitem__(self, key):
+        """
+        An integer gives the sequence (str), a contiguous slice gives a view of the batch,
+        other slices, boolean masks and arrays of indices give a new batch, see take().
+        """
+        if isinstance(key, (int, np.integer)):
+            index = range(len(self))[key]
+            return self.buffer[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('ascii')
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return SequenceBatch(self.buffer, self.offsets[start:max(start, stop) + 1])
+            return self.take(np.arange(start, stop, step))
+        key = np.asarray(key)
+        if key.dtype == bool:
+            if len(key) != len(self):
+                raise IndexError(f"Boolean mask of length {len(key)} does not match {len(self)} sequences.")
+            key = np.flatnonzero(key)
+        return self.take(key)
+
+    def take(self, indices):
+        """
+        Gather the sequences at the given indices into a new batch, with a single copy of their bases.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[:-1][indices]
+        lengths = self.offsets[1:][indices] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if len(indices) > 1 and np.all(indices[1:] > indices[:-1]):
+            # rows kept in their order, e.g. selected by a mask, are copied through a mask of the bases,
+            # which is cheaper than an index per base
+            buffer, all_offsets = self.encoded()
+            selected = np.zeros(len(self), dtype=bool)
+            selected[indices] = True
+            return SequenceBatch(buffer[np.repeat(selected, np.diff(all_offsets))], offsets)
+        return SequenceBatch(self.buffer[np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])], offsets)
+
+    def iter_bytes(self):
+        """
+        Iterate over the sequences as memoryviews of the buffer, e.g. for hashing, without creating str or bytes objects.
+        """
+        view = memoryview(np.ascontiguousarray(self.buffer))
+        bounds = self.offsets.tolist()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield view[start:end]
+
+    def to_array(self):
+        """
+        @return: An object array of the sequences (str).
+        """
+        buffer, offsets = self.encoded()
+        pyarrow = _pyarrow()
+        if pyarrow is not None:
+            # Arrow creates the strings straight from the buffer and the offsets
+            strings = pyarrow.LargeStringArray.from_buffers(len(offsets) - 1, pyarrow.py_buffer(offsets), pyarrow.py_buffer(buffer))
+            return strings.to_numpy(zero_copy_only=False)
+        text = buffer.tobytes().decode('ascii')
+        bounds = offsets.tolist()
+        sequences = np.empty(len(offsets) - 1, dtype=object)
+        sequences[:] = [text[begin:end] for begin, end in zip(bounds[:-1], bounds[1:])]
+        return sequences
+
+    def tolist(self):
+        """
+        @return: A list of the sequences (str).
+        """
+        return self.to_array().tolist()
+
+    def __iter__(self):
+        buffer, offsets = self.encoded()
+        text = buffer.tobytes().decode('ascii')
+        bounds = offsets.tolist()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield text[start:end]
+
+def _pyarrow():
+    """
+    Return pyarrow if it is installed, otherwise None.
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    return pyarrow
+
+def iter_sequence_chunks(sequences, max_bases=CHUNK_BASES):
+    """
+    Split sequences into consecutive chunks of whole sequences with at most max_bases bases each,
+    or a single longer sequence, so vectorized statistics computed chunk by chunk keep their temporaries bounded.
+    @param sequences: A list of sequences (str) or a SequenceBatch, whose chunks are views of its buffer.
+    @param max_bases: Maximal number of bases of a chunk.
+    @return: A generator yielding slices of the sequences.
+    """
+    if isinstance(sequences, SequenceBatch):
+        offsets = sequences.offsets - sequences.offsets[0]
+    else:
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences)), out=offsets[1:])
+    start = 0
+    while start < len(sequences):
+        # the last sequence ending at most max_bases after the start of the chunk
+        stop = max(int(np.searchsorted(offsets, offsets[start] + max_bases, side='right')) - 1, start + 1)
+        yield sequences[start:stop]
+        start = stop
+
+def build_lookup_table(symbols):
+    """
+    Build a table translating byte values into indices of the given symbols.
+    Bytes that are not among the symbols are mapped to -1. Codes are int8, as sequences are ASCII
+    and hold at most 128 different symbols, so translating a buffer costs one byte per base.
+    @param symbols: A list of single-character strings.
+    @return: An int8 array of length 256.
+    """
+    lookup = np.full(256, -1, dtype=np.int8)
+    for index, symbol in enumerate(symbols):
+        lookup[ord(symbol)] = index
+    return lookup
+
+def index_dtype(size):
+    """
+    Return int32 if it holds the indices 0..size-1, otherwise int64, for the index and key temporaries of vectorized counts.
+    """
+    return np.int32 if size <= 2 ** 31 else np.int64
+
+def sequence_ids(offsets):
+    """
+    Return the index of the sequence each buffer position belongs to, as int32 unless there are more than 2^31 sequences.
+    """
+    n_sequences = len(offsets) - 1
+    return np.repeat(np.arange(n_sequences, dtype=index_dtype(n_sequences)), np.diff(offsets))
+
+def positions_in_sequence(offsets, reverse=False):
+    """
+    Return the position of each buffer element within its own sequence.
+    With reverse=True, positions are counted from the end of the sequence.
+    Positions are int32 unless the buffer holds more than 2^31 bases.
+    """
+    dtype = index_dtype(int(offsets[-1]))
+    lengths = np.diff(offsets)
+    index = np.arange(offsets[-1], dtype=dtype)
+    if reverse:
+        return np.repeat((offsets[1:] - 1).astype(dtype), lengths) - index
+    return index - np.repeat(offsets[:-1].astype(dtype), lengths)
+
+def count_per_position(codes, offsets, n_symbols):
+    """
+    Count the symbols at each position of the sequences, counted both from the start and from the end, in one pass.
+    Positions from the end are derived from positions from the start, so no reversed copies of the sequences are made.
+    Positions and the (position, symbol) keys are int32 for chunks of up to 2^31 bases, see positions_in_sequence;
+    count large inputs chunk by chunk, see iter_sequence_chunks, to bound these temporaries.
+    @param codes: Symbol index of each buffer element, see build_lookup_table.
+    @param offsets: int64 offsets of the sequences in the buffer, see encode_sequences.
+    @param n_symbols: Size of the alphabet.
+    @return: An int64 array of shape (2, max_length, n_symbols), with counts from the start of the sequences in [0]
+             and counts from the end of the sequences in [1].
+    """
+    lengths = np.diff(offsets)
+    max_length = int(lengths.max()) if len(lengths) else 0
+    forward = positions_in_sequence(offsets).astype(index_dtype(max_length * n_symbols), copy=False)
+
+    counts = np.empty((2, max_length, n_symbols), dtype=np.int64)
+    for direction in range(2):
+        if direction == 0:
+            keys = forward * n_symbols
+        else:
+            keys = np.repeat((lengths - 1).astype(forward.dtype), lengths)
+            keys -= forward
+            keys *= n_symbols
+        keys += codes
+        counts[direction] = np.bincount(keys, minlength=max_length * n_symbols).reshape(max_length, n_symbols)
+    return counts
+
+# 2-bit codes of the bases for k-mer hashing, other bytes are -1
+BASE_CODES = np.full(256, -1, dtype=np.int8)
+for code, bases in enumerate(['Aa', 'Cc', 'Gg', 'Tt']):
+    for base in bases:
+        BASE_CODES[ord(base)] = code
+
+def count_kmers(buffer, offsets, k):
+    """
+    Count the k-mers of the sequences with a rolling 2-bit hash over the encoded buffer.
+    The hash of the k-mer starting at position i is sum(code[i + j] << 2 * (k - 1 - j)), so the hashes of all
+    positions are built with k vectorized shifts. K-mers spanning two sequences or containing other bases than ACGT are skipped.
+    @param buffer: uint8 buffer with the concatenated sequences.
+    @param offsets: int64 offsets of the sequences in the buffer, see encode_sequences.
+    @param k: Length of the k-mers, at most 16.
+    @return: A tuple (kmers, counts) of the hashes of the present k-mers in increasing order and their int64 counts.
+    """
+    n_windows = len(buffer) - k + 1
+    if n_windows <= 0:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int64)
+
+    codes = BASE_CODES[buffer]
+    hashes = np.zeros(n_windows, dtype=np.uint32)
+    for j in range(k):
+        hashes <<= np.uint32(2)
+        hashes |= codes[j:j + n_windows].astype(np.uint32) & np.uint32(3)
+
+    # a window is valid if it ends in the same sequence it starts in and contains no invalid base
+    ends = np.repeat(offsets[1:], np.diff(offsets))[:n_windows]
+    invalid = np.concatenate([[0], np.cumsum(codes < 0)])
+    valid = (np.arange(n_windows) + k <= ends) & (invalid[k:] == invalid[:n_windows])
+    hashes = hashes[valid]
+
+    if k <= 8:
+        counts = np.bincount(hashes, minlength=4 ** k)
+        kmers = np.flatnonzero(counts).astype(np.uint32)
+        return kmers, counts[kmers]
+    kmers, counts = np.unique(hashes, return_counts=True)
+    return kmers, counts.astype(np.int64)
+
+def decode_kmers(kmers, k):
+    """
+    Translate k-mer hashes from count_kmers back to strings.
+    """
+    kmers = np.asarray(kmers, dtype=np.uint32)
+    shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.uint32)
+    codes = (kmers[:, None] >> shifts) & np.uint32(3)
+    letters = np.frombuffer(b'ACGT', dtype=np.uint8)[codes]
+    return [row.tobytes().decode('ascii') for row in letters]
@@ -0,0 +1,89 @@
+import logging
+import io
+import mmap
+from Bio import SeqIO
+
+from genbenchQC.utils.compression import detect_compression, iter_decompressed
+from genbenchQC.utils.encoding import SequenceBatch
+
+# size of the blocks of whole records parsed at once
+BLOCK_SIZE = 1 << 24
+# translation of bytes to uppercase and the bytes removed from sequence lines
+_UPPERCASE = bytes(range(256)).upper()
+_WHITESPACE = b' \t\r\n\v\f'
+
+def parse_fasta_block(block):
+    """
+    Parse FASTA records from bytes holding whole records, without building a record object per sequence.
+    Records are split at the bytes b'\\n>', the header line of each record is dropped, and newlines of multi-line
+    records are removed and bases uppercased in a single bytes translation. Text before the first header is ignored.
+    @param block: Bytes of whole FASTA records.
+    @return: A list of sequences (bytes).
+    """
+    if not block.startswith(b'>'):
+        start = block.find(b'\n>')
+        if start < 0:
+            return []
+        block = block[start + 1:]
+    return [record.partition(b'\n')[2].translate(_UPPERCASE, _WHITESPACE) for record in block[1:].split(b'\n>')]
+
+def iter_fasta_blocks(fasta_file, block_size=BLOCK_SIZE):
+    """
+    Memory-map a FASTA file and parse it in blocks of whole records, see parse_fasta_block.
+    Blocks end right before a header line, so records are never split between two blocks.
+    Compressed files (gzip, BGZF, zstd) are decompressed on other threads and parsed in blocks of the decompressed
+    bytes, see iter_decompressed. Files that cannot be memory-mapped (e.g. empty files or pipes) are parsed with Biopython.
+    @param fasta_file: Path to a FASTA file.
+    @param block_size: Approximate number of bytes of one block.
+    @return: A generator yielding lists of uppercase sequences (bytes), one list per block.
+    """
+    if detect_compression(fasta_file) is not None:
+        yield from _iter_compressed_blocks(fasta_file, block_size)
+        return
+    with open(fasta_file, 'rb') as file:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError) as e:
+            logging.debug(f"Cannot memory-map {fasta_file} ({e}), parsing it with Biopython.")
+            yield [str(record.seq).upper().encode('ascii') for record in SeqIO.parse(io.TextIOWrapper(file), 'fasta')]
+            return
+        with data:
+            start = 0
+            while start < len(data):
+                end = data.find(b'\n>', start + block_size) + 1 if start + block_size < len(data) else 0
+                if end <= 0:
+                    end = len(data)
+                yield parse_fasta_block(data[start:end])
+                start = end
+
+def _iter_compressed_blocks(fasta_file, block_size):
+    # decompressed bytes not parsed yet, extended in place so records spanning many pieces are not copied again and again
+    data = bytearray()
+    # position right after the last complete record in data
+    end = 0
+    for piece in iter_decompressed(fasta_file):
+        # only the new bytes, with the newline before them, can hold a new record start
+        start = max(len(data) - 1, 0)
+        data += piece
+        end = max(end, data.rfind(b'\n>', start) + 1)
+        if len(data) >= block_size and end > 0:
+            yield parse_fasta_block(bytes(memoryview(data)[:end]))
+            del data[:end]
+            end = 0
+    if data:
+        yield parse_fasta_block(bytes(data))
+
+def iter_fasta_sequences(fasta_file, block_size=BLOCK_SIZE):
+    """
+    Iterate over the uppercase sequences of a FASTA file in blocks, see iter_fasta_blocks.
+    @return: A generator yielding lists of sequences (str), one list per block.
+    """
+    for block in iter_fasta_blocks(fasta_file, block_size):
+        yield [sequence.decode('ascii') for sequence in block]
+
+def read_fasta_encoded(fasta_file):
+    """
+    Read all sequences of a FASTA file into one flat buffer, without creating a string per sequence.
+    @return: A tuple (buffer, offsets) of uppercase sequences, see encode_sequences.
+    """
+    return SequenceBatch.from_bytes([sequence for block in iter_fasta_blocks(fasta_file) for sequence in block]).encoded()
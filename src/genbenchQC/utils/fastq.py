@@ -0,0 +1,147 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from genbenchQC.utils.compression import iter_decompressed
+from genbenchQC.utils.encoding import positions_in_sequence
+from genbenchQC.utils.fasta import BLOCK_SIZE, _UPPERCASE
+
+# quality scores are encoded as ASCII characters with this offset (Sanger / Illumina 1.8+)
+PHRED_OFFSET = 33
+
+class QualityProfile:
+    """
+    Sums and counts of the Phred quality scores at each position of the reads, for their mean per position.
+    Profiles of parts of the input can be merged, like KmerSpectrum.
+    """
+
+    def __init__(self):
+        self.sums = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def update(self, qualities):
+        """
+        Add the quality strings of a chunk of reads.
+        @param qualities: A list of quality strings (bytes), one per read.
+        """
+        if len(qualities) == 0:
+            return
+        lengths = np.fromiter((len(quality) for quality in qualities), dtype=np.int64, count=len(qualities))
+        scores = np.frombuffer(b''.join(qualities), dtype=np.uint8)
+        max_length = int(lengths.max())
+        if len(scores) == len(qualities) * max_length:
+            # reads of equal length, the usual case, are summed as columns of a matrix
+            counts = np.full(max_length, len(qualities), dtype=np.int64)
+            sums = scores.reshape(len(qualities), max_length).sum(axis=0, dtype=np.int64)
+        elif len(qualities) * max_length <= 2 * len(scores):
+            # reads of similar lengths are padded with zeros to a matrix
+            present = np.arange(max_length) < lengths[:, None]
+            matrix = np.zeros((len(qualities), max_length), dtype=np.uint8)
+            matrix[present] = scores
+            counts = present.sum(axis=0)
+            sums = matrix.sum(axis=0, dtype=np.int64)
+        else:
+            offsets = np.zeros(len(qualities) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            positions = positions_in_sequence(offsets)
+            counts = np.bincount(positions, minlength=max_length)
+            sums = np.bincount(positions, weights=scores, minlength=max_length).astype(np.int64)
+        self._add(sums - PHRED_OFFSET * counts, counts)
+
+    def _add(self, sums, counts):
+        if len(sums) > len(self.sums):
+            self.sums = np.pad(self.sums, (0, len(sums) - len(self.sums)))
+            self.counts = np.pad(self.counts, (0, len(counts) - len(self.counts)))
+        self.sums[:len(sums)] += sums
+        self.counts[:len(counts)] += counts
+
+    def merge(self, other):
+        """
+        Add the scores of another profile to this one.
+        @return: self
+        """
+        self._add(other.sums, other.counts)
+        return self
+
+    def to_frame(self):
+        """
+        Mean quality at each position, over the reads at least that long.
+        """
+        return pd.DataFrame({'Mean quality': self.sums / np.maximum(self.counts, 1)})
+
+    def to_arrays(self, prefix):
+        """
+        Export the profile as a dictionary of numpy arrays, keyed by prefix and the name of the array.
+        """
+        return {f'{prefix}_sums': self.sums, f'{prefix}_counts': self.counts}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        """
+        Restore a profile from the arrays created by to_arrays.
+        """
+        profile = cls()
+        profile._add(arrays[f'{prefix}_sums'], arrays[f'{prefix}_counts'])
+        return profile
+
+def parse_fastq_block(block, qualities=None):
+    """
+    Parse FASTQ records from bytes holding whole 4-line records, without building a record object per read.
+    Sequence lines are taken as every fourth line and uppercased in a single bytes translation. Quality lines are
+    not decoded; they are only added to the quality profile if one is given.
+    Multi-line FASTQ records are not supported.
+    @param block: Bytes of whole FASTQ records.
+    @param qualities: Optional QualityProfile to add the quality strings to.
+    @return: A list of sequences (bytes).
+    """
+    if b'\r' in block:
+        block = block.replace(b'\r', b'')
+    lines = block.split(b'\n')
+    # the newline ending the last record and blank lines at the end of the file
+    while len(lines) % 4 and lines[-1] == b'':
+        lines.pop()
+    if not lines:
+        return []
+    if len(lines) % 4 or any(header[:1] != b'@' for header in lines[0::4]) \
+            or any(separator[:1] != b'+' for separator in lines[2::4]):
+        logging.error("Invalid FASTQ records, expected 4 lines per record: header, sequence, '+' and quality.")
+        raise ValueError("Invalid FASTQ records, expected 4 lines per record: header, sequence, '+' and quality.")
+    if qualities is not None:
+        qualities.update(lines[3::4])
+    return b'\n'.join(lines[1::4]).translate(_UPPERCASE).split(b'\n')
+
+def iter_fastq_blocks(fastq_file, block_size=BLOCK_SIZE, qualities=None):
+    """
+    Parse a FASTQ file in blocks of whole records, see parse_fastq_block.
+    Compressed files (gzip, BGZF, zstd) are decompressed on other threads, see iter_decompressed.
+    @param fastq_file: Path to a FASTQ file.
+    @param block_size: Approximate number of bytes of one block.
+    @param qualities: Optional QualityProfile to add the quality strings to.
+    @return: A generator yielding lists of uppercase sequences (bytes), one list per block.
+    """
+    # decompressed bytes not parsed yet, extended in place so records spanning many pieces are not copied again and again
+    data = bytearray()
+    # number of complete lines in data and the position right after the last complete record
+    n_lines, end = 0, 0
+    for piece in iter_decompressed(fastq_file):
+        newlines = np.flatnonzero(np.frombuffer(piece, dtype=np.uint8) == ord('\n')) + len(data)
+        data += piece
+        # every fourth line of data ends a record
+        record_ends = newlines[(3 - n_lines) % 4::4]
+        n_lines += len(newlines)
+        if len(record_ends):
+            end = int(record_ends[-1]) + 1
+        if len(data) >= block_size and end > 0:
+            yield parse_fastq_block(bytes(memoryview(data)[:end]), qualities)
+            del data[:end]
+            n_lines, end = n_lines % 4, 0
+    if data:
+        yield parse_fastq_block(bytes(data), qualities)
+
+def iter_fastq_sequences(fastq_file, block_size=BLOCK_SIZE, qualities=None):
+    """
+    Iterate over the uppercase sequences of a FASTQ file in blocks, see iter_fastq_blocks.
+    @return: A generator yielding lists of sequences (str), one list per block.
+    """
+    for block in iter_fastq_blocks(fastq_file, block_size, qualities):
+        yield [sequence.decode('ascii') for sequence in block]
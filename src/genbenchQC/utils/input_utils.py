@@ -1,37 +1,487 @@
-from Bio import SeqIO, SeqRecord, Seq
+import numpy as np
 import pandas as pd
 import logging
 import json
+import io
+import os
+
+from genbenchQC.utils.tables import CountTable, SketchTable, LazyStatistics
+from genbenchQC.utils.concatenation import concatenate_sequences
+from genbenchQC.utils.encoding import SequenceBatch
+from genbenchQC.utils.fasta import iter_fasta_blocks
+from genbenchQC.utils.fastq import iter_fastq_blocks
+from genbenchQC.utils.compression import detect_compression, open_decompressed
+from genbenchQC.utils.packed import PackedSequences
+
+# columnar input formats read with pyarrow, with the sequences selected like from CSV/TSV files
+COLUMNAR_FORMATS = ['parquet', 'feather', 'arrow']
+# formats holding one sequence per record, without columns or labels
+SEQUENCE_FORMATS = ['fasta', 'fastq', 'fastq.gz']
+# packed sequence files written by pack_sequences, read like CSV/TSV files
+PACKED_FORMAT = 'packed'
+INPUT_FORMATS = SEQUENCE_FORMATS + ['csv', 'csv.gz', 'tsv', 'tsv.gz'] + COLUMNAR_FORMATS + [PACKED_FORMAT]
+# number of FASTA records joined into one write and the buffer size of written files, see write_fasta
+WRITE_CHUNK_SIZE = 100000
+WRITE_BUFFER_SIZE = 1 << 20
 
 def read_fasta(fasta_file):
+    """
+    Read all sequences of a FASTA file.
+    @return: A SequenceBatch of uppercase sequences.
+    """
     logging.debug(f"Reading FASTA file: {fasta_file}")
-    return [str(record.seq).upper() for record in SeqIO.parse(fasta_file, 'fasta')]
+    return SequenceBatch.from_bytes([sequence for block in iter_fasta_blocks(fasta_file) for sequence in block])
 
-def write_fasta(sequences, output_file, indices=None):
-    if indices is None:
-        records = [SeqRecord.SeqRecord(Seq.Seq(seq), id=f'seq_{i}', description="") for i, seq in enumerate(sequences)]
+def iter_fasta(fasta_file, chunk_size=100000, shard=None):
+    """
+    Read sequences from a FASTA file in chunks.
+    @param fasta_file: Path to the FASTA file.
+    @param chunk_size: Maximal number of sequences in one chunk.
+    @param shard: Optional tuple (index, number of shards) to read only one shard of the file, see iter_shard_lines.
+    @return: A generator yielding SequenceBatch chunks of uppercase sequences.
+    """
+    logging.debug(f"Streaming FASTA file: {fasta_file} in chunks of {chunk_size} sequences")
+    if shard is None:
+        sequences = (sequence for block in iter_fasta_blocks(fasta_file) for sequence in block)
     else:
-        records = [SeqRecord.SeqRecord(Seq.Seq(sequences[i]), id=f'seq_{indices[i]}', description="") for i in range(len(sequences))]
+        logging.debug(f"Reading shard {shard[0]}/{shard[1]} of {fasta_file}")
+        sequences = _iter_fasta_shard(fasta_file, shard)
+
+    yield from _iter_chunks(sequences, chunk_size)
+
+def read_fastq(fastq_file, qualities=None):
+    """
+    Read all sequences of a FASTQ file, plain or compressed.
+    @param qualities: Optional QualityProfile to add the quality strings of the reads to.
+    @return: A SequenceBatch of uppercase sequences.
+    """
+    logging.debug(f"Reading FASTQ file: {fastq_file}")
+    return SequenceBatch.from_bytes([sequence for block in iter_fastq_blocks(fastq_file, qualities=qualities) for sequence in block])
+
+def iter_fastq(fastq_file, chunk_size=100000, qualities=None):
+    """
+    Read sequences from a FASTQ file, plain or compressed, in chunks.
+    Quality strings are skipped, or only added to the quality profile without being decoded.
+    @param fastq_file: Path to the FASTQ file.
+    @param chunk_size: Maximal number of sequences in one chunk.
+    @param qualities: Optional QualityProfile to add the quality strings of the reads to.
+                      It is complete once all chunks were consumed.
+    @return: A generator yielding SequenceBatch chunks of uppercase sequences.
+    """
+    logging.debug(f"Streaming FASTQ file: {fastq_file} in chunks of {chunk_size} sequences")
+    yield from _iter_chunks((sequence for block in iter_fastq_blocks(fastq_file, qualities=qualities) for sequence in block),
+                            chunk_size)
+
+def is_sequence_file(file_path, input_format):
+    """
+    Check if a file holds sequences of one of SEQUENCE_FORMATS, either directly or packed from such a file by pack_sequences.
+    Packed FASTA/FASTQ files are read and reported the same way as the files they were packed from.
+    """
+    if input_format == PACKED_FORMAT:
+        return PackedSequences(file_path).source_format in SEQUENCE_FORMATS
+    return input_format in SEQUENCE_FORMATS
+
+def read_sequence_file(file_path, input_format, qualities=None):
+    """
+    Read all sequences of a file in one of SEQUENCE_FORMATS, or of a packed FASTA/FASTQ file, see is_sequence_file.
+    @param qualities: Optional QualityProfile, filled from FASTQ files.
+    """
+    if input_format == PACKED_FORMAT:
+        packed = PackedSequences(file_path)
+        return packed.batch(packed.sequence_columns[0])
+    if input_format == 'fasta':
+        return read_fasta(file_path)
+    return read_fastq(file_path, qualities=qualities)
+
+def iter_sequence_file(file_path, input_format, chunk_size=100000, shard=None, qualities=None):
+    """
+    Read sequences from a file in one of SEQUENCE_FORMATS, or from a packed FASTA/FASTQ file, in chunks, see iter_fasta and iter_fastq.
+    FASTQ files cannot be sharded, as record starts cannot be told apart from quality lines starting with '@'.
+    Packed files are sharded by rows, whatever format they were packed from.
+    """
+    if input_format == PACKED_FORMAT:
+        packed = PackedSequences(file_path)
+        return packed.iter_batches(packed.sequence_columns[0], chunk_size, shard=shard)
+    if input_format == 'fasta':
+        return iter_fasta(file_path, chunk_size=chunk_size, shard=shard)
+    if shard is not None:
+        logging.error("Sharding is not supported for FASTQ files.")
+        raise ValueError("Sharding is not supported for FASTQ files.")
+    return iter_fastq(file_path, chunk_size=chunk_size, qualities=qualities)
+
+def _iter_chunks(sequences, chunk_size):
+    """
+    Group sequences (bytes) into SequenceBatch chunks of at most chunk_size sequences.
+    """
+    chunk = []
+    for sequence in sequences:
+        chunk.append(sequence)
+        if len(chunk) == chunk_size:
+            yield SequenceBatch.from_bytes(chunk)
+            chunk = []
+    if chunk:
+        yield SequenceBatch.from_bytes(chunk)
+
+def _iter_fasta_shard(fasta_file, shard):
+    sequence = None
+    for line in iter_shard_lines(fasta_file, shard, is_record_start=lambda line: line.startswith(b'>')):
+        if line.startswith(b'>'):
+            if sequence is not None:
+                yield b''.join(sequence).upper()
+            sequence = []
+        else:
+            sequence.append(line.strip().replace(b' ', b''))
+    if sequence is not None:
+        yield b''.join(sequence).upper()
+
+def parse_shard(shard):
+    """
+    Parse a shard specification 'i/N' into a tuple (i, N). Shards are numbered from 1 to N.
+    """
+    try:
+        index, n_shards = (int(value) for value in shard.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard specification: '{shard}'. Expected 'i/N', e.g. '1/4'.")
+    if n_shards < 1 or not 1 <= index <= n_shards:
+        raise ValueError(f"Invalid shard specification: '{shard}'. Shard index must be between 1 and {n_shards}.")
+    return index, n_shards
+
+def iter_shard_lines(file_path, shard, is_record_start=None, skip_header=False):
+    """
+    Iterate over the lines of the records that belong to one shard of a file.
+    The file is split into N byte ranges of the same size and a record belongs to the shard in which its first line starts.
+    Concatenating the records of shards 1 to N therefore gives all records in their original order.
+    @param file_path: Path to an uncompressed file.
+    @param shard: Tuple (index, number of shards), index starting from 1.
+    @param is_record_start: Function telling whether a line starts a new record. If None, every line is a record.
+    @param skip_header: If True, the first line of the file is never returned.
+    @return: A generator yielding lines as bytes.
+    """
+    if detect_compression(file_path) is not None:
+        logging.error(f"Sharding is supported only for uncompressed files: {file_path}")
+        raise ValueError(f"Sharding is supported only for uncompressed files: {file_path}")
+
+    index, n_shards = shard
+    size = os.path.getsize(file_path)
+    start = (index - 1) * size // n_shards
+    end = index * size // n_shards
+
+    with open(file_path, 'rb') as file:
+        position = len(file.readline()) if skip_header else 0
+        if start > position:
+            # continue from the first line starting at or after the start of the shard
+            file.seek(start - 1)
+            position = start - 1 + len(file.readline())
+
+        started = is_record_start is None
+        for line in file:
+            if is_record_start is None or is_record_start(line):
+                if position >= end:
+                    break
+                started = True
+            if started:
+                yield line
+            position += len(line)
+
+def write_fasta(sequences, output_file, indices=None):
+    """
+    Write sequences to a FASTA file with the headers seq_{index}, each sequence on a single line.
+    Records are written in bulk without a record object per sequence: the headers, sequences and newlines
+    of a chunk of records are joined in one buffer, see SequenceBatch.join_rows, and written at once.
+    The digits of integer indices are generated for the whole chunk at once, see SequenceBatch.from_integers.
+    @param sequences: A list of sequences (str) or a SequenceBatch.
+    @param output_file: Path to the FASTA file, or a binary file object, e.g. the stdin of a process.
+    @param indices: Optional list of indices (non-negative int or str) used in the headers instead of the positions of the sequences.
+    """
+    sequences = SequenceBatch.from_sequences(sequences)
     logging.debug(f"Writing FASTA file: {output_file} with {len(sequences)} sequences")
-    SeqIO.write(records, output_file, 'fasta')
+    if isinstance(output_file, (str, os.PathLike)):
+        with open(output_file, 'wb', buffering=WRITE_BUFFER_SIZE) as file:
+            _write_fasta_records(sequences, file, indices)
+    else:
+        _write_fasta_records(sequences, output_file, indices)
+
+def _write_fasta_records(sequences, file, indices):
+    if indices is not None and not isinstance(indices, SequenceBatch):
+        indices = np.asarray(indices)
+        # integer indices are formatted in bulk like the positions, other names are encoded as they are
+        if not (np.issubdtype(indices.dtype, np.integer) and (indices >= 0).all()):
+            indices = SequenceBatch.from_sequences([str(name) for name in indices])
+    for start in range(0, len(sequences), WRITE_CHUNK_SIZE):
+        stop = min(start + WRITE_CHUNK_SIZE, len(sequences))
+        if indices is None:
+            names = SequenceBatch.from_integers(np.arange(start, stop))
+        elif isinstance(indices, SequenceBatch):
+            names = indices[start:stop]
+        else:
+            names = SequenceBatch.from_integers(indices[start:stop])
+        prefix = SequenceBatch.repeat('>seq_', stop - start)
+        newlines = SequenceBatch.repeat('\n', stop - start)
+        file.write(SequenceBatch.join_rows([prefix, names, newlines, sequences[start:stop], newlines]).buffer)
+
+def _arrow_csv():
+    """
+    Return pyarrow with its CSV reader if it is installed, otherwise None.
+    """
+    try:
+        import pyarrow
+        import pyarrow.csv
+        import pyarrow.compute
+    except ImportError:
+        return None
+    return pyarrow
+
+def _pyarrow_dataset():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.compute
+    except ImportError:
+        raise ImportError("The parquet, feather and arrow input formats require pyarrow. Install it with 'pip install genbenchQC[parquet]'.")
+    return pyarrow
+
+def _arrow_to_frame(pyarrow, chunk, columns, seq_columns):
+    """
+    Convert the given columns of an Arrow table or record batch to a DataFrame of strings, with the sequence columns uppercased.
+    """
+    frame = {}
+    for column in columns:
+        values = chunk.column(column).cast(pyarrow.string())
+        frame[column] = (pyarrow.compute.utf8_upper(values) if column in seq_columns else values).to_pandas()
+    return pd.DataFrame(frame)
 
-def read_csv_file(file_path, input_format, seq_columns, label_columns=None):
-    delim = '\t' if input_format == 'tsv' or input_format == 'tsv.gz' else ','
-    compression = 'gzip' if file_path.endswith('.gz') else None
+def _open_columnar(pyarrow, file_path, input_format, columns):
+    dataset = pyarrow.dataset.dataset(file_path, format='parquet' if input_format == 'parquet' else 'ipc')
+    missing = [column for column in columns if column not in dataset.schema.names]
+    if missing:
+        logging.error(f"Columns {missing} not found in {file_path}.")
+        raise ValueError(f"Columns {missing} not found in {file_path}.")
+    return dataset
 
+def _iter_columnar_chunks(file_path, input_format, columns, seq_columns, chunk_size, label_filter):
+    pyarrow = _pyarrow_dataset()
+    for batch in _iter_columnar_batches(pyarrow, file_path, input_format, columns, chunk_size, label_filter):
+        yield _arrow_to_frame(pyarrow, batch, columns, seq_columns)
+
+def _iter_columnar_batches(pyarrow, file_path, input_format, columns, chunk_size, label_filter):
+    dataset = _open_columnar(pyarrow, file_path, input_format, columns)
+    condition = None
+    if label_filter is not None:
+        label_column, label = label_filter
+        condition = pyarrow.dataset.field(label_column)
+        if not pyarrow.types.is_string(dataset.schema.field(label_column).type):
+            condition = condition.cast(pyarrow.string())
+        condition = condition == label
+    # only the projected columns are decoded, row group by row group, and row groups without the label are skipped
+    # without a chunk size, the batches are as large as the default of the dataset reader
+    options = {} if chunk_size is None else {'batch_size': chunk_size}
+    for batch in dataset.to_batches(columns=columns, filter=condition, **options):
+        if batch.num_rows > 0:
+            yield batch
+
+def _iter_columnar_shard(file_path, input_format, shard, columns, seq_columns, chunk_size):
+    """
+    Read the row groups (record batches of feather/arrow files) of one shard of a columnar file.
+    Row groups are split into N contiguous ranges, so concatenating shards 1 to N gives all rows in their original order.
+    """
+    pyarrow = _pyarrow_dataset()
+    _open_columnar(pyarrow, file_path, input_format, columns)
+    index, n_shards = shard
+    if input_format == 'parquet':
+        import pyarrow.parquet
+        file = pyarrow.parquet.ParquetFile(file_path)
+        n_groups = file.num_row_groups
+        groups = list(range((index - 1) * n_groups // n_shards, index * n_groups // n_shards))
+        batches = file.iter_batches(batch_size=chunk_size, row_groups=groups, columns=columns) if groups else []
+    else:
+        import pyarrow.ipc
+        file = pyarrow.ipc.open_file(file_path)
+        n_groups = file.num_record_batches
+        batches = (file.get_batch(group).select(columns) for group in range((index - 1) * n_groups // n_shards, index * n_groups // n_shards))
+    for batch in batches:
+        for start in range(0, batch.num_rows, chunk_size):
+            yield _arrow_to_frame(pyarrow, batch.slice(start, chunk_size), columns, seq_columns)
+
+def iter_csv_chunks(file_path, input_format, columns, seq_columns=(), chunk_size=100000, label_filter=None):
+    """
+    Read only the given columns of a CSV/TSV or columnar file in chunks, with the sequence columns uppercased chunk by chunk.
+    For CSV/TSV files, the multithreaded Arrow CSV reader is used if pyarrow is installed, otherwise pandas.
+    Arrow parses the file in small blocks, which are gathered into chunks of chunk_size rows before they are converted.
+    Compressed CSV/TSV files (gzip, BGZF, zstd) are decompressed on other threads, see open_decompressed.
+    Parquet, feather and arrow files are read with pyarrow. All columns are read as strings.
+    Packed sequence files are memory-mapped and only the requested rows are decoded, see PackedSequences.
+    @param file_path: Path to the input file.
+    @param input_format: Format of the file, one of INPUT_FORMATS except SEQUENCE_FORMATS.
+    @param columns: List of columns to read.
+    @param seq_columns: Columns with sequences to uppercase.
+    @param chunk_size: Maximal number of rows in one chunk.
+    @param label_filter: Optional tuple (label column, label). Columnar and packed files then yield only the rows with this label,
+                         filtered while the file is scanned. Rows of CSV/TSV files are not filtered.
+    @return: A generator yielding DataFrames with the given columns.
+    """
+    if input_format == PACKED_FORMAT:
+        yield from PackedSequences(file_path).iter_frames(columns, chunk_size, label_filter=label_filter)
+        return
+    if input_format in COLUMNAR_FORMATS:
+        yield from _iter_columnar_chunks(file_path, input_format, columns, seq_columns, chunk_size, label_filter)
+        return
+
+    delim = _delimiter(input_format)
+    if detect_compression(file_path) is None:
+        yield from _iter_delimited_chunks(file_path, delim, columns, seq_columns, chunk_size)
+        return
+    with open_decompressed(file_path) as file:
+        yield from _iter_delimited_chunks(file, delim, columns, seq_columns, chunk_size)
+
+def _iter_delimited_chunks(source, delim, columns, seq_columns, chunk_size):
+    pyarrow = _arrow_csv()
+    if pyarrow is None:
+        for df in pd.read_csv(source, delimiter=delim, usecols=columns, dtype=str, compression=None, chunksize=chunk_size):
+            yield _upper_columns(df, seq_columns)
+        return
+
+    # the small batches of the reader are kept in a list and joined once per yielded chunk
+    pending = []
+    n_pending = 0
+    for batch in _iter_delimited_batches(pyarrow, source, delim, columns):
+        pending.append(batch)
+        n_pending += batch.num_rows
+        if n_pending < chunk_size:
+            continue
+        table = pyarrow.Table.from_batches(pending)
+        start = 0
+        while n_pending - start >= chunk_size:
+            yield _arrow_to_frame(pyarrow, table.slice(start, chunk_size), columns, seq_columns)
+            start += chunk_size
+        pending = table.slice(start).to_batches()
+        n_pending -= start
+    if n_pending > 0:
+        yield _arrow_to_frame(pyarrow, pyarrow.Table.from_batches(pending), columns, seq_columns)
+
+def _iter_delimited_batches(pyarrow, source, delim, columns):
+    reader = pyarrow.csv.open_csv(
+        source,
+        read_options=pyarrow.csv.ReadOptions(use_threads=True),
+        parse_options=pyarrow.csv.ParseOptions(delimiter=delim),
+        # missing values are recognized as with pandas
+        convert_options=pyarrow.csv.ConvertOptions(include_columns=columns, column_types={column: pyarrow.string() for column in columns},
+                                                   strings_can_be_null=True)
+    )
+    yield from reader
+
+def _read_arrow_table(pyarrow, file_path, input_format, columns, label_filter):
+    """
+    Read the given columns of a CSV/TSV or columnar file into a single Arrow table, without converting its batches one by one.
+    """
+    if input_format in COLUMNAR_FORMATS:
+        batches = list(_iter_columnar_batches(pyarrow, file_path, input_format, columns, None, label_filter))
+    elif detect_compression(file_path) is None:
+        batches = list(_iter_delimited_batches(pyarrow, file_path, _delimiter(input_format), columns))
+    else:
+        with open_decompressed(file_path) as file:
+            batches = list(_iter_delimited_batches(pyarrow, file, _delimiter(input_format), columns))
+    schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+    return pyarrow.Table.from_batches([batch.select(columns).cast(schema) for batch in batches], schema=schema)
+
+def _delimiter(input_format):
+    return '\t' if input_format == 'tsv' or input_format == 'tsv.gz' else ','
+
+def read_csv_file(file_path, input_format, seq_columns, label_columns=None, label=None):
     columns = seq_columns.copy()
     if label_columns is not None:
         columns += [label_columns]
-    df = pd.read_csv(file_path, delimiter=delim, usecols=columns, dtype=str, compression=compression)
-    df[seq_columns] = df[seq_columns].apply(lambda col: col.str.upper())
+    # rows of columnar files with other labels are skipped while reading
+    label_filter = (label_columns, label) if label_columns is not None and label is not None else None
+    # the whole file is read at once instead of concatenating DataFrames of chunks
+    pyarrow = _pyarrow_dataset() if input_format in COLUMNAR_FORMATS else _arrow_csv()
+    if input_format == PACKED_FORMAT:
+        packed = PackedSequences(file_path)
+        frames = list(packed.iter_frames(columns, max(packed.n_sequences, 1), label_filter=label_filter))
+        df = frames[0] if frames else pd.DataFrame({column: pd.Series(dtype=str) for column in columns})
+    elif pyarrow is not None:
+        # batches of the Arrow reader are gathered into one table, which is converted to a DataFrame once
+        df = _arrow_to_frame(pyarrow, _read_arrow_table(pyarrow, file_path, input_format, columns, label_filter), columns, seq_columns)
+    elif detect_compression(file_path) is None:
+        df = _upper_columns(pd.read_csv(file_path, delimiter=_delimiter(input_format), usecols=columns, dtype=str), seq_columns)
+    else:
+        with open_decompressed(file_path) as file:
+            df = _upper_columns(pd.read_csv(file, delimiter=_delimiter(input_format), usecols=columns, dtype=str, compression=None), seq_columns)
 
     logging.debug(f"Read CSV/TSV file: {file_path}, shape: {df.shape}, columns: {columns}")
 
     return df
 
+def iter_csv_file(file_path, input_format, seq_columns, label_column=None, label=None, label_transform=None, chunk_size=100000, shard=None):
+    """
+    Read sequences from a CSV/TSV or columnar file in chunks.
+    Sequences from multiple columns are concatenated, same as in read_multisequence_df.
+    @param file_path: Path to the input file.
+    @param input_format: Format of the file, one of INPUT_FORMATS except SEQUENCE_FORMATS.
+    @param seq_columns: List of columns with sequences.
+    @param label_column: Name of the label column. If provided, only sequences with the given label are yielded.
+    @param label: Label of the sequences to yield.
+    @param label_transform: Optional function applied to the label column of each chunk before filtering,
+                            e.g. to split a regression target into classes.
+    @param chunk_size: Maximal number of rows read in one chunk.
+    @param shard: Optional tuple (index, number of shards) to read only one shard of the file, see iter_shard_lines.
+    @return: A generator yielding SequenceBatch chunks of uppercase sequences.
+    """
+    columns = seq_columns.copy()
+    if label_column is not None:
+        columns += [label_column]
+
+    logging.debug(f"Streaming CSV/TSV file: {file_path} in chunks of {chunk_size} rows, columns: {columns}")
+    if shard is None:
+        label_filter = (label_column, label) if label_column is not None and label_transform is None else None
+        reader = iter_csv_chunks(file_path, input_format, columns, seq_columns, chunk_size=chunk_size, label_filter=label_filter)
+    elif input_format in COLUMNAR_FORMATS:
+        logging.debug(f"Reading shard {shard[0]}/{shard[1]} of {file_path}")
+        reader = _iter_columnar_shard(file_path, input_format, shard, columns, seq_columns, chunk_size)
+    elif input_format == PACKED_FORMAT:
+        logging.debug(f"Reading shard {shard[0]}/{shard[1]} of {file_path}")
+        reader = PackedSequences(file_path).iter_frames(columns, chunk_size, shard=shard)
+    else:
+        logging.debug(f"Reading shard {shard[0]}/{shard[1]} of {file_path}")
+        reader = _iter_csv_shard(file_path, shard, chunk_size, seq_columns, delimiter=_delimiter(input_format), usecols=columns, dtype=str)
+    for df in reader:
+        if label_column is not None:
+            labels = df[label_column] if label_transform is None else label_transform(df[label_column])
+            df = df[labels == label]
+        if df.empty:
+            continue
+        yield concatenate_sequences([SequenceBatch.from_sequences(df[seq_column]) for seq_column in seq_columns])
+
+def _iter_csv_shard(file_path, shard, chunk_size, seq_columns, **kwargs):
+    with open(file_path, 'rb') as file:
+        header = file.readline()
+    lines = []
+    for line in iter_shard_lines(file_path, shard, skip_header=True):
+        lines.append(line)
+        if len(lines) == chunk_size:
+            yield _upper_columns(pd.read_csv(io.BytesIO(header + b''.join(lines)), **kwargs), seq_columns)
+            lines = []
+    if lines:
+        yield _upper_columns(pd.read_csv(io.BytesIO(header + b''.join(lines)), **kwargs), seq_columns)
+
+def _upper_columns(df, columns):
+    for column in columns:
+        df[column] = df[column].str.upper()
+    return df
+
+def read_labels(file_path, input_format, label_column):
+    """
+    Read only the label column from a CSV/TSV or columnar file.
+    """
+    chunks = [df[label_column] for df in iter_csv_chunks(file_path, input_format, [label_column])]
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.Series(dtype=str, name=label_column)
+
 def read_sequences_from_df(df, seq_column, label_column=None, label=None):
+    """
+    Read the sequences of a column, optionally only of the rows with the given label.
+    @return: A SequenceBatch of the sequences.
+    """
     if label_column is None:
-        return df[seq_column].tolist()
+        return SequenceBatch.from_sequences(df[seq_column])
 
     logging.debug(f"Filtering sequences by label: {label} in column: {label_column}")
     df_parsed = df[df[label_column] == label]
@@ -40,14 +490,66 @@ def read_sequences_from_df(df, seq_column, label_column=None, label=None):
         logging.error(f"No sequences found for label '{label}' in column '{label_column}'.")
         raise ValueError(f"No sequences found for label '{label}' in column '{label_column}'.")
 
-    return df_parsed[seq_column].tolist()
+    return SequenceBatch.from_sequences(df_parsed[seq_column])
 
 def read_multisequence_df(df, seq_columns, label_column=None, label=None):
     if len(seq_columns) > 1:
         logging.debug(f"Concatenating sequences from multiple columns: {seq_columns}")
     all_sequences = [read_sequences_from_df(df, seq_column, label_column, label) for seq_column in seq_columns]
-    concatenated_sequences = [''.join(seqs) for seqs in zip(*all_sequences)]
-    return concatenated_sequences
+    return concatenate_sequences(all_sequences)
+
+def partition_by_label(df, seq_columns, label_column, labels=None):
+    """
+    Split sequences of all sequence columns by label in a single pass over the label column.
+    Rows are grouped by a groupby index of the label column, so the frame is not filtered again for every label
+    and every sequence column. Sequences keep the order of their rows.
+    @param df: DataFrame with the sequence columns and the label column.
+    @param seq_columns: List of columns with sequences.
+    @param label_column: Name of the label column.
+    @param labels: Optional list of labels to keep. If None, all labels are kept in the order of their first appearance.
+    @return: Dictionary {label: {sequence column: SequenceBatch}}. Each column is encoded once
+             and the sequences of each label are gathered from it in one copy.
+    """
+    logging.debug(f"Partitioning sequences by labels in column: {label_column}")
+    groups = df.groupby(label_column, sort=False).indices
+    if labels is None:
+        labels = list(groups)
+    for label in labels:
+        if label not in groups:
+            logging.error(f"No sequences found for label '{label}' in column '{label_column}'.")
+            raise ValueError(f"No sequences found for label '{label}' in column '{label_column}'.")
+
+    return _take_groups(df, seq_columns, groups, labels)
+
+def iter_label_partitions(file_path, input_format, seq_columns, label_column, labels=None, label_transform=None, chunk_size=100000):
+    """
+    Read a CSV/TSV or columnar file in a single pass and split the sequences of each chunk by label, like partition_by_label,
+    so the statistics of all labels and sequence columns are fed from one read of the file.
+    @param file_path: Path to the input file.
+    @param input_format: Format of the file, one of INPUT_FORMATS except SEQUENCE_FORMATS.
+    @param seq_columns: List of columns with sequences.
+    @param label_column: Name of the label column.
+    @param labels: Optional list of labels to keep. If None, all labels are kept.
+    @param label_transform: Optional function applied to the label column of each chunk before splitting,
+                            e.g. to split a regression target into classes.
+    @param chunk_size: Maximal number of rows read in one chunk.
+    @return: A generator yielding a dictionary {label: {sequence column: SequenceBatch}} for each chunk,
+             without the labels that have no rows in the chunk.
+    """
+    logging.debug(f"Streaming CSV/TSV file: {file_path} in chunks of {chunk_size} rows, split by labels in column: {label_column}")
+    for df in iter_csv_chunks(file_path, input_format, seq_columns + [label_column], seq_columns, chunk_size=chunk_size):
+        if label_transform is not None:
+            df[label_column] = label_transform(df[label_column])
+        groups = df.groupby(label_column, sort=False).indices
+        yield _take_groups(df, seq_columns, groups, [label for label in (groups if labels is None else labels) if label in groups])
+
+def _take_groups(df, seq_columns, groups, labels):
+    # each column is encoded once and the sequences of each label are gathered from it in one copy
+    columns = {seq_column: SequenceBatch.from_sequences(df[seq_column]) for seq_column in seq_columns}
+    return {
+        label: {seq_column: batch.take(groups[label]) for seq_column, batch in columns.items()}
+        for label in labels
+    }
 
 def setup_logger(level=logging.INFO, file=None):
     if file:
@@ -77,9 +579,13 @@ def setup_logger(level=logging.INFO, file=None):
 def write_stats_json(stats, stats_json_file):
 
     stats_dict = {}
-    for key, value in stats.items():
-        if isinstance(value, pd.DataFrame):
+    for key in stats:
+        # compact tables are exported directly from their counts or sketches
+        value = stats.raw(key) if isinstance(stats, LazyStatistics) else stats[key]
+        if isinstance(value, (pd.DataFrame, CountTable, SketchTable)):
             stats_dict[key] = value.to_dict(orient='list')
+        elif key == 'K-mer spectrum':
+            stats_dict[key] = {str(k): spectrum.to_dict() for k, spectrum in value.items()}
         else:
             stats_dict[key] = value
 
@@ -87,14 +593,26 @@ def write_stats_json(stats, stats_json_file):
         json.dump(stats_dict, file, indent=4)
 
 def read_files_to_sequence_list(files, input_format, sequence_column):
+    """
+    Read the sequences of all files, with sequences of multiple columns concatenated.
+    @return: A SequenceBatch of the sequences of all files, in the order of the files.
+    """
     sequences = []
     for file in files:
-        if input_format == 'fasta':
-            sequences += read_fasta(file)
-        elif input_format.startswith('csv') or input_format.startswith('tsv'):
+        if is_sequence_file(file, input_format):
+            sequences.append(read_sequence_file(file, input_format))
+        elif input_format == PACKED_FORMAT:
+            # packed columns are decoded straight into batches
+            packed = PackedSequences(file)
+            missing = [column for column in sequence_column if column not in packed.sequence_columns]
+            if missing:
+                logging.error(f"Columns {missing} not found in {file}.")
+                raise ValueError(f"Columns {missing} not found in {file}.")
+            sequences.append(concatenate_sequences([packed.batch(column) for column in sequence_column]))
+        elif input_format.startswith('csv') or input_format.startswith('tsv') or input_format in COLUMNAR_FORMATS:
             df = read_csv_file(file, input_format, sequence_column)
-            sequences += read_multisequence_df(df, sequence_column)
+            sequences.append(read_multisequence_df(df, sequence_column))
         else:
             logging.error(f"Unsupported input format: {input_format}")
             raise ValueError(f"Unsupported input format: {input_format}")
-    return sequences
+    return SequenceBatch.concatenate(sequences)
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import jensenshannon
+
+from genbenchQC.utils.encoding import count_kmers, decode_kmers
+
+# longest k-mers whose counts are kept in a dense array of 4^k counts, longer ones are kept sparse
+MAX_DENSE_K = 6
+# longest supported k-mers, their hashes have to fit into uint32
+MAX_K = 12
+
+class KmerSpectrum:
+    """
+    Counts of all k-mers of length k over the ACGT alphabet, see count_kmers.
+
+    For k up to MAX_DENSE_K the counts are kept in a dense array indexed by the 2-bit hash of the k-mer.
+    For longer k-mers only the present k-mers are kept, as sorted hashes with their counts,
+    so memory grows with the number of distinct k-mers instead of with 4^k.
+    Spectra with the same k are merged by adding their counts.
+    """
+
+    def __init__(self, k):
+        if not 1 <= k <= MAX_K:
+            raise ValueError(f"K-mer size must be between 1 and {MAX_K}, got {k}.")
+        self.k = k
+        self.dense = k <= MAX_DENSE_K
+        # hashes of the present k-mers in increasing order, unused for dense spectra
+        self.kmers = np.zeros(0, dtype=np.uint32)
+        self.counts = np.zeros(4 ** k if self.dense else 0, dtype=np.int64)
+
+    @property
+    def n_kmers(self):
+        """
+        Total number of counted k-mers.
+        """
+        return int(self.counts.sum())
+
+    def update_encoded(self, buffer, offsets):
+        """
+        Add the k-mers of a chunk of encoded sequences, see encode_sequences.
+        """
+        self._add(*count_kmers(buffer, offsets, self.k))
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge spectra of {self.k}-mers and {other.k}-mers.")
+        self._add(*other.sparse())
+        return self
+
+    def _add(self, kmers, counts):
+        if self.dense:
+            np.add.at(self.counts, kmers, counts)
+            return
+        self.kmers, inverse = np.unique(np.concatenate([self.kmers, kmers]), return_inverse=True)
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]),
+                                  minlength=len(self.kmers)).astype(np.int64)
+
+    def sparse(self):
+        """
+        @return: A tuple (kmers, counts) of the hashes of the present k-mers in increasing order and their counts.
+        """
+        if not self.dense:
+            return self.kmers, self.counts
+        kmers = np.flatnonzero(self.counts).astype(np.uint32)
+        return kmers, self.counts[kmers]
+
+    def frequencies(self):
+        """
+        @return: A pd.Series of the frequencies of the present k-mers, indexed by the k-mers.
+        """
+        kmers, counts = self.sparse()
+        total = counts.sum()
+        return pd.Series(counts / total if total else counts.astype(np.float64), index=decode_kmers(kmers, self.k))
+
+    def to_dict(self):
+        """
+        Summary of the spectrum for the JSON report.
+        """
+        kmers, counts = self.sparse()
+        return {
+            'Number of k-mers': self.n_kmers,
+            'Number of distinct k-mers': len(kmers),
+            'Counts': dict(zip(decode_kmers(kmers, self.k), counts.tolist())),
+        }
+
+    def to_arrays(self, prefix):
+        """
+        Export the spectrum as a dictionary of numpy arrays, keyed by prefix and the name of the array.
+        """
+        kmers, counts = self.sparse()
+        return {f'{prefix}_kmers': kmers, f'{prefix}_counts': counts}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix, k):
+        """
+        Restore a spectrum from the arrays created by to_arrays.
+        """
+        spectrum = cls(k)
+        spectrum._add(arrays[f'{prefix}_kmers'], arrays[f'{prefix}_counts'])
+        return spectrum
+
+def _aligned_counts(spectrum1, spectrum2):
+    """
+    Counts of both spectra over the union of their present k-mers.
+    @return: A tuple (kmers, counts1, counts2).
+    """
+    kmers1, counts1 = spectrum1.sparse()
+    kmers2, counts2 = spectrum2.sparse()
+    kmers = np.union1d(kmers1, kmers2)
+    aligned1 = np.zeros(len(kmers), dtype=np.int64)
+    aligned2 = np.zeros(len(kmers), dtype=np.int64)
+    aligned1[np.searchsorted(kmers, kmers1)] = counts1
+    aligned2[np.searchsorted(kmers, kmers2)] = counts2
+    return kmers, aligned1, aligned2
+
+def jensen_shannon_divergence(spectrum1, spectrum2):
+    """
+    Jensen-Shannon divergence in bits between the k-mer frequencies of two spectra,
+    between 0 (same frequencies) and 1 (no shared k-mers).
+    """
+    _, counts1, counts2 = _aligned_counts(spectrum1, spectrum2)
+    if counts1.sum() == 0 or counts2.sum() == 0:
+        return np.nan
+    # scipy returns the distance, the square root of the divergence
+    return float(jensenshannon(counts1, counts2, base=2) ** 2)
+
+def differential_kmers(spectrum1, spectrum2, n=10):
+    """
+    K-mers whose frequencies differ the most between two spectra.
+    @param n: Number of k-mers to return.
+    @return: A dictionary {kmer: log2 ratio of the frequencies in spectrum1 and spectrum2}, sorted by the absolute ratio.
+             A pseudocount of 0.5 is added to all counts, so k-mers missing in one spectrum get a finite ratio.
+    """
+    kmers, counts1, counts2 = _aligned_counts(spectrum1, spectrum2)
+    if len(kmers) == 0:
+        return {}
+    frequencies1 = (counts1 + 0.5) / (counts1.sum() + 0.5 * len(kmers))
+    frequencies2 = (counts2 + 0.5) / (counts2.sum() + 0.5 * len(kmers))
+    ratios = np.log2(frequencies1 / frequencies2)
+    top = np.argsort(-np.abs(ratios), kind='stable')[:n]
+    return dict(zip(decode_kmers(kmers[top], spectrum1.k), ratios[top].tolist()))
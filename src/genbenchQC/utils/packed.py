@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import numpy as np
+import pandas as pd
+
+from genbenchQC.utils.encoding import encode_sequences, BASE_CODES, SequenceBatch
+
+PACKED_MAGIC = b'GBQCPACK'
+PACKED_VERSION = 1
+# arrays are aligned in the file, so they can be memory-mapped with any dtype
+_ALIGNMENT = 64
+# the four bases of each packed byte as one uint32, so a packed buffer is decoded with a single lookup
+_BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+_DECODE = _BASES[(np.arange(256, dtype=np.uint8)[:, None] >> np.array([6, 4, 2, 0], dtype=np.uint8)) & 3].copy().view(np.uint32).ravel()
+
+class PackedSequences:
+    """
+    Sequences stored by write_packed, memory-mapped from the file.
+
+    Each sequence column is kept as 2-bit codes of A, C, G and T packed four bases per byte, the offsets of the sequences
+    in the concatenated bases, and a list of exceptions: positions and bytes of the bases other than ACGT (N, IUPAC codes).
+    Labels are kept as integer codes of the distinct labels, with -1 for missing labels.
+    Opening the file only maps it, sequences are decoded when they are requested.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            if file.read(len(PACKED_MAGIC)) != PACKED_MAGIC:
+                logging.error(f"Not a packed sequence file: {path}")
+                raise ValueError(f"Not a packed sequence file: {path}")
+            file.seek(-len(PACKED_MAGIC) - 8, os.SEEK_END)
+            manifest_size, = struct.unpack('<Q', file.read(8))
+            file.seek(-len(PACKED_MAGIC) - 8 - manifest_size, os.SEEK_END)
+            self.manifest = json.loads(file.read(manifest_size))
+        if self.manifest['version'] > PACKED_VERSION:
+            raise ValueError(f"Packed sequence file {path} has version {self.manifest['version']}, "
+                             f"this version of genbenchQC reads versions up to {PACKED_VERSION}.")
+        self.n_sequences = self.manifest['n_sequences']
+        self.sequence_columns = self.manifest['sequence_columns']
+        self.label_column = self.manifest['label_column']
+        # format of the packed input, files packed from FASTA/FASTQ are read like the files they were packed from
+        self.source_format = self.manifest.get('source_format')
+        self.arrays = {name: self._map(description) for name, description in self.manifest['arrays'].items()}
+
+    def _map(self, description):
+        if description['length'] == 0:
+            return np.zeros(0, dtype=description['dtype'])
+        return np.memmap(self.path, dtype=description['dtype'], mode='r', offset=description['offset'], shape=(description['length'],))
+
+    @property
+    def columns(self):
+        return self.sequence_columns + ([self.label_column] if self.label_column is not None else [])
+
+    def encoded(self, column, start=0, stop=None):
+        """
+        Decode the sequences of rows start to stop of a sequence column.
+        @return: A tuple (buffer, offsets) of uppercase sequences, see encode_sequences.
+        """
+        stop = self.n_sequences if stop is None else stop
+        prefix = f'column_{self.sequence_columns.index(column)}'
+        offsets = np.asarray(self.arrays[f'{prefix}_offsets'][start:stop + 1], dtype=np.int64)
+        first, last = int(offsets[0]), int(offsets[-1])
+        packed = self.arrays[f'{prefix}_bases'][first // 4:(last + 3) // 4]
+        buffer = _DECODE[packed].view(np.uint8)[first % 4:first % 4 + last - first]
+        positions = self.arrays[f'{prefix}_exception_positions']
+        selected = slice(*np.searchsorted(positions, [first, last]))
+        buffer[positions[selected] - first] = self.arrays[f'{prefix}_exception_bases'][selected]
+        return buffer, offsets - first
+
+    def batch(self, column, start=0, stop=None):
+        """
+        Sequences of rows start to stop of a sequence column as a SequenceBatch, without creating a string per sequence.
+        """
+        return SequenceBatch(*self.encoded(column, start, stop))
+
+    def sequences(self, column, start=0, stop=None):
+        """
+        Sequences of rows start to stop of a sequence column.
+        @return: A list of uppercase sequences (str).
+        """
+        return self.batch(column, start, stop).tolist()
+
+    def iter_batches(self, column, chunk_size=100000, shard=None):
+        """
+        Read the sequences of a sequence column in chunks of rows.
+        @param shard: Optional tuple (index, number of shards), see iter_frames.
+        @return: A generator yielding SequenceBatch chunks.
+        """
+        first, last = self._shard_rows(shard)
+        for start in range(first, last, chunk_size):
+            yield self.batch(column, start, min(start + chunk_size, last))
+
+    def _shard_rows(self, shard):
+        if shard is None:
+            return 0, self.n_sequences
+        index, n_shards = shard
+        return (index - 1) * self.n_sequences // n_shards, index * self.n_sequences // n_shards
+
+    def labels(self, start=0, stop=None):
+        """
+        Labels of rows start to stop, as an object array of str, with None for missing labels.
+        """
+        categories = np.array(self.manifest['labels'] + [None], dtype=object)
+        return categories[self.arrays['label_codes'][start:stop]]
+
+    def iter_frames(self, columns, chunk_size=100000, label_filter=None, shard=None):
+        """
+        Read the given columns in chunks of rows, like iter_csv_chunks.
+        @param columns: List of sequence columns and the label column to read.
+        @param chunk_size: Maximal number of rows in one chunk.
+        @param label_filter: Optional tuple (label column, label). Only rows with this label are decoded.
+        @param shard: Optional tuple (index, number of shards). Rows are split into N contiguous ranges,
+                      so concatenating shards 1 to N gives all rows in their original order.
+        @return: A generator yielding DataFrames with the given columns.
+        """
+        missing = [column for column in columns if column not in self.columns]
+        if missing:
+            logging.error(f"Columns {missing} not found in {self.path}.")
+            raise ValueError(f"Columns {missing} not found in {self.path}.")
+        first, last = self._shard_rows(shard)
+        wanted = None
+        if label_filter is not None:
+            label_column, label = label_filter
+            if label_column != self.label_column:
+                raise ValueError(f"Column {label_column} is not the label column of {self.path}.")
+            wanted = self.manifest['labels'].index(label) if label in self.manifest['labels'] else -2
+
+        for start in range(first, last, chunk_size):
+            stop = min(start + chunk_size, last)
+            rows = None
+            if wanted is not None:
+                rows = np.flatnonzero(self.arrays['label_codes'][start:stop] == wanted)
+                if len(rows) == 0:
+                    continue
+            frame = {}
+            for column in columns:
+                values = self.labels(start, stop) if column == self.label_column else self.batch(column, start, stop).to_array()
+                frame[column] = pd.Series(values if rows is None else values[rows], dtype=object)
+            yield pd.DataFrame(frame)
+
+def write_packed(chunks, output_path, sequence_columns, label_column=None, source=None, source_format=None):
+    """
+    Write sequences to a packed sequence file, see PackedSequences.
+    Arrays are written to temporary files chunk by chunk and assembled at the end, so the input is never held in memory.
+    The file is replaced only once it is completely written.
+    @param chunks: An iterable yielding DataFrames with the sequence columns (uppercase) and the label column,
+                   or dictionaries {sequence column: SequenceBatch}.
+    @param output_path: Path to the packed sequence file.
+    @param sequence_columns: List of columns with sequences.
+    @param label_column: Optional name of the label column.
+    @param source: Name of the input the sequences come from, kept in the manifest.
+    @param source_format: Format of the input the sequences come from, kept in the manifest.
+    """
+    output_path = str(output_path)
+    directory = os.path.dirname(os.path.abspath(output_path))
+    columns = [_ColumnWriter(directory) for _ in sequence_columns]
+    label_codes = tempfile.TemporaryFile(dir=directory)
+    labels = {}
+    n_sequences = 0
+    for df in chunks:
+        for writer, column in zip(columns, sequence_columns):
+            writer.update(df[column])
+        if label_column is not None:
+            values = df[label_column]
+            codes = np.array([-1 if pd.isna(value) else labels.setdefault(value, len(labels)) for value in values.tolist()], dtype=np.int32)
+            label_codes.write(codes.tobytes())
+        n_sequences += len(df[sequence_columns[0]])
+
+    arrays = {}
+    for i, writer in enumerate(columns):
+        writer.finish()
+        arrays.update({f'column_{i}_{name}': (file, dtype) for name, (file, dtype) in writer.files.items()})
+    if label_column is not None:
+        arrays['label_codes'] = (label_codes, np.int32)
+
+    manifest = {
+        'version': PACKED_VERSION,
+        'source': source,
+        'source_format': source_format,
+        'n_sequences': n_sequences,
+        'sequence_columns': list(sequence_columns),
+        'label_column': label_column,
+        'labels': list(labels),
+        'n_bases': {column: writer.n_bases for column, writer in zip(sequence_columns, columns)},
+        'arrays': {},
+    }
+    temporary = f'{output_path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as output:
+        output.write(PACKED_MAGIC)
+        for name, (file, dtype) in arrays.items():
+            output.write(b'\0' * (-output.tell() % _ALIGNMENT))
+            size = file.tell()
+            manifest['arrays'][name] = {'dtype': np.dtype(dtype).str, 'offset': output.tell(), 'length': size // np.dtype(dtype).itemsize}
+            file.seek(0)
+            shutil.copyfileobj(file, output, 1 << 24)
+            file.close()
+        encoded = json.dumps(manifest).encode()
+        output.write(encoded + struct.pack('<Q', len(encoded)) + PACKED_MAGIC)
+    os.replace(temporary, output_path)
+    logging.info(f"Packed {n_sequences} sequences into {output_path}")
+
+class _ColumnWriter:
+    """
+    Packs the sequences of one column into temporary files of the arrays of a packed sequence file.
+    """
+
+    def __init__(self, directory):
+        self.files = {
+            'bases': (tempfile.TemporaryFile(dir=directory), np.uint8),
+            'offsets': (tempfile.TemporaryFile(dir=directory), np.int64),
+            'exception_positions': (tempfile.TemporaryFile(dir=directory), np.int64),
+            'exception_bases': (tempfile.TemporaryFile(dir=directory), np.uint8),
+        }
+        self.files['offsets'][0].write(np.zeros(1, dtype=np.int64).tobytes())
+        self.n_bases = 0
+        # codes of the last bases that do not fill a whole byte yet
+        self.pending = np.zeros(0, dtype=np.uint8)
+
+    def update(self, sequences):
+        buffer, offsets = encode_sequences(sequences)
+        codes = BASE_CODES[buffer]
+        exceptions = np.flatnonzero(codes < 0)
+        self._write('offsets', offsets[1:] + self.n_bases)
+        self._write('exception_positions', exceptions + self.n_bases)
+        self._write('exception_bases', buffer[exceptions])
+        # other bases than ACGT are stored as exceptions, their 2-bit codes are overwritten when decoding
+        codes = np.concatenate([self.pending, codes.view(np.uint8) & 3])
+        whole = len(codes) // 4 * 4
+        self._write('bases', _pack(codes[:whole]))
+        self.pending = codes[whole:]
+        self.n_bases += len(buffer)
+
+    def finish(self):
+        if len(self.pending):
+            self._write('bases', _pack(np.concatenate([self.pending, np.zeros(4 - len(self.pending), dtype=np.uint8)])))
+            self.pending = np.zeros(0, dtype=np.uint8)
+
+    def _write(self, name, array):
+        file, dtype = self.files[name]
+        file.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+def _pack(codes):
+    """
+    Pack 2-bit codes, a multiple of four of them, four per byte with the first code in the highest bits.
+    """
+    codes = codes.reshape(-1, 4)
+    return (codes[:, 0] << 6) | (codes[:, 1] << 4) | (codes[:, 2] << 2) | codes[:, 3]
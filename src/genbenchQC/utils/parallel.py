@@ -0,0 +1,188 @@
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+from genbenchQC.utils.accumulator import StatisticsAccumulator
+from genbenchQC.utils.duplicates import DuplicationIndex
+from genbenchQC.utils.encoding import SequenceBatch, encode_sequences, iter_sequence_chunks, CHUNK_BASES
+
+class SharedSequences:
+    """
+    Encoded sequences placed in a shared memory block, so worker processes can read them without pickling.
+    The block holds the int64 offsets followed by the uint8 buffer, see encode_sequences.
+    """
+
+    def __init__(self, buffer, offsets):
+        self.n_sequences = len(offsets) - 1
+        self.n_bases = len(buffer)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, offsets.nbytes + buffer.nbytes))
+        shared_offsets, shared_buffer = _shared_views(self.shm, self.n_sequences, self.n_bases)
+        shared_offsets[:] = offsets
+        shared_buffer[:] = buffer
+        del shared_offsets, shared_buffer
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+def _shared_views(shm, n_sequences, n_bases):
+    offsets = np.ndarray(n_sequences + 1, dtype=np.int64, buffer=shm.buf)
+    buffer = np.ndarray(n_bases, dtype=np.uint8, buffer=shm.buf, offset=offsets.nbytes)
+    return offsets, buffer
+
+def _accumulate_block(name, n_sequences, n_bases, start, end, symbols, max_sequences=None, seed=0, first_index=0,
+                      sketch_distributions=False, kmer_sizes=None, statistics=None, hash_duplicates=False):
+    """
+    Worker task: accumulate statistics of sequences start..end-1 from a shared memory block.
+    first_index is the index of the first sequence of the shared block in the whole input, for sampling.
+    With hash_duplicates, the sequences are also hashed for the duplication levels, see DuplicationIndex.digests.
+    @return: A tuple (StatisticsAccumulator, digests or None).
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        offsets, buffer = _shared_views(shm, n_sequences, n_bases)
+        accumulator = StatisticsAccumulator(symbols, max_sequences=max_sequences, seed=seed, first_index=first_index + start,
+                                            sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics)
+        block = SequenceBatch(buffer, offsets[start:end + 1])
+        accumulator.update_encoded(*block.encoded())
+        digests = DuplicationIndex.digests(block) if hash_duplicates else None
+        del offsets, buffer, block
+        return accumulator, digests
+    finally:
+        shm.close()
+
+def _split_blocks(offsets, n_blocks):
+    """
+    Split sequences into at most n_blocks contiguous blocks with roughly the same number of bases.
+    @return: Array of sequence indices where the blocks start, ending with the number of sequences.
+    """
+    targets = np.linspace(0, offsets[-1], n_blocks + 1)
+    bounds = np.searchsorted(offsets, targets)
+    bounds[0], bounds[-1] = 0, len(offsets) - 1
+    return np.unique(bounds)
+
+class ParallelAccumulator:
+    """
+    Accumulates statistics of chunks of sequences pushed with update() in a pool of worker processes, see accumulate_in_parallel.
+    Several accumulators can share one pool, e.g. when a single pass over an input feeds the statistics of all its labels.
+    """
+
+    def __init__(self, executor, workers, blocks_per_worker=4, duplicates=None, max_sequences=None, seed=0,
+                 sketch_distributions=False, kmer_sizes=None, statistics=None, first_index=0):
+        self.executor = executor
+        self.workers = workers
+        self.blocks_per_worker = blocks_per_worker
+        self.max_sequences = max_sequences
+        self.seed = seed
+        self.sketch_distributions = sketch_distributions
+        self.kmer_sizes = kmer_sizes
+        self.accumulator = StatisticsAccumulator(duplicates=duplicates, max_sequences=max_sequences, seed=seed, first_index=first_index,
+                                                 sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics)
+        # index of the first sequence of the next part, the accumulator counts only collected parts
+        self.first_index = first_index
+        # digests of the exact duplication index are computed by the workers
+        self.hash_duplicates = isinstance(duplicates, DuplicationIndex)
+        self.pending = deque()
+
+    @property
+    def duplicates(self):
+        return self.accumulator.duplicates
+
+    def update(self, chunk):
+        """
+        Encode a chunk, place it into shared memory in parts and submit its blocks to the workers.
+        @param chunk: A list of sequences or a SequenceBatch, whose buffer is copied to shared memory without encoding it again.
+        """
+        accumulator = self.accumulator
+        for part in iter_sequence_chunks(chunk, max_bases=self.workers * self.blocks_per_worker * CHUNK_BASES):
+            buffer, offsets = encode_sequences(part)
+            # fix the order of bases in this process, so all partial results share one alphabet
+            accumulator.add_symbols(buffer)
+            shared = SharedSequences(buffer, offsets)
+            del buffer
+
+            bounds = _split_blocks(offsets, self.workers * self.blocks_per_worker)
+            futures = [
+                self.executor.submit(_accumulate_block, shared.name, shared.n_sequences, shared.n_bases,
+                                     int(start), int(end), list(accumulator.symbols), self.max_sequences, self.seed, self.first_index,
+                                     self.sketch_distributions, self.kmer_sizes, accumulator.statistics, self.hash_duplicates)
+                for start, end in zip(bounds[:-1], bounds[1:])
+            ]
+            self.first_index += shared.n_sequences
+            self.pending.append((part, shared, futures))
+            if accumulator.duplicates is not None and not self.hash_duplicates:
+                accumulator.duplicates.update(part)
+
+            # keep a bounded number of parts in flight so memory stays bounded
+            while len(self.pending) > 1:
+                self._collect()
+
+    def _collect(self):
+        part, shared, futures = self.pending.popleft()
+        try:
+            results = [future.result() for future in futures]
+            for block_accumulator, _ in results:
+                self.accumulator.merge(block_accumulator)
+            if self.hash_duplicates:
+                self.accumulator.duplicates.update(part, digests=np.concatenate([digests for _, digests in results]))
+        finally:
+            shared.release()
+
+    def finish(self):
+        """
+        Wait for the parts still in flight and merge them.
+        @return: The StatisticsAccumulator.
+        """
+        while self.pending:
+            self._collect()
+        return self.accumulator
+
+    def release(self):
+        """
+        Release the shared memory of parts still in flight, e.g. after an error.
+        """
+        for _, shared, _ in self.pending:
+            shared.release()
+        self.pending.clear()
+
+def accumulate_in_parallel(chunks, workers, blocks_per_worker=4, duplicates=None, max_sequences=None, seed=0,
+                           sketch_distributions=False, kmer_sizes=None, statistics=None, first_index=0):
+    """
+    Accumulate statistics of chunks of sequences in a pool of worker processes.
+
+    Each chunk is encoded once and placed into shared memory, in parts of at most CHUNK_BASES bases per block,
+    so all sequences passed as a single chunk are not copied into one large block. Workers compute partial statistics
+    and the digests of the exact duplication index of contiguous blocks of a part, which are merged back in their
+    original order, so the result is the same as from a single StatisticsAccumulator. The approximate duplication
+    sketches are updated in this process while the workers run.
+
+    @param chunks: An iterable yielding lists of sequences or SequenceBatch chunks, whose buffers are copied to shared
+                   memory without encoding them again. All sequences can be passed as a single chunk.
+    @param workers: Number of worker processes.
+    @param blocks_per_worker: Number of blocks each chunk is split into per worker, for better load balancing.
+    @param duplicates: Optional DuplicationIndex to count duplicates in, see StatisticsAccumulator.
+    @param max_sequences: Optional size of the sample for per sequence statistics, see StatisticsAccumulator.
+    @param seed: Seed of the sampling.
+    @param sketch_distributions: If True, per sequence statistics are summarized by sketches, see StatisticsAccumulator.
+    @param kmer_sizes: Optional list of k-mer sizes to count k-mer spectra for, see StatisticsAccumulator.
+    @param statistics: Optional list of the optional statistics to compute, see StatisticsAccumulator.
+    @param first_index: Index of the first sequence in the whole input, for sampling.
+    @return: A StatisticsAccumulator.
+    """
+    logging.debug(f"Computing statistics with {workers} worker processes.")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        accumulator = ParallelAccumulator(executor, workers, blocks_per_worker=blocks_per_worker, duplicates=duplicates,
+                                          max_sequences=max_sequences, seed=seed, sketch_distributions=sketch_distributions,
+                                          kmer_sizes=kmer_sizes, statistics=statistics, first_index=first_index)
+        try:
+            for chunk in chunks:
+                accumulator.update(chunk)
+            return accumulator.finish()
+        finally:
+            accumulator.release()
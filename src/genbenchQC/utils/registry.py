@@ -0,0 +1,65 @@
+import logging
+import re
+
+# statistics computed in every run: file details and counts every other statistic and report builds on
+CORE_STATISTICS = ['Filename', 'Label', 'Sequence column', 'Number of sequences', 'Number of bases', 'Unique bases', '%GC content']
+
+# optional statistics in the order they are reported, with the statistics they depend on.
+# Per position statistics are compared and plotted up to the end position derived from the sequence lengths.
+# Approximation error bounds, Distribution sampling and Distribution sketches describe how the other
+# statistics were computed and are reported together with them.
+STATISTICS = {
+    'Number of sequences left after deduplication': [],
+    'Per sequence nucleotide content': [],
+    'Per sequence dinucleotide content': [],
+    'Per position nucleotide content': ['Sequence lengths'],
+    'Per position reversed nucleotide content': ['Sequence lengths'],
+    'Per sequence GC content': [],
+    'Sequence lengths': [],
+    'Sequence duplication levels': [],
+    'K-mer spectrum': [],
+}
+
+def statistic_slug(name):
+    """
+    Command line name of a statistic, e.g. 'per_position_nucleotide_content' for 'Per position nucleotide content'.
+    """
+    return re.sub('[^a-z0-9]+', '_', name.lower()).strip('_')
+
+STATISTIC_SLUGS = [statistic_slug(name) for name in STATISTICS]
+
+def _statistic_name(name):
+    for statistic in STATISTICS:
+        if name in (statistic, statistic_slug(statistic)):
+            return statistic
+    raise ValueError(f"Unknown statistic: '{name}'. Optional statistics are {STATISTIC_SLUGS}.")
+
+def resolve_statistics(statistics=None, skip_stats=None):
+    """
+    Select the optional statistics to compute.
+    Requested statistics are completed with the statistics they depend on. Skipped statistics are removed
+    together with all statistics depending on them, even if they were requested.
+    @param statistics: Names (or command line names) of the requested statistics. Default: all of them.
+    @param skip_stats: Names (or command line names) of statistics not to compute.
+    @return: List of the statistics to compute, in the order of STATISTICS.
+    """
+    requested = set(STATISTICS) if statistics is None else {_statistic_name(name) for name in statistics}
+    skipped = {_statistic_name(name) for name in skip_stats} if skip_stats else set()
+
+    # add dependencies until nothing changes, the graph is tiny
+    while True:
+        needed = requested | {dependency for name in requested for dependency in STATISTICS[name]}
+        if needed == requested:
+            break
+        requested = needed
+
+    dropped = set(skipped)
+    while True:
+        dependent = dropped | {name for name in requested if set(STATISTICS[name]) & dropped}
+        if dependent == dropped:
+            break
+        dropped = dependent
+    for name in sorted((dropped & requested) - skipped):
+        logging.warning(f"Statistic '{name}' is not computed, it depends on the skipped statistics "
+                        f"{sorted(set(STATISTICS[name]) & dropped)}.")
+    return [name for name in STATISTICS if name in requested - dropped]
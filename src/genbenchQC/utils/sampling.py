@@ -0,0 +1,54 @@
+import numpy as np
+
+from genbenchQC.utils.encoding import SequenceBatch
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+def sampling_keys(indices, seed=0):
+    """
+    Pseudo-random sampling keys of sequences, derived from their indices with the splitmix64 generator.
+    The key of a sequence depends only on its index and the seed, not on how the sequences are split into chunks.
+    @param indices: Array of sequence indices.
+    @param seed: Seed of the sampling.
+    @return: A uint64 array with one key per index.
+    """
+    # mix the seed in Python integers, numpy warns about overflowing scalars
+    offset = np.uint64((seed * int(_MIX2)) % 2 ** 64)
+    z = np.asarray(indices, dtype=np.uint64) * _GOLDEN_GAMMA + offset
+    z = (z ^ (z >> np.uint64(30))) * _MIX1
+    z = (z ^ (z >> np.uint64(27))) * _MIX2
+    return z ^ (z >> np.uint64(31))
+
+def shard_seed(seed, shard):
+    """
+    Seed for sampling one shard of the input, so shards whose sequence indices start from zero get independent keys.
+    @param seed: Seed of the sampling.
+    @param shard: Tuple (index, number of shards).
+    """
+    return int(np.random.SeedSequence([seed, *shard]).generate_state(1, dtype=np.uint64)[0])
+
+def select_sample(keys, max_sequences):
+    """
+    Seeded reservoir sampling: keep the sequences with the max_sequences smallest keys.
+    Keys are independent of the sequences, so this is a uniform sample without replacement, and samples of
+    several parts of the data are merged by selecting from their union again.
+    @param keys: uint64 sampling keys, see sampling_keys.
+    @param max_sequences: Size of the sample.
+    @return: Sorted positions of the selected keys.
+    """
+    if len(keys) <= max_sequences:
+        return np.arange(len(keys))
+    selected = np.argpartition(keys, max_sequences - 1)[:max_sequences]
+    return np.sort(selected)
+
+def sample_sequences(sequences, max_sequences, seed=0):
+    """
+    Select the same sample of a list of sequences as StatisticsAccumulator does for its per sequence statistics.
+    @return: The list of sampled sequences in their original order, or a SequenceBatch of them for a SequenceBatch.
+    """
+    selected = select_sample(sampling_keys(np.arange(len(sequences)), seed), max_sequences)
+    if isinstance(sequences, SequenceBatch):
+        return sequences.take(selected)
+    return [sequences[i] for i in selected]
@@ -0,0 +1,266 @@
+import hashlib
+import heapq
+from collections import Counter
+import numpy as np
+
+def hash64(sequences):
+    """
+    Hash sequences into 64-bit integers.
+    @param sequences: A list of sequences (str).
+    @return: A uint64 array with one hash per sequence.
+    """
+    digests = b''.join(hashlib.blake2b(sequence.encode('ascii'), digest_size=8).digest() for sequence in sequences)
+    return np.frombuffer(digests, dtype=np.uint64)
+
+class HyperLogLog:
+    """
+    HyperLogLog estimate of the number of distinct sequences in fixed memory.
+
+    The sketch keeps 2^precision one-byte registers. The relative standard error of the estimate
+    is 1.04 / sqrt(2^precision), e.g. 0.81% for the default precision of 14 (16 KB of registers).
+    Sketches with the same precision are merged by taking the maximum of their registers.
+    """
+
+    def __init__(self, precision=14):
+        # the remaining hash bits have to fit into the float64 mantissa, see update()
+        if not 11 <= precision <= 18:
+            raise ValueError(f"HyperLogLog precision must be between 11 and 18, got {precision}.")
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def update(self, sequences):
+        """
+        Add a chunk of sequences to the sketch.
+        @param sequences: A list of sequences (str).
+        """
+        if len(sequences) == 0:
+            return
+        hashes = hash64(sequences)
+        width = 64 - self.precision
+        buckets = (hashes >> np.uint64(width)).astype(np.int64)
+        rest = hashes & np.uint64((1 << width) - 1)
+        # position of the leftmost 1-bit in the remaining bits, frexp is exact for values below 2^53
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        ranks = (width - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches with precisions {self.precision} and {other.precision}.")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @property
+    def relative_error(self):
+        """
+        Relative standard error of the estimate.
+        """
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def estimate(self):
+        """
+        @return: Estimated number of distinct sequences.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m ** 2 / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            # linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+class SpaceSaving:
+    """
+    SpaceSaving sketch of the most frequent sequences in fixed memory.
+
+    At most capacity sequences are tracked, each with an estimated count and the maximal overestimate of that count,
+    so its true count lies in [count - error, count]. The overestimate of any count never exceeds
+    n_sequences / capacity. Chunks are counted exactly and merged into the sketch, and sketches merge the same way,
+    following the mergeable summaries of Agarwal et al. (2012).
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.n_sequences = 0
+        # sequence -> [estimated count, maximal overestimate]
+        self.items = {}
+        # whether sequences were ever dropped; otherwise the counts are exact
+        self.truncated = False
+
+    def _floor(self):
+        """
+        Upper bound of the count of any sequence that is not tracked.
+        """
+        if not self.truncated or not self.items:
+            return 0
+        return min(count for count, _ in self.items.values())
+
+    def update(self, sequences):
+        """
+        Add a chunk of sequences to the sketch.
+        @param sequences: A list of sequences (str).
+        """
+        chunk = SpaceSaving(self.capacity)
+        chunk.items = {sequence: [count, 0] for sequence, count in Counter(sequences).items()}
+        chunk.n_sequences = len(sequences)
+        self.merge(chunk)
+
+    def merge(self, other):
+        floor, other_floor = self._floor(), other._floor()
+        merged = {}
+        for sequence in self.items.keys() | other.items.keys():
+            count, error = self.items.get(sequence, (floor, floor))
+            other_count, other_error = other.items.get(sequence, (other_floor, other_floor))
+            merged[sequence] = [count + other_count, error + other_error]
+
+        self.truncated = self.truncated or other.truncated
+        if len(merged) > self.capacity:
+            # keep the sequences with the highest counts, ties broken by the sequence for a deterministic result
+            kept = heapq.nsmallest(self.capacity, merged.items(), key=lambda item: (-item[1][0], item[0]))
+            merged = dict(kept)
+            self.truncated = True
+        self.items = merged
+        self.n_sequences += other.n_sequences
+        return self
+
+    @property
+    def max_error(self):
+        """
+        Maximal overestimate of the reported counts.
+        """
+        return max((error for _, error in self.items.values()), default=0)
+
+    def top(self, min_count=2):
+        """
+        @return: A dictionary {sequence: estimated count} of tracked sequences with an estimated count of at least min_count,
+                 sorted by their counts.
+        """
+        top = [(sequence, count) for sequence, (count, _) in self.items.items() if count >= min_count]
+        top.sort(key=lambda item: (-item[1], item[0]))
+        return dict(top)
+
+class TDigest:
+    """
+    t-digest summary of a distribution of real values in fixed memory (Dunning and Ertl, 2019).
+
+    Values are kept as weighted centroids, small at both tails and larger around the median, whose sizes are
+    bounded by the k1 scale function: at most about compression / 2 centroids are kept. Values are added in batches,
+    each batch is sorted together with the centroids and compressed again, and sketches merge the same way.
+    The minimum and the maximum are kept exactly.
+    """
+
+    def __init__(self, compression=200):
+        self.compression = compression
+        # means and weights of the centroids, sorted by the means
+        self.values = np.zeros(0, dtype=np.float64)
+        self.weights = np.zeros(0, dtype=np.float64)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def n(self):
+        """
+        Number of summarized values.
+        """
+        return float(self.weights.sum())
+
+    def update(self, values, weights=None):
+        """
+        Add a batch of values to the sketch.
+        @param values: Array of values.
+        @param weights: Optional array of weights of the values. Default: one for each value.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress(np.concatenate([self.values, values]), np.concatenate([self.weights, weights]))
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.values, other.values]), np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _compress(self, values, weights):
+        order = np.argsort(values, kind='stable')
+        values, weights = values[order], weights[order]
+        # centroids whose left quantile falls into the same unit interval of the scale function are merged
+        quantiles = np.clip((np.cumsum(weights) - weights) / weights.sum(), 0, 1)
+        scale = self.compression / (2 * np.pi) * np.arcsin(2 * quantiles - 1)
+        buckets = np.floor(scale)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.values = np.add.reduceat(values * weights, starts) / self.weights
+
+    def quantile(self, q):
+        """
+        Estimate quantiles by interpolating between the centroids.
+        @param q: Quantile or array of quantiles between 0 and 1.
+        """
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(np.asarray(q) * self.n, np.r_[0, centers, self.n], np.r_[self.min, self.values, self.max])
+
+class IntegerHistogram:
+    """
+    Exact histogram of integer values, e.g. sequence lengths, with the same interface as TDigest.
+    Memory grows with the number of distinct values, not with the number of values.
+    """
+
+    def __init__(self):
+        # distinct values in increasing order and their counts
+        self.values = np.zeros(0, dtype=np.int64)
+        self.weights = np.zeros(0, dtype=np.int64)
+
+    @property
+    def n(self):
+        return int(self.weights.sum())
+
+    @property
+    def min(self):
+        return int(self.values[0]) if len(self.values) else np.inf
+
+    @property
+    def max(self):
+        return int(self.values[-1]) if len(self.values) else -np.inf
+
+    def update(self, values, weights=None):
+        """
+        Add a batch of values to the histogram.
+        @param values: Array of integer values.
+        @param weights: Optional array of integer weights of the values. Default: one for each value.
+        """
+        values = np.asarray(values).astype(np.int64)
+        if len(values) == 0:
+            return
+        weights = np.ones(len(values), dtype=np.int64) if weights is None else np.asarray(weights).astype(np.int64)
+        self._add(values, weights)
+
+    def merge(self, other):
+        self._add(other.values, other.weights)
+        return self
+
+    def _add(self, values, weights):
+        self.values, inverse = np.unique(np.concatenate([self.values, values]), return_inverse=True)
+        self.weights = np.bincount(inverse, weights=np.concatenate([self.weights, weights]),
+                                   minlength=len(self.values)).astype(np.int64)
+
+    def quantile(self, q):
+        """
+        Quantiles with linear interpolation between values, the same as np.percentile(values, q * 100).
+        @param q: Quantile or array of quantiles between 0 and 1.
+        """
+        position = np.asarray(q, dtype=np.float64) * (self.n - 1)
+        # quantiles like i / (n - 1) miss their integer position by a rounding error
+        nearest = np.round(position)
+        position = np.where(np.abs(position - nearest) <= 1e-9 * max(self.n, 1), nearest, position)
+        lower = np.floor(position)
+        cumulative = np.cumsum(self.weights)
+        below = self.values[np.searchsorted(cumulative, lower, side='right')]
+        above = self.values[np.searchsorted(cumulative, np.minimum(lower + 1, self.n - 1), side='right')]
+        return below + (position - lower) * (above - below)
@@ -0,0 +1,45 @@
+import logging
+import re
+from pathlib import Path
+import numpy as np
+
+def snapshot_path(snapshot_dir, seq_stats):
+    """
+    Path to the snapshot of statistics in the snapshot folder. Snapshots are named by the label and the sequence column,
+    so new records of a group can come from a different file than the records in the snapshot.
+    """
+    parts = [str(part) for part in (seq_stats.label, seq_stats.seq_column) if part is not None]
+    name = re.sub('[^A-Za-z0-9._-]+', '_', '_'.join(parts)) if parts else 'sequences'
+    return Path(snapshot_dir) / f'{name}.npz'
+
+def snapshot_first_index(snapshot_dir, seq_stats):
+    """
+    Index the new records of a group continue from, e.g. to accumulate them before update_snapshot() is called.
+    Only the number of sequences is read from the snapshot.
+    @return: The number of sequences in the snapshot of the group, 0 if it has no snapshot yet.
+    """
+    path = snapshot_path(snapshot_dir, seq_stats)
+    if not path.exists():
+        return 0
+    with np.load(path, allow_pickle=False) as arrays:
+        return int(arrays['n_sequences'])
+
+def update_snapshots(input_statistics, snapshot_dir):
+    """
+    Update the snapshots of statistics with new records, or create them for groups without a snapshot yet.
+    The statistics are accumulated, so they can be computed afterwards without reading any previous records.
+    @param input_statistics: List of SequenceStatistics of the new records, not computed yet.
+    @param snapshot_dir: Path to the folder with the snapshots.
+    @return: The list of SequenceStatistics, updated with the snapshots.
+    """
+    Path(snapshot_dir).mkdir(parents=True, exist_ok=True)
+    for seq_stats in input_statistics:
+        path = snapshot_path(snapshot_dir, seq_stats)
+        # keep the text of all distinct sequences, so duplicates with records added later can be reported
+        seq_stats.keep_sequences = True
+        if path.exists():
+            seq_stats.update_snapshot(path)
+        else:
+            logging.info(f"No snapshot found at {path}, creating it.")
+        seq_stats.save_snapshot(path)
+    return input_statistics
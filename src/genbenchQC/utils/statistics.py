@@ -1,16 +1,301 @@
+import contextlib
 import logging
-from collections import Counter
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 
+from genbenchQC.utils.accumulator import StatisticsAccumulator
+from genbenchQC.utils.encoding import encode_sequences, build_lookup_table, count_per_position, iter_sequence_chunks
+from genbenchQC.utils.parallel import accumulate_in_parallel, ParallelAccumulator
+from genbenchQC.utils.tables import LazyStatistics, SketchTable
+from genbenchQC.utils.duplicates import DuplicationIndex, ApproximateDuplicationIndex
+from genbenchQC.utils.sampling import sample_sequences, shard_seed
+from genbenchQC.utils.kmers import KmerSpectrum, MAX_K
+from genbenchQC.utils.registry import resolve_statistics
+from genbenchQC.utils.concatenation import ConcatenatedColumns, concatenate_sequences
+
+ENGINES = ['python', 'numpy']
+
 class SequenceStatistics:
-    def __init__(self, sequences, filename, label, seq_column=None, end_position=None):
+    def __init__(self, sequences, filename, label, seq_column=None, end_position=None, engine='python', workers=1,
+                 keep_sequences=False, approximate_duplicates=False, max_sequences_for_distributions=None, sampling_seed=0,
+                 sketch_distributions=False, kmer_sizes=None, statistics=None, skip_stats=None, qualities=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unsupported engine: {engine}. Supported engines are {ENGINES}.")
+        if kmer_sizes is not None and any(not 1 <= k <= MAX_K for k in kmer_sizes):
+            raise ValueError(f"Unsupported k-mer sizes: {kmer_sizes}. K-mer sizes must be between 1 and {MAX_K}.")
         self.filename = filename
         self.label = label
         self.seq_column = seq_column
         self.sequences = sequences
         self.end_position = end_position
-        self.stats = {}
+        self.engine = engine
+        self.workers = workers
+        # keep the text of all distinct sequences, not only of duplicates, e.g. for partial statistics merged later
+        self.keep_sequences = keep_sequences
+        # estimate the duplication statistics with fixed size sketches instead of counting them exactly
+        self.approximate_duplicates = approximate_duplicates
+        # compute per sequence statistics from a seeded random sample of at most this many sequences
+        self.max_sequences_for_distributions = max_sequences_for_distributions
+        self.sampling_seed = sampling_seed
+        # summarize per sequence statistics by fixed-size sketches of their distributions, implies the numpy engine
+        self.sketch_distributions = sketch_distributions
+        # count the k-mer spectrum of the sequences for each of these k-mer sizes
+        self.kmer_sizes = sorted(set(kmer_sizes)) if kmer_sizes else None
+        # optional statistics to compute: the requested ones (default: all) with their dependencies, without the skipped ones
+        self.statistics = resolve_statistics(statistics, skip_stats)
+        # QualityProfile of the reads of a FASTQ file, filled by the reader of the sequences
+        self.qualities = qualities
+        self.shared_with = []
+        self.chunks = None
+        # sequence columns and their statistics to derive the statistics of the concatenated columns from, see from_columns()
+        self.columns = None
+        self.column_statistics = None
+        self.accumulator = None
+        self.duplicates = None
+        self.stats = LazyStatistics()
+
+    @classmethod
+    def from_chunks(cls, chunks, filename, label, seq_column=None, end_position=None, engine='numpy', workers=1,
+                    keep_sequences=False, approximate_duplicates=False, max_sequences_for_distributions=None, sampling_seed=0,
+                    sketch_distributions=False, kmer_sizes=None, statistics=None, skip_stats=None, qualities=None):
+        """
+        Create statistics computed in streaming mode from an iterable of sequence chunks.
+        The sequences are never held in memory all at once; each chunk is added to a StatisticsAccumulator
+        and discarded. Streaming always uses the numpy engine.
+        @param chunks: An iterable yielding lists of sequences or SequenceBatch chunks, e.g. from iter_fasta or iter_csv_file.
+        @param qualities: Optional QualityProfile filled while the chunks are read, e.g. by iter_fastq.
+        """
+        if engine != 'numpy':
+            logging.debug(f"Streaming mode always uses the numpy engine, ignoring engine '{engine}'.")
+        seq_stats = cls(None, filename, label, seq_column=seq_column, end_position=end_position, engine='numpy',
+                        workers=workers, keep_sequences=keep_sequences, approximate_duplicates=approximate_duplicates,
+                        max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                        sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics,
+                        skip_stats=skip_stats, qualities=qualities)
+        seq_stats.chunks = chunks
+        return seq_stats
+
+    @classmethod
+    def from_columns(cls, column_statistics, columns, filename, label, seq_column=None, end_position=None, engine='python', workers=1,
+                     keep_sequences=False, approximate_duplicates=False, max_sequences_for_distributions=None, sampling_seed=0,
+                     sketch_distributions=False, kmer_sizes=None, statistics=None, skip_stats=None):
+        """
+        Create statistics of sequences concatenated row by row from several sequence columns.
+        With the numpy engine, the statistics are derived from the accumulated statistics of the columns when they
+        are accumulated, see StatisticsAccumulator.from_columns, so the concatenated sequences are not counted again.
+        With the python engine or sketched distributions, the sequences of the columns are concatenated.
+        @param column_statistics: List of SequenceStatistics of each column, of the same rows and with the same options.
+        @param columns: List of lists of sequences (or SequenceBatch), one per column.
+        """
+        seq_stats = cls(None, filename, label, seq_column=seq_column, end_position=end_position, engine=engine,
+                        workers=workers, keep_sequences=keep_sequences, approximate_duplicates=approximate_duplicates,
+                        max_sequences_for_distributions=max_sequences_for_distributions, sampling_seed=sampling_seed,
+                        sketch_distributions=sketch_distributions, kmer_sizes=kmer_sizes, statistics=statistics,
+                        skip_stats=skip_stats)
+        if (engine == 'python' and workers == 1) or sketch_distributions:
+            seq_stats.sequences = concatenate_sequences(columns)
+        else:
+            seq_stats.columns = columns
+            seq_stats.column_statistics = column_statistics
+        return seq_stats
+
+    def _derives_from_columns(self, shard, first_index):
+        """
+        Whether the statistics of the concatenated columns can be derived from the statistics of the columns.
+        """
+        if shard is not None or first_index != 0:
+            return False
+        for column in self.column_statistics:
+            if column.sequences is None and column.chunks is None and column.accumulator is None:
+                return False
+            for option in ['statistics', 'kmer_sizes', 'max_sequences_for_distributions', 'sampling_seed', 'sketch_distributions']:
+                if getattr(column, option) != getattr(self, option):
+                    return False
+        return True
+
+    def track_shared_sequences(self, others):
+        """
+        Keep the text of sequences that also occur in other, already computed statistics,
+        so duplicates between datasets can be reported after the sequences are released. Call before compute().
+        @param others: List of computed SequenceStatistics.
+        """
+        self.shared_with = [other.duplicates for other in others if other.duplicates is not None]
+
+    def _new_duplication_index(self):
+        if 'Number of sequences left after deduplication' not in self.statistics and 'Sequence duplication levels' not in self.statistics:
+            return None
+        if self.approximate_duplicates:
+            return ApproximateDuplicationIndex()
+        return DuplicationIndex(keep_sequences=self.keep_sequences, shared_with=self.shared_with)
+
+    def accumulate(self, shard=None, first_index=0):
+        """
+        Feed the sequences (or chunks in streaming mode) to a StatisticsAccumulator without computing the final statistics.
+        Accumulated statistics can be merged with merge() or saved with save_partial().
+        @param shard: Optional tuple (index, number of shards) the sequences belong to. Sequence indices restart in every shard,
+                      so each shard samples sequences for per sequence statistics with its own seed.
+        @param first_index: Index of our first sequence when our sequences continue an earlier input, see update_snapshot().
+        @return: The StatisticsAccumulator.
+        """
+        if self.accumulator is not None:
+            return self.accumulator
+        if self.columns is not None:
+            accumulators = None
+            if self._derives_from_columns(shard, first_index):
+                accumulators = [column.accumulate() for column in self.column_statistics]
+            # columns updated from snapshots hold more sequences than the rows given here
+            if accumulators is not None and all(accumulator.n_sequences == len(self.columns[0]) for accumulator in accumulators):
+                logging.debug(f"Deriving statistics of {self.seq_column} from the statistics of its columns.")
+                self.accumulator = StatisticsAccumulator.from_columns(accumulators, ConcatenatedColumns(self.columns),
+                                                                      duplicates=self._new_duplication_index())
+                self.duplicates = self.accumulator.duplicates
+                self.columns = None
+                self.column_statistics = None
+                return self.accumulator
+            self.sequences = concatenate_sequences(self.columns)
+            self.columns = None
+            self.column_statistics = None
+        if self.sequences is None and self.chunks is None:
+            raise ValueError(f"Sequences of {self.filename} were already released after computing the statistics.")
+
+        seed = self.sampling_seed if shard is None else shard_seed(self.sampling_seed, shard)
+        if self.workers > 1:
+            chunks = [self.sequences] if self.sequences is not None else self.chunks
+            accumulator = accumulate_in_parallel(chunks, self.workers, duplicates=self._new_duplication_index(),
+                                                 max_sequences=self.max_sequences_for_distributions, seed=seed,
+                                                 sketch_distributions=self.sketch_distributions,
+                                                 kmer_sizes=self.kmer_sizes, statistics=self.statistics,
+                                                 first_index=first_index)
+        else:
+            accumulator = self._new_accumulator(seed, first_index)
+            if self.sequences is not None:
+                accumulator.update(self.sequences)
+            else:
+                for chunk in self.chunks:
+                    accumulator.update(chunk)
+                logging.debug(f"Streamed {accumulator.n_sequences} sequences.")
+        return self._set_accumulator(accumulator)
+
+    def _new_accumulator(self, seed, first_index, executor=None):
+        """
+        @param executor: Optional pool of worker processes, the accumulator is then a ParallelAccumulator using it.
+        """
+        options = dict(duplicates=self._new_duplication_index(), max_sequences=self.max_sequences_for_distributions, seed=seed,
+                       first_index=first_index, sketch_distributions=self.sketch_distributions,
+                       kmer_sizes=self.kmer_sizes, statistics=self.statistics)
+        if executor is not None:
+            return ParallelAccumulator(executor, self.workers, **options)
+        return StatisticsAccumulator(**options)
+
+    def _set_accumulator(self, accumulator):
+        # the reader filled the quality profile while the sequences were accumulated
+        accumulator.qualities = self.qualities
+        # the accumulated state holds everything needed, release the sequences
+        self.accumulator = accumulator
+        self.duplicates = accumulator.duplicates
+        self.sequences = None
+        self.chunks = None
+        return accumulator
+
+    def merge(self, other):
+        """
+        Merge the statistics of another SequenceStatistics into this one, as if its sequences were appended to ours.
+        All statistics are merged: the counts, the per sequence and per position tables and the duplication levels.
+        The merged statistics are available after calling compute().
+        @param other: A SequenceStatistics, e.g. loaded from a partial statistics file with load_partial().
+        @return: self
+        """
+        self.accumulate().merge(other.accumulate())
+        self.engine = 'numpy'
+        self.stats = LazyStatistics()
+        return self
+
+    def save_partial(self, path, shard=None, compressed=True):
+        """
+        Save the accumulated (not finalized) statistics to a partial statistics file in numpy .npz format.
+        @param path: Path to the output file, or a file object.
+        @param shard: Optional tuple (index, number of shards) the statistics were computed for.
+        @param compressed: If False, the arrays are saved uncompressed, which is faster to save and load.
+        """
+        metadata = {
+            'filename': self.filename,
+            'label': self.label,
+            'seq_column': self.seq_column,
+            'shard': list(shard) if shard is not None else None,
+            'sampling_seed': self.sampling_seed,
+        }
+        logging.info(f"Saving partial statistics: {getattr(path, 'name', path)}")
+        save = np.savez_compressed if compressed else np.savez
+        save(path, metadata=np.array(json.dumps(metadata)), **self.accumulate(shard).to_arrays())
+
+    def save_snapshot(self, path):
+        """
+        Save the accumulated statistics as a snapshot, a partial statistics file that can be updated with new sequences later,
+        see update_snapshot(). An existing snapshot at the path is replaced only once the new one is completely written.
+        @param path: Path to the snapshot.
+        """
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            self.save_partial(f)
+        os.replace(temporary, path)
+
+    def update_snapshot(self, path):
+        """
+        Add our sequences to the statistics saved in a snapshot, as if they were appended to the input of the snapshot.
+        Only our sequences are read; all statistics, including the per position counts, distributions and duplication
+        levels, are updated from the accumulated state of the snapshot. Our sequence indices continue after those
+        of the snapshot, so the sampled sequences and the order of duplicates are the same as when computing
+        the statistics of the whole input at once.
+        Call before compute(). Filename, label and sequence column of the snapshot are kept.
+        @param path: Path to a snapshot written by save_snapshot(), computed with the same options.
+        @return: self
+        """
+        snapshot, shard = self.load_partial(path, end_position=self.end_position)
+        if shard is not None:
+            raise ValueError(f"Snapshot {path} holds statistics of shard {shard[0]}/{shard[1]}, merge the shards with merge_statistics instead.")
+        options = ['statistics', 'kmer_sizes', 'max_sequences_for_distributions', 'sampling_seed', 'sketch_distributions']
+        if snapshot.duplicates is not None:
+            options.append('approximate_duplicates')
+        for option in options:
+            if getattr(snapshot, option) != getattr(self, option):
+                raise ValueError(f"Snapshot {path} was computed with {option} {getattr(snapshot, option)}, "
+                                 f"cannot update it with {getattr(self, option)}.")
+
+        logging.info(f"Updating snapshot {path} of {snapshot.accumulator.n_sequences} sequences with {self.filename}")
+        new = self.accumulate(first_index=snapshot.accumulator.n_sequences)
+        self.accumulator = snapshot.accumulator.merge(new)
+        self.duplicates = self.accumulator.duplicates
+        self.filename = snapshot.filename
+        self.engine = 'numpy'
+        return self
+
+    @classmethod
+    def load_partial(cls, path, end_position=None):
+        """
+        Load statistics saved with save_partial().
+        @param path: Path to the partial statistics file.
+        @param end_position: End position to use when computing the statistics.
+        @return: A tuple (SequenceStatistics, shard), where shard is (index, number of shards) or None.
+        """
+        logging.debug(f"Loading partial statistics: {path}")
+        with np.load(path, allow_pickle=False) as arrays:
+            metadata = json.loads(str(arrays['metadata']))
+            seq_stats = cls(None, metadata['filename'], metadata['label'], seq_column=metadata['seq_column'],
+                            end_position=end_position, engine='numpy')
+            seq_stats.accumulator = StatisticsAccumulator.from_arrays(arrays)
+            seq_stats.duplicates = seq_stats.accumulator.duplicates
+            seq_stats.approximate_duplicates = isinstance(seq_stats.duplicates, ApproximateDuplicationIndex)
+            seq_stats.max_sequences_for_distributions = seq_stats.accumulator.max_sequences
+            seq_stats.sampling_seed = metadata.get('sampling_seed', 0)
+            seq_stats.sketch_distributions = seq_stats.accumulator.distributions is not None
+            seq_stats.kmer_sizes = list(seq_stats.accumulator.kmer_spectra) or None
+            seq_stats.statistics = seq_stats.accumulator.statistics
+            seq_stats.qualities = seq_stats.accumulator.qualities
+        shard = tuple(metadata['shard']) if metadata['shard'] is not None else None
+        return seq_stats, shard
 
     def compute(self):
         """
@@ -35,6 +320,17 @@ class SequenceStatistics:
             - Sequence lengths: pd.DataFrame
               (index: sequence_id, columns: Length, values: length of the sequence)
             - Sequence duplication levels: dict {sequence: count}
+            - Per position mean quality: pd.DataFrame, only with a quality profile of FASTQ reads
+              (index: position, columns: Mean quality, values: mean Phred score of the reads at least that long)
+            - Approximation error bounds: dict, only with approximate duplication statistics
+            - K-mer spectrum: dict {k: KmerSpectrum}, only with kmer_sizes
+            - Distribution sampling: dict, only when per sequence statistics were computed from a sample
+              of max_sequences_for_distributions sequences
+            - Distribution sketches: dict, only when per sequence statistics are summarized by sketches
+            Optional statistics (see registry.STATISTICS) are included only if they were requested and not skipped.
+            With the numpy engine, per sequence statistics are kept as compact integer counts
+            (or as fixed-size sketches of their distributions with sketch_distributions)
+            and returned as float64 DataFrames on access, see LazyStatistics.
         """
         message = f"Computing statistics for {self.filename}"
         if self.label is not None:
@@ -43,20 +339,42 @@ class SequenceStatistics:
             message += f", sequence column: {self.seq_column}"
         logging.info(message)
 
-        self._compute_basic_statistics()
-        self._compute_per_sequence_statistics()
-        self._compute_sequence_duplication_levels()
+        if self.engine == 'numpy' or self.sequences is None or self.workers > 1 or self.sketch_distributions:
+            self._compute_accumulated_statistics()
+        else:
+            self.duplicates = self._new_duplication_index()
+            if self.duplicates is not None:
+                self.duplicates.update(self.sequences)
+            self._compute_basic_statistics()
+            self._compute_per_sequence_statistics()
+            self._compute_sequence_duplication_levels()
+            if self.qualities is not None:
+                self.stats['Per position mean quality'] = self.qualities.to_frame()
+            self._compute_kmer_spectrum()
+            self._compute_distribution_sampling()
+            # the duplication index holds the text of duplicated sequences, release the sequences
+            self.sequences = None
 
         self._adjust_end_position()
 
         return self.stats, self.end_position
 
     def _adjust_end_position(self):
+        # the end position is needed only by per position statistics, which depend on the sequence lengths
+        if 'Sequence lengths' not in self.stats:
+            return
+        # sequence lengths summarized by a histogram give the same percentiles without listing every length
+        lengths = self.stats.raw('Sequence lengths')
+        if isinstance(lengths, SketchTable):
+            lengths = lengths.sketches['Sequence lengths']
+            lengths_75th, max_length = lengths.quantile(0.75), lengths.max
+        else:
+            lengths = self.stats['Sequence lengths'].values.flatten()
+            lengths_75th, max_length = np.percentile(lengths, 75), lengths.max()
+
         if self.end_position is None:
 
             # get second end position - where one of the stats contains less then 75% values
-            lengths = self.stats['Sequence lengths'].values.flatten()
-            lengths_75th = np.percentile(lengths, 75)
             # round to nearest integer
             self.end_position = int(np.round(lengths_75th))
 
@@ -66,14 +384,29 @@ class SequenceStatistics:
             )
         else:
             # Ensure end_position is not greater than the maximum sequence length
-            lengths = self.stats['Sequence lengths'].values.flatten()
-            max_length = int(max(lengths))
+            max_length = int(max_length)
             if self.end_position > max_length:
                 logging.warning(f"end_position {self.end_position} is greater than the maximum sequence length {max_length}. Setting end_position to {max_length}.")
                 self.end_position = max_length
 
             logging.info(f"Using end position: {self.end_position} for {self.seq_column} comparison.")
 
+    def _compute_accumulated_statistics(self):
+        """
+        Compute all statistics with a StatisticsAccumulator, either from the chunks in streaming mode
+        or from the whole list of sequences at once.
+        """
+        accumulator = self.accumulate()
+        if accumulator.n_sequences == 0:
+            logging.error(f"No sequences found in {self.filename}.")
+            raise ValueError(f"No sequences found in {self.filename}.")
+
+        self.stats['Filename'] = self.filename
+        self.stats['Label'] = self.label if self.label is not None else 'N/A'
+        self.stats['Sequence column'] = self.seq_column if self.seq_column is not None else 'N/A'
+        self.stats.update(accumulator.finalize())
+        self._compute_distribution_sampling()
+
     def _compute_basic_statistics(self):
         self.stats['Filename'] = self.filename
         self.stats['Label'] = self.label if self.label is not None else 'N/A'
@@ -82,36 +415,52 @@ class SequenceStatistics:
         self.stats['Number of bases'] = sum(len(sequence) for sequence in self.sequences)
         self.stats['Unique bases'] = list(set(''.join(self.sequences)))
         self.stats['%GC content'] = sum(sequence.count('G') + sequence.count('C') for sequence in self.sequences) / sum(len(sequence) for sequence in self.sequences)
-        self.stats['Number of sequences left after deduplication'] = len(set(self.sequences))
+        if 'Number of sequences left after deduplication' in self.statistics:
+            self.stats['Number of sequences left after deduplication'] = len(self.duplicates)
+
+    def _sampled_sequences(self):
+        """
+        Sequences to compute per sequence statistics from: all of them, or the same sample as the numpy engine takes.
+        """
+        if self.max_sequences_for_distributions is None:
+            return self.sequences
+        return sample_sequences(self.sequences, self.max_sequences_for_distributions, self.sampling_seed)
 
     def _compute_per_sequence_statistics(self):
 
         nucleotides = self.stats['Unique bases'] if 'Unique bases' in self.stats else list(set(''.join(self.sequences)))
         dinucleotides = [n1 + n2 for n1 in nucleotides for n2 in nucleotides]
 
+        sequences = self._sampled_sequences()
         nucleotides_per_sequence = {}
         dinucleotides_per_sequence = {}
-        nucleotides_per_position = {}
-        nucleotides_per_position_reversed = {}
-        gc_content_per_sequence = np.zeros(len(self.sequences))
-        lengths_per_sequence = np.zeros(len(self.sequences))
-
-        for id, sequence in enumerate(self.sequences):
-            nucleotides_per_sequence[id] = self._compute_nucleotide_content(sequence, nucleotides)
-            dinucleotides_per_sequence[id] = self._compute_dinucleotide_content(sequence, dinucleotides)
-            self._compute_per_position_nucleotide_content(nucleotides_per_position, sequence)
-            self._compute_per_position_nucleotide_content(nucleotides_per_position_reversed, sequence[::-1])
+        gc_content_per_sequence = np.zeros(len(sequences))
+        lengths_per_sequence = np.zeros(len(sequences))
+
+        compute_nucleotides = 'Per sequence nucleotide content' in self.statistics
+        compute_dinucleotides = 'Per sequence dinucleotide content' in self.statistics
+        for id, sequence in enumerate(sequences):
+            if compute_nucleotides:
+                nucleotides_per_sequence[id] = self._compute_nucleotide_content(sequence, nucleotides)
+            if compute_dinucleotides:
+                dinucleotides_per_sequence[id] = self._compute_dinucleotide_content(sequence, dinucleotides)
             gc_content_per_sequence[id] = (sequence.count('G') + sequence.count('C')) / len(sequence) * 100
             lengths_per_sequence[id] = len(sequence)
 
-        self.stats['Per sequence nucleotide content'] = pd.DataFrame(nucleotides_per_sequence).T
-        self.stats['Per sequence dinucleotide content'] = pd.DataFrame(dinucleotides_per_sequence).T
-        self.stats['Per position nucleotide content']= pd.DataFrame(
-            self._normalize_per_position(nucleotides_per_position, nucleotides)).T
-        self.stats['Per position reversed nucleotide content'] = pd.DataFrame(
-            self._normalize_per_position(nucleotides_per_position_reversed, nucleotides)).T
-        self.stats['Per sequence GC content'] = pd.DataFrame(gc_content_per_sequence, columns=['Per sequence GC content'])
-        self.stats['Sequence lengths'] = pd.DataFrame(lengths_per_sequence, columns=['Sequence lengths'])
+        if compute_nucleotides:
+            self.stats['Per sequence nucleotide content'] = pd.DataFrame(nucleotides_per_sequence).T
+        if compute_dinucleotides:
+            self.stats['Per sequence dinucleotide content'] = pd.DataFrame(dinucleotides_per_sequence).T
+        if 'Per position nucleotide content' in self.statistics or 'Per position reversed nucleotide content' in self.statistics:
+            nucleotides_per_position = self._compute_per_position_nucleotide_content(nucleotides)
+            if 'Per position nucleotide content' in self.statistics:
+                self.stats['Per position nucleotide content'] = self._normalize_per_position(nucleotides_per_position[0], nucleotides)
+            if 'Per position reversed nucleotide content' in self.statistics:
+                self.stats['Per position reversed nucleotide content'] = self._normalize_per_position(nucleotides_per_position[1], nucleotides)
+        if 'Per sequence GC content' in self.statistics:
+            self.stats['Per sequence GC content'] = pd.DataFrame(gc_content_per_sequence, columns=['Per sequence GC content'])
+        if 'Sequence lengths' in self.statistics:
+            self.stats['Sequence lengths'] = pd.DataFrame(lengths_per_sequence, columns=['Sequence lengths'])
 
     def _compute_nucleotide_content(self, sequence, nucleotides):
         return {nucleotide: sequence.count(nucleotide) / len(sequence) for nucleotide in nucleotides}
@@ -126,34 +475,110 @@ class SequenceStatistics:
 
         return dinucleotides_per_sequence
     
-    def _compute_per_position_nucleotide_content(self, nucleotides_per_position, sequence):
-        for i, nucleotide in enumerate(sequence):
-            if i in nucleotides_per_position:
-                nucleotides_per_position[i][nucleotide] = nucleotides_per_position[i].get(nucleotide, 0) + 1
-            else:
-                nucleotides_per_position[i] = {nucleotide: 1}
+    def _compute_per_position_nucleotide_content(self, nucleotides):
+        """
+        Count nucleotides at each position from the start and from the end of the sequences in one pass over the encoded sequences.
+        The sequences are encoded and counted in chunks of bounded size, see iter_sequence_chunks, and the counts of each chunk
+        are added to the table of the longest sequences seen so far.
+        @return: An int64 array of shape (2, max_length, len(nucleotides)), see count_per_position.
+        """
+        lookup = build_lookup_table(nucleotides)
+        counts = np.zeros((2, 0, len(nucleotides)), dtype=np.int64)
+        for chunk in iter_sequence_chunks(self.sequences):
+            buffer, offsets = encode_sequences(chunk)
+            chunk_counts = count_per_position(lookup[buffer], offsets, len(nucleotides))
+            if chunk_counts.shape[1] > counts.shape[1]:
+                counts = np.pad(counts, ((0, 0), (0, chunk_counts.shape[1] - counts.shape[1]), (0, 0)))
+            counts[:, :chunk_counts.shape[1]] += chunk_counts
+        return counts
 
     def _normalize_per_position(self, nucleotides_per_position, nucleotides):
-        for position in nucleotides_per_position:
-            total = sum(nucleotides_per_position[position].values())
-            nucleotides_per_position[position] = {nucleotide: count / total for nucleotide, count in nucleotides_per_position[position].items()}
-            # add zeros for missing nucleotides
-            for nucleotide in nucleotides:
-                if nucleotide not in nucleotides_per_position[position]:
-                    nucleotides_per_position[position][nucleotide] = 0
-        return nucleotides_per_position
+        # every position up to the maximum length is covered by at least one sequence, so no total is zero
+        return pd.DataFrame(nucleotides_per_position / nucleotides_per_position.sum(axis=1, keepdims=True), columns=nucleotides)
     
     def _compute_sequence_duplication_levels(self):
         """
-        Compute the duplication levels for each sequence in the given list of sequences.
-        @param sequences: A list of sequences.
+        Compute the duplication levels for each sequence from the DuplicationIndex of the sequences.
         @return: A dictionary containing the duplication levels for duplicated sequences. Unique sequences are not included.
         """
+        if self.duplicates is None:
+            return
+        if 'Sequence duplication levels' in self.statistics:
+            self.stats['Sequence duplication levels'] = self.duplicates.duplication_levels()
+        if self.approximate_duplicates:
+            self.stats['Approximation error bounds'] = self.duplicates.error_bounds()
+
+    def _compute_kmer_spectrum(self):
+        """
+        Count the k-mers of all sequences for each of the k-mer sizes with a rolling hash over the encoded sequences.
+        """
+        if not self.kmer_sizes or 'K-mer spectrum' not in self.statistics:
+            return
+        buffer, offsets = encode_sequences(self.sequences)
+        spectra = {k: KmerSpectrum(k) for k in self.kmer_sizes}
+        for spectrum in spectra.values():
+            spectrum.update_encoded(buffer, offsets)
+        self.stats['K-mer spectrum'] = spectra
+
+    def _compute_distribution_sampling(self):
+        """
+        Record the sample the per sequence statistics were computed from, if they do not cover all sequences.
+        """
+        sampled = [name for name in ['Per sequence nucleotide content', 'Per sequence dinucleotide content',
+                                     'Per sequence GC content', 'Sequence lengths'] if name in self.stats]
+        if not sampled:
+            return
+        sample_size = len(self.stats.raw(sampled[0]))
+        if sample_size < self.stats['Number of sequences']:
+            self.stats['Distribution sampling'] = {
+                'Sample size': sample_size,
+                'Number of sequences': self.stats['Number of sequences'],
+                'Seed': self.sampling_seed,
+                'Sampled statistics': sampled,
+            }
+
+def accumulate_together(input_statistics, chunks, first_indices=None):
+    """
+    Accumulate several statistics in a single pass over their common input, e.g. the statistics of all labels
+    and sequence columns of one CSV/TSV file, so the input is read only once instead of once per statistics.
+    Statistics of the same sequence column are compared with each other, so their duplication indexes
+    keep the text of the sequences they share, see track_shared_sequences(). With more than one worker,
+    all statistics share one pool of worker processes.
+    @param input_statistics: List of SequenceStatistics not accumulated yet, e.g. created by from_chunks without chunks.
+    @param chunks: An iterable yielding, for each chunk of the input, a list with the sequences of each of the statistics
+                   in that chunk (a list of sequences or a SequenceBatch), or None for statistics without sequences in it.
+    @param first_indices: Optional list with the index of the first sequence of each of the statistics,
+                          e.g. the number of sequences in their snapshots, see update_snapshot().
+    """
+    if not input_statistics:
+        return
+    if first_indices is None:
+        first_indices = [0] * len(input_statistics)
+    workers = max(seq_stats.workers for seq_stats in input_statistics)
+    if workers > 1:
+        logging.debug(f"Computing statistics with {workers} worker processes.")
+
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else contextlib.nullcontext() as executor:
+        accumulators = [seq_stats._new_accumulator(seq_stats.sampling_seed, first_index, executor)
+                        for seq_stats, first_index in zip(input_statistics, first_indices)]
+        for seq_stats, accumulator in zip(input_statistics, accumulators):
+            if isinstance(accumulator.duplicates, DuplicationIndex):
+                accumulator.duplicates.shared_with += [
+                    other.duplicates for other_stats, other in zip(input_statistics, accumulators)
+                    if other is not accumulator and other_stats.seq_column == seq_stats.seq_column and other.duplicates is not None
+                ]
+        try:
+            for chunk in chunks:
+                for accumulator, sequences in zip(accumulators, chunk):
+                    if sequences is not None:
+                        accumulator.update(sequences)
+            results = [accumulator.finish() for accumulator in accumulators] if executor is not None else accumulators
+        finally:
+            if executor is not None:
+                for accumulator in accumulators:
+                    accumulator.release()
 
-        sequence_counts = Counter(self.sequences)
-        # remove sequences that are not duplicated
-        sequence_counts = {sequence: count for sequence, count in sequence_counts.items() if count > 1}
-        # sort the sequences by their counts
-        sequence_counts = dict(sorted(sequence_counts.items(), key=lambda item: item[1], reverse=True))
-        
-        self.stats['Sequence duplication levels'] = sequence_counts
\ No newline at end of file
+    for seq_stats, accumulator in zip(input_statistics, results):
+        seq_stats._set_accumulator(accumulator)
+        logging.debug(f"Streamed {accumulator.n_sequences} sequences for {seq_stats.filename}, label {seq_stats.label}, "
+                      f"sequence column: {seq_stats.seq_column}.")
@@ -0,0 +1,262 @@
+from collections.abc import MutableMapping
+import numpy as np
+import pandas as pd
+
+from genbenchQC.utils.sketches import TDigest, IntegerHistogram
+
+def compact_counts(counts, max_value=None):
+    """
+    Cast non-negative integer counts to the smallest unsigned dtype (uint16, uint32 or uint64) that holds them.
+    @param counts: numpy array of counts.
+    @param max_value: Upper bound of the counts. If not provided, the maximum of the array is used.
+    @return: The counts as a compact array; no copy is made if the dtype already fits.
+    """
+    if max_value is None:
+        max_value = int(counts.max()) if counts.size else 0
+    for dtype in [np.uint16, np.uint32]:
+        if max_value <= np.iinfo(dtype).max:
+            return counts.astype(dtype, copy=False)
+    return counts.astype(np.uint64, copy=False)
+
+class CountTable:
+    """
+    Per sequence statistic stored as compact unsigned integer counts, one row per sequence.
+
+    The values of the statistic are derived on access as counts / totals * scale:
+    - totals is a vector with one denominator per sequence, e.g. sequence lengths,
+    - totals='rows' uses the sum of each row of counts,
+    - totals=None keeps the counts as they are, e.g. for sequence lengths themselves.
+    Several tables can share one totals vector, so the lengths are stored only once.
+    """
+
+    def __init__(self, counts, columns, totals=None, scale=1):
+        self.counts = compact_counts(counts)
+        self.columns = list(columns)
+        self.totals = totals
+        self.scale = scale
+
+    def __len__(self):
+        return self.counts.shape[0]
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by the counts and by a totals vector, which may be shared with other tables.
+        """
+        return self.counts.nbytes + (self.totals.nbytes if isinstance(self.totals, np.ndarray) else 0)
+
+    def values(self, dtype=np.float64):
+        """
+        Derive the values of the statistic.
+        @param dtype: Floating point dtype of the values, e.g. float32 to store them in half the memory. Default: float64,
+                      the same precision as the statistics of the python engine.
+        @return: A 2D numpy array with one row per sequence.
+        """
+        values = self.counts.astype(dtype)
+        if self.totals is None:
+            return values
+        if isinstance(self.totals, str) and self.totals == 'rows':
+            totals = self.counts.sum(axis=1, keepdims=True, dtype=dtype)
+        else:
+            totals = self.totals.astype(dtype)[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values /= totals
+        if self.scale != 1:
+            values *= dtype(self.scale)
+        return values
+
+    def to_frame(self, dtype=np.float64):
+        """
+        @return: The statistic as a DataFrame (index: sequence_id, columns: self.columns).
+        """
+        return pd.DataFrame(self.values(dtype), columns=self.columns, copy=False)
+
+    def to_dict(self, orient='list'):
+        """
+        Same as DataFrame.to_dict.
+        """
+        return self.to_frame().to_dict(orient=orient)
+
+class SketchTable:
+    """
+    Per sequence statistic summarized by one fixed-size sketch per column instead of one row per sequence.
+
+    Columns are summarized by TDigest or IntegerHistogram sketches. Rows with undefined values (NaN), e.g. dinucleotide
+    content of sequences shorter than two bases, are skipped. A column added later starts with zeros for all earlier rows,
+    the same as a base missing from earlier chunks has zero content. to_frame() returns values at evenly spaced quantiles
+    of each column, so plots of the frame show the summarized distributions.
+    """
+
+    # number of quantiles in the DataFrame representation
+    n_points = 1000
+
+    def __init__(self, sketch=TDigest, columns=()):
+        self.sketch = sketch
+        self.sketches = {}
+        self.n_values = 0
+        for column in columns:
+            self._column(column)
+
+    @property
+    def columns(self):
+        return list(self.sketches.keys())
+
+    def __len__(self):
+        return self.n_values
+
+    @property
+    def nbytes(self):
+        return sum(sketch.values.nbytes + sketch.weights.nbytes for sketch in self.sketches.values())
+
+    def _column(self, column):
+        if column not in self.sketches:
+            sketch = self.sketch()
+            if self.n_values:
+                sketch.update([0], [self.n_values])
+            self.sketches[column] = sketch
+        return self.sketches[column]
+
+    def update(self, values, columns):
+        """
+        Add rows of values to the sketches.
+        @param values: A 2D array with one row per sequence.
+        @param columns: Names of the columns of values.
+        """
+        values = values[~np.isnan(values).any(axis=1)]
+        for i, column in enumerate(columns):
+            self._column(column).update(values[:, i])
+        for column in set(self.sketches) - set(columns):
+            self.sketches[column].update([0], [len(values)])
+        self.n_values += len(values)
+
+    def merge(self, other):
+        """
+        Merge the sketches of another table, as if its rows were added after the rows of this one.
+        @return: self
+        """
+        for column in other.columns:
+            self._column(column)
+        for column, sketch in self.sketches.items():
+            if column in other.sketches:
+                sketch.merge(other.sketches[column])
+            elif other.n_values:
+                sketch.update([0], [other.n_values])
+        self.n_values += other.n_values
+        return self
+
+    def reorder(self, columns):
+        """
+        Put the columns into the given order, adding missing columns as zeros.
+        """
+        self.sketches = {column: self._column(column) for column in columns}
+
+    def values(self, dtype=np.float64):
+        """
+        @return: A 2D numpy array with the values at n_points evenly spaced quantiles of each column,
+                 including the minimum and the maximum.
+        """
+        quantiles = np.linspace(0, 1, min(self.n_points, self.n_values))
+        return np.array([sketch.quantile(quantiles) for sketch in self.sketches.values()], dtype=dtype).reshape(
+            len(self.sketches), len(quantiles)).T
+
+    def to_frame(self, dtype=np.float64):
+        """
+        @return: The quantiles of the statistic as a DataFrame (columns: self.columns).
+        """
+        return pd.DataFrame(self.values(dtype), columns=self.columns, copy=False)
+
+    def to_dict(self, orient='list'):
+        """
+        Export the sketches for reports: for each column, the values of the sketch with their weights,
+        the minimum and the maximum. The orient argument is accepted for compatibility with DataFrame.to_dict.
+        """
+        return {
+            column: {
+                'Values': sketch.values.tolist(),
+                'Weights': sketch.weights.tolist(),
+                'Min': sketch.min,
+                'Max': sketch.max,
+            } for column, sketch in self.sketches.items()
+        }
+
+    def describe(self):
+        """
+        @return: Short description of the sketches for reports.
+        """
+        if self.sketch is IntegerHistogram:
+            return 'Exact histogram'
+        return f'{self.sketch.__name__} (compression {self.sketch().compression})'
+
+    def to_arrays(self, prefix):
+        """
+        Export the sketches as a dictionary of numpy arrays with keys starting with prefix.
+        """
+        sketches = list(self.sketches.values())
+        return {
+            f'{prefix}_columns': np.array(self.columns, dtype=str),
+            f'{prefix}_n_values': np.array(self.n_values, dtype=np.int64),
+            f'{prefix}_offsets': np.cumsum([0] + [len(sketch.values) for sketch in sketches]).astype(np.int64),
+            f'{prefix}_values': np.concatenate([sketch.values for sketch in sketches] or [np.zeros(0)]),
+            f'{prefix}_weights': np.concatenate([sketch.weights for sketch in sketches] or [np.zeros(0)]),
+            f'{prefix}_min': np.array([sketch.min for sketch in sketches], dtype=np.float64),
+            f'{prefix}_max': np.array([sketch.max for sketch in sketches], dtype=np.float64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix, sketch=TDigest):
+        """
+        Restore a table from the arrays created by to_arrays.
+        """
+        table = cls(sketch)
+        table.n_values = int(arrays[f'{prefix}_n_values'])
+        offsets = arrays[f'{prefix}_offsets']
+        for i, column in enumerate(arrays[f'{prefix}_columns'].tolist()):
+            restored = sketch()
+            restored.values = arrays[f'{prefix}_values'][offsets[i]:offsets[i + 1]].astype(restored.values.dtype)
+            restored.weights = arrays[f'{prefix}_weights'][offsets[i]:offsets[i + 1]].astype(restored.weights.dtype)
+            if sketch is TDigest:
+                restored.min = float(arrays[f'{prefix}_min'][i])
+                restored.max = float(arrays[f'{prefix}_max'][i])
+            table.sketches[column] = restored
+        return table
+
+class LazyStatistics(MutableMapping):
+    """
+    Dictionary of statistics that keeps CountTable and SketchTable values in their compact form.
+
+    Accessing such a statistic returns a float64 DataFrame built on every access, so the checks compare
+    the same values as with the python engine, the compact form stays the only copy held in memory
+    and consumers can modify the returned DataFrame freely.
+    The frames are deliberately not cached: building one costs a pass over all rows and 8 bytes per value,
+    so consumers access each statistic once and keep the returned DataFrame for as long as they need it,
+    or use raw() when the compact form is enough.
+    Other values are stored and returned as they are.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._data = {}
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if isinstance(value, (CountTable, SketchTable)):
+            return value.to_frame()
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def raw(self, key):
+        """
+        Return the stored value of a statistic without deriving a DataFrame from it.
+        """
+        return self._data[key]
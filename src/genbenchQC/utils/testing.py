@@ -4,49 +4,75 @@ from statsmodels.stats.multitest import fdrcorrection
 from scipy.stats import wasserstein_distance, fisher_exact
 import logging
 
-
-def flag_significant_differences(sequences1, stats1, sequences2, stats2, threshold, end_position=None):
-    results = {
-        'Unique bases': flag_unique_bases(
+from genbenchQC.utils.tables import LazyStatistics, SketchTable
+from genbenchQC.utils.kmers import jensen_shannon_divergence
+
+# statistics each check compares, checks of statistics not computed for both datasets are left out
+CHECK_STATISTICS = {
+    'Unique bases': ['Unique bases'],
+    'Per sequence nucleotide content': ['Per sequence nucleotide content'],
+    'Per sequence dinucleotide content': ['Per sequence dinucleotide content'],
+    'Per position nucleotide content': ['Per position nucleotide content'],
+    'Per position reversed nucleotide content': ['Per position reversed nucleotide content'],
+    'Per sequence GC content': ['Per sequence GC content'],
+    'Sequence lengths': ['Sequence lengths'],
+    'Duplication between labels': ['Sequence duplication levels'],
+    'K-mer spectrum': ['K-mer spectrum'],
+}
+
+def flag_significant_differences(duplicates1, stats1, duplicates2, stats2, threshold, kmer_threshold, end_position=None):
+    checks = {
+        'Unique bases': lambda: flag_unique_bases(
             stats1, stats2
         ),
-        'Per sequence nucleotide content': flag_per_sequence_content(
+        'Per sequence nucleotide content': lambda: flag_per_sequence_content(
             stats1, stats2, 
             column='Per sequence nucleotide content', 
             threshold=threshold
         ),
-        'Per sequence dinucleotide content': flag_per_sequence_content(
+        'Per sequence dinucleotide content': lambda: flag_per_sequence_content(
             stats1, stats2, 
             column='Per sequence dinucleotide content', 
-            threshold=threshold)
-        ,
-        'Per position nucleotide content': flag_per_position_nucleotide_content(
+            threshold=threshold
+        ),
+        'Per position nucleotide content': lambda: flag_per_position_nucleotide_content(
             stats1, stats2, 
             column='Per position nucleotide content', 
             threshold=threshold, 
             end_position=end_position
         ),
-        'Per position reversed nucleotide content': flag_per_position_nucleotide_content(
+        'Per position reversed nucleotide content': lambda: flag_per_position_nucleotide_content(
             stats1, stats2, 
             column='Per position reversed nucleotide content', 
             threshold=threshold, 
             end_position=end_position
         ),
-        'Per sequence GC content': flag_per_sequence_one_stat(
+        'Per sequence GC content': lambda: flag_per_sequence_one_stat(
             stats1, stats2, 
             column='Per sequence GC content', 
             threshold=threshold
         ),
-        'Sequence lengths': flag_per_sequence_one_stat(
+        'Sequence lengths': lambda: flag_per_sequence_one_stat(
             stats1, stats2, 
             column='Sequence lengths',
             threshold=threshold
         ),
-        'Duplication between labels': flag_duplication_between_datasets(
-            sequences1, sequences2
-        )
+        'Duplication between labels': lambda: flag_duplication_between_datasets(
+            duplicates1, duplicates2
+        ),
+        'K-mer spectrum': lambda: flag_kmer_spectrum(
+            stats1, stats2,
+            threshold=kmer_threshold
+        ),
     }
 
+    results = {}
+    for name, check in checks.items():
+        if all(statistic in stats1 and statistic in stats2 for statistic in CHECK_STATISTICS[name]):
+            results[name] = check()
+        else:
+            logging.debug(f"Skipping check '{name}', its statistics were not computed for both datasets.")
+
     return results
 
 def flag_unique_bases(stats1, stats2):
@@ -68,12 +94,11 @@ def flag_per_sequence_content(stats1, stats2, column, threshold):
         if base not in df1 or base not in df2:
             distances[base] = np.inf
         else:
-            distances[base] = wasserstein_distance(df1[base], df2[base])
+            values1, weights1, max1 = _distribution(stats1, column, df1, base)
+            values2, weights2, max2 = _distribution(stats2, column, df2, base)
+            distances[base] = wasserstein_distance(values1, values2, weights1, weights2)
             logging.debug(f"Distance for {base}: {distances[base]} (threshold: {threshold})")
-            max_value = max(
-                max(df1[base]),
-                max(df2[base])
-            )
+            max_value = max(max1, max2)
             if max_value > 0:
                 distances[base] /= max_value
                 logging.debug(f"Max value for {base}: {max_value}")
@@ -118,15 +143,12 @@ def flag_per_position_nucleotide_content(stats1, stats2, column, threshold, end_
     
 def flag_per_sequence_one_stat(stats1, stats2, column, threshold):
 
-    distance = wasserstein_distance(
-        stats1[column].values.flatten(),
-        stats2[column].values.flatten()
-    )
+    values1, weights1, max1 = _distribution(stats1, column)
+    values2, weights2, max2 = _distribution(stats2, column)
+
+    distance = wasserstein_distance(values1, values2, weights1, weights2)
     logging.debug(f"Distance for {column}: {distance} (threshold: {threshold})")
-    max_value = max(
-        max(stats1[column].values.flatten()), 
-        max(stats2[column].values.flatten())
-    )
+    max_value = max(max1, max2)
     if max_value > 0:
         distance /= max_value
         logging.debug(f"Max value for {column}: {max_value}")
@@ -136,8 +158,48 @@ def flag_per_sequence_one_stat(stats1, stats2, column, threshold):
 
     return (distance, passed)
     
-def flag_duplication_between_datasets(sequences1, sequences2):
-    duplicates = list(set(sequences1).intersection(sequences2))
+def _distribution(stats, column, df=None, name=None):
+    """
+    Values of one column of a per sequence statistic with their weights and the maximal value.
+    Statistics summarized by sketches are compared through the weighted points of their sketches.
+    @param df: DataFrame of the statistic, if already materialized.
+    @param name: Name of the column. Default: the only column of the statistic.
+    """
+    table = stats.raw(column) if isinstance(stats, LazyStatistics) else None
+    if isinstance(table, SketchTable):
+        sketch = table.sketches[name if name is not None else table.columns[0]]
+        return sketch.values, sketch.weights, sketch.max
+    if df is None:
+        values = stats[column].values.flatten()
+        return values, None, values.max()
+    return df[name], None, max(df[name])
+
+def flag_kmer_spectrum(stats1, stats2, threshold):
+    """
+    Compare the k-mer spectra of two datasets for every k-mer size counted in both.
+    @param threshold: Jensen-Shannon divergence in bits above which the spectra of one k-mer size are flagged.
+    K-mer sizes without any k-mer in one of the datasets, e.g. with sequences shorter than k, are skipped with a warning.
+    @return: A tuple ({k: Jensen-Shannon divergence of the k-mer frequencies}, passed).
+    """
+    spectra1 = stats1['K-mer spectrum']
+    spectra2 = stats2['K-mer spectrum']
+
+    divergences = {}
+    for k in sorted(set(spectra1) & set(spectra2)):
+        divergence = jensen_shannon_divergence(spectra1[k], spectra2[k])
+        if np.isnan(divergence):
+            logging.warning(f"Not enough data to compare the spectra of {k}-mers: no {k}-mers in one of the datasets. Skipping.")
+            continue
+        divergences[k] = divergence
+        logging.debug(f"Jensen-Shannon divergence of {k}-mers: {divergences[k]} (threshold: {threshold})")
+
+    passed = np.all(np.array(list(divergences.values())) < threshold)
+
+    return (divergences, passed)
+
+def flag_duplication_between_datasets(duplicates1, duplicates2):
+    # duplicates1 and duplicates2 are DuplicationIndex objects of the two datasets
+    duplicates = duplicates1.shared_sequences(duplicates2)
     if len(duplicates) > 0:
         return (duplicates, False)
     else:
@@ -0,0 +1,43 @@
+import random
+import numpy as np
+import pandas as pd
+import pytest
+
+def random_sequences(n, min_length=2, max_length=60, alphabet='ACGT', n_duplicates=0, seed=0):
+    """
+    Random sequences of uniformly distributed lengths, the first n_duplicates of them repeated at the end.
+    """
+    rng = random.Random(seed)
+    sequences = [''.join(rng.choice(alphabet) for _ in range(rng.randint(min_length, max_length))) for _ in range(n)]
+    return sequences + sequences[:n_duplicates]
+
+def chunked(sequences, chunk_size):
+    return [sequences[start:start + chunk_size] for start in range(0, len(sequences), chunk_size)]
+
+def assert_statistics_equal(stats1, stats2, ignore=()):
+    """
+    Assert that two dictionaries of statistics hold the same statistics.
+    Tables are compared column by column regardless of the order of the columns and of their dtype,
+    the bases are compared as sets and k-mer spectra by their counts.
+    """
+    assert set(stats1) == set(stats2)
+    for name in stats1:
+        if name in ignore:
+            continue
+        value1, value2 = stats1[name], stats2[name]
+        if isinstance(value1, pd.DataFrame):
+            assert sorted(value1.columns) == sorted(value2.columns), name
+            columns = sorted(value1.columns)
+            np.testing.assert_allclose(value1[columns].to_numpy(np.float64), value2[columns].to_numpy(np.float64),
+                                       rtol=1e-5, atol=1e-6, err_msg=name)
+        elif name == 'Unique bases':
+            assert sorted(value1) == sorted(value2)
+        elif name == 'K-mer spectrum':
+            assert {k: spectrum.to_dict() for k, spectrum in value1.items()} == {k: spectrum.to_dict() for k, spectrum in value2.items()}
+        elif isinstance(value1, float):
+            assert value1 == pytest.approx(value2, rel=1e-9), name
+        elif isinstance(value1, dict):
+            # duplication levels are ordered by their counts and first occurrences
+            assert list(value1.items()) == list(value2.items()), name
+        else:
+            assert value1 == value2, name
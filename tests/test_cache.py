@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from genbenchQC.utils.cache import StatisticsCache
+from genbenchQC.utils.input_utils import write_fasta, read_fasta
+from genbenchQC.utils.statistics import SequenceStatistics
+from tests.helpers import random_sequences, assert_statistics_equal
+
+@pytest.fixture
+def fasta_file(tmp_path):
+    path = tmp_path / 'sequences.fasta'
+    write_fasta(random_sequences(200, n_duplicates=20), path)
+    return path
+
+def statistics_of(path, **kwargs):
+    return SequenceStatistics(read_fasta(path), path.name, 'label', engine='numpy', **kwargs)
+
+def test_cached_statistics_match_computed_ones(tmp_path, fasta_file):
+    cache = StatisticsCache(tmp_path / 'cache')
+    key = cache.key([fasta_file], statistics_of(fasta_file), format='fasta')
+    first = cache.fetch(key, statistics_of(fasta_file))
+    assert len(cache.entries()) == 1
+    cached = cache.fetch(key, statistics_of(fasta_file))
+    assert cached.accumulator is not None and cached.sequences is None
+    assert_statistics_equal(first.compute()[0], cached.compute()[0])
+
+def test_key_depends_on_content_and_options(tmp_path, fasta_file):
+    cache = StatisticsCache(tmp_path / 'cache')
+    key = cache.key([fasta_file], statistics_of(fasta_file), format='fasta')
+    assert cache.key([fasta_file], statistics_of(fasta_file), format='fasta') == key
+    # options of the comparison and the reports are not part of the key
+    assert cache.key([fasta_file], statistics_of(fasta_file, end_position=10), format='fasta') == key
+    assert cache.key([fasta_file], statistics_of(fasta_file, kmer_sizes=[3]), format='fasta') != key
+    assert cache.key([fasta_file], statistics_of(fasta_file), format='fasta', label_column='y') != key
+    write_fasta(random_sequences(200, seed=1), fasta_file)
+    os.utime(fasta_file, ns=(0, 0))
+    assert cache.key([fasta_file], statistics_of(fasta_file), format='fasta') != key
+
+def test_least_recently_used_entries_are_evicted(tmp_path, fasta_file):
+    cache = StatisticsCache(tmp_path / 'cache')
+    keys = [cache.key([fasta_file], statistics_of(fasta_file, sampling_seed=seed), format='fasta') for seed in range(3)]
+    for i, key in enumerate(keys):
+        cache.store(key, statistics_of(fasta_file))
+        # entries are ordered by their modification times
+        os.utime(cache.path(key), ns=(i * 10 ** 9, i * 10 ** 9))
+    entry_size = cache.path(keys[0]).stat().st_size
+    cache.max_size = 2 * entry_size
+    cache.evict()
+    assert [path.stem for path in cache.entries()] == keys[1:]
+    cache.clear()
+    assert cache.entries() == []
+
+def test_unreadable_entries_are_removed(tmp_path, fasta_file):
+    cache = StatisticsCache(tmp_path / 'cache')
+    cache.path('broken').write_bytes(b'not a npz file')
+    assert cache.load('broken') is None
+    assert not cache.path('broken').exists()
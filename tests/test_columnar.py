@@ -0,0 +1,20 @@
+import pytest
+
+from genbenchQC.utils.columnar import write_stats_columnar, read_stats_columnar
+from genbenchQC.utils.statistics import SequenceStatistics
+from tests.helpers import random_sequences, assert_statistics_equal
+
+@pytest.mark.parametrize('table_format', ['npz', 'parquet'])
+@pytest.mark.parametrize('options', [
+    {'engine': 'python'},
+    {'engine': 'numpy', 'kmer_sizes': [2, 8]},
+    {'engine': 'numpy', 'sketch_distributions': True},
+    {'engine': 'numpy', 'approximate_duplicates': True},
+])
+def test_columnar_reports_round_trip(tmp_path, table_format, options):
+    if table_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    stats, _ = SequenceStatistics(random_sequences(200, alphabet='ACGTN', n_duplicates=20), 'sequences.fasta', 'label',
+                                  **options).compute()
+    write_stats_columnar(stats, tmp_path / 'report', table_format)
+    assert_statistics_equal(stats, read_stats_columnar(tmp_path / 'report'))
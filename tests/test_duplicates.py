@@ -0,0 +1,126 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from genbenchQC.utils.duplicates import DuplicationIndex, ApproximateDuplicationIndex, duplication_index_from_arrays, MIN_SLOTS
+from genbenchQC.utils.encoding import SequenceBatch
+from tests.helpers import random_sequences, chunked
+
+def expected_levels(sequences):
+    """
+    Duplication levels counted from the sequences, ordered by the counts and then by the first occurrences.
+    """
+    counts = Counter(sequences)
+    first = {}
+    for i, sequence in enumerate(sequences):
+        first.setdefault(sequence, i)
+    repeated = sorted((sequence for sequence, count in counts.items() if count > 1), key=lambda s: (-counts[s], first[s]))
+    return {sequence: counts[sequence] for sequence in repeated}
+
+@pytest.fixture
+def sequences():
+    # duplicates spread over the whole list
+    sequences = random_sequences(600, min_length=8, max_length=20, seed=1)
+    return sequences + sequences[::7] + sequences[::50]
+
+def index_of(sequences, chunk_size, **kwargs):
+    index = DuplicationIndex(**kwargs)
+    for chunk in chunked(sequences, chunk_size):
+        index.update(chunk)
+    return index
+
+@pytest.mark.parametrize('chunk_size', [1, 100, 10000])
+def test_levels(sequences, chunk_size):
+    index = index_of(sequences, chunk_size)
+    assert list(index.duplication_levels().items()) == list(expected_levels(sequences).items())
+    assert len(index) == len(set(sequences))
+    assert index.n_sequences == len(sequences)
+
+def test_hash_table_grows():
+    sequences = random_sequences(5000, min_length=10, max_length=12, n_duplicates=100, seed=3)
+    index = index_of(sequences, 700)
+    assert len(index.slots) >= 2 * len(index) > MIN_SLOTS
+    assert list(index.duplication_levels().items()) == list(expected_levels(sequences).items())
+
+def test_digests_sharing_a_slot_are_told_apart(sequences):
+    # the slot depends only on the first 8 bytes of a digest
+    digests = DuplicationIndex.digests(sequences).copy()
+    digests[:, :8] = 7
+    index = DuplicationIndex()
+    for start in range(0, len(sequences), 100):
+        index.update(sequences[start:start + 100], digests=digests[start:start + 100])
+    assert list(index.duplication_levels().items()) == list(expected_levels(sequences).items())
+    assert len(index) == len(set(sequences))
+
+def test_only_needed_texts_are_kept(sequences):
+    index = index_of(sequences, 100)
+    assert sorted(index.texts.values()) == sorted(expected_levels(sequences))
+    assert len(index_of(sequences, 100, keep_sequences=True).texts) == len(set(sequences))
+
+def test_merge_matches_single_index(sequences):
+    half = len(sequences) // 2
+    merged = index_of(sequences[:half], 100, keep_sequences=True)
+    merged.merge(index_of(sequences[half:], 100, keep_sequences=True))
+    single = index_of(sequences, 100, keep_sequences=True)
+    assert list(merged.duplication_levels().items()) == list(single.duplication_levels().items())
+    assert len(merged) == len(single)
+    assert merged.n_sequences == single.n_sequences
+
+def test_batch_update_matches_list_update(sequences):
+    index = DuplicationIndex()
+    for chunk in chunked(sequences, 100):
+        index.update(SequenceBatch.from_sequences(chunk))
+    assert list(index.duplication_levels().items()) == list(expected_levels(sequences).items())
+
+def test_update_with_precomputed_digests(sequences):
+    # digests computed elsewhere, e.g. in worker processes
+    index = DuplicationIndex()
+    for chunk in chunked(sequences, 100):
+        index.update(chunk, digests=DuplicationIndex.digests(SequenceBatch.from_sequences(chunk)))
+    assert list(index.duplication_levels().items()) == list(expected_levels(sequences).items())
+    with pytest.raises(ValueError):
+        index.update(sequences[:10], digests=index.digests(sequences[:9]))
+
+def test_shared_sequences(sequences):
+    first = index_of(sequences[:400], 100)
+    second = index_of(sequences[300:600], 100, shared_with=[first])
+    assert second.shared_sequences(first) == list(dict.fromkeys(s for s in sequences[300:600] if s in set(sequences[:400])))
+
+def test_arrays_round_trip(sequences):
+    index = index_of(sequences, 100, keep_sequences=True)
+    restored = DuplicationIndex.from_arrays(index.to_arrays())
+    assert list(restored.duplication_levels().items()) == list(index.duplication_levels().items())
+    assert restored.texts == index.texts
+    assert restored.n_sequences == index.n_sequences
+    assert restored.shared_sequences(index) == list(dict.fromkeys(sequences))
+
+def test_rejects_short_digests(sequences):
+    # indexes with 8-byte digests written by earlier versions
+    arrays = index_of(sequences, 100).to_arrays()
+    arrays['digest_size'] = np.array(8)
+    with pytest.raises(ValueError):
+        DuplicationIndex.from_arrays(arrays)
+
+def test_approximate_index_is_exact_for_few_sequences(sequences):
+    approximate = ApproximateDuplicationIndex(capacity=len(set(sequences)))
+    for chunk in chunked(sequences, 100):
+        approximate.update(chunk)
+    assert approximate.duplication_levels() == expected_levels(sequences)
+    assert abs(len(approximate) - len(set(sequences))) <= 4 * approximate.distinct.relative_error * len(set(sequences))
+    assert approximate.error_bounds()['Sequence duplication levels']['Maximal overestimate of reported counts'] == 0
+
+def test_approximate_index_merge_and_round_trip(sequences):
+    half = len(sequences) // 2
+    merged = index_of(sequences[:half], 100)
+    with pytest.raises(ValueError):
+        merged.merge(ApproximateDuplicationIndex())
+    first, second = ApproximateDuplicationIndex(capacity=50), ApproximateDuplicationIndex(capacity=50)
+    first.update(sequences[:half])
+    second.update(sequences[half:])
+    first.merge(second)
+    assert first.n_sequences == len(sequences)
+    restored = duplication_index_from_arrays(first.to_arrays())
+    assert isinstance(restored, ApproximateDuplicationIndex)
+    assert restored.duplication_levels() == first.duplication_levels()
+    assert len(restored) == len(first)
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from genbenchQC.utils.concatenation import concatenate_sequences
+from genbenchQC.utils.encoding import (SequenceBatch, encode_sequences, build_lookup_table, positions_in_sequence, count_per_position,
+                                       iter_sequence_chunks, sequence_ids)
+from tests.helpers import random_sequences
+
+@pytest.fixture
+def sequences():
+    # includes empty sequences
+    return random_sequences(50, min_length=0, max_length=30, alphabet='ACGTN', seed=4)
+
+def test_encode_sequences(sequences):
+    buffer, offsets = encode_sequences(sequences)
+    assert [buffer[start:end].tobytes().decode('ascii') for start, end in zip(offsets[:-1], offsets[1:])] == sequences
+    np.testing.assert_array_equal(positions_in_sequence(offsets), [i for sequence in sequences for i in range(len(sequence))])
+    np.testing.assert_array_equal(positions_in_sequence(offsets, reverse=True),
+                                  [len(sequence) - 1 - i for sequence in sequences for i in range(len(sequence))])
+
+def test_compact_codes_and_indices(sequences):
+    buffer, offsets = encode_sequences(sequences)
+    assert build_lookup_table(['A', 'C']).dtype == np.int8
+    assert sequence_ids(offsets).dtype == positions_in_sequence(offsets).dtype == np.int32
+    np.testing.assert_array_equal(sequence_ids(offsets), [i for i, sequence in enumerate(sequences) for _ in sequence])
+
+def test_count_per_position_matches_naive_counting(sequences):
+    # the alphabet holds every base of the sequences, like the unique bases in the statistics
+    symbols = ['A', 'C', 'G', 'N', 'T']
+    buffer, offsets = encode_sequences(sequences)
+    counts = count_per_position(build_lookup_table(symbols)[buffer], offsets, len(symbols))
+    max_length = max(len(sequence) for sequence in sequences)
+    expected = np.zeros((2, max_length, len(symbols)), dtype=np.int64)
+    for sequence in sequences:
+        for i, base in enumerate(sequence):
+            expected[0, i, symbols.index(base)] += 1
+            expected[1, len(sequence) - 1 - i, symbols.index(base)] += 1
+    np.testing.assert_array_equal(counts, expected)
+
+@pytest.mark.parametrize('max_bases', [1, 40, 10000])
+def test_sequence_chunks(sequences, max_bases):
+    for chunks in [list(iter_sequence_chunks(sequences, max_bases)), list(iter_sequence_chunks(SequenceBatch.from_sequences(sequences)[3:], max_bases))]:
+        # chunks longer than max_bases hold a single sequence
+        assert all(sum(len(sequence) for sequence in chunk) <= max_bases or len(chunk) == 1 for chunk in chunks)
+        assert all(len(chunk) > 0 for chunk in chunks)
+    assert [sequence for chunk in iter_sequence_chunks(sequences, max_bases) for sequence in chunk] == sequences
+    assert [sequence for chunk in chunks for sequence in chunk] == sequences[3:]
+
+def test_count_per_position_in_chunks(sequences):
+    symbols = ['A', 'C', 'G', 'N', 'T']
+    lookup = build_lookup_table(symbols)
+    expected = count_per_position(lookup[encode_sequences(sequences)[0]], encode_sequences(sequences)[1], len(symbols))
+    counts = np.zeros_like(expected)
+    for chunk in iter_sequence_chunks(sequences, 40):
+        buffer, offsets = encode_sequences(chunk)
+        chunk_counts = count_per_position(lookup[buffer], offsets, len(symbols))
+        counts[:, :chunk_counts.shape[1]] += chunk_counts
+    np.testing.assert_array_equal(counts, expected)
+
+@pytest.fixture
+def batch(sequences):
+    return SequenceBatch.from_sequences(sequences)
+
+def test_round_trip(sequences, batch):
+    assert len(batch) == len(sequences)
+    assert batch.tolist() == sequences
+    assert list(batch) == sequences
+    assert [batch[i] for i in range(len(batch))] == sequences
+    assert batch[-1] == sequences[-1]
+    assert [bytes(sequence).decode('ascii') for sequence in batch.iter_bytes()] == sequences
+    assert batch.lengths.tolist() == [len(sequence) for sequence in sequences]
+    assert batch.n_bases == sum(len(sequence) for sequence in sequences)
+    assert SequenceBatch.from_sequences(batch) is batch
+    assert SequenceBatch.from_bytes([sequence.encode('ascii') for sequence in sequences]).tolist() == sequences
+
+def test_slices_are_views(sequences, batch):
+    view = batch[10:20]
+    assert view.buffer is batch.buffer
+    assert view.offsets[0] != 0
+    assert view.tolist() == list(view) == sequences[10:20]
+    assert view[3:5].tolist() == sequences[13:15]
+    assert batch[20:10].tolist() == []
+    assert view.n_bases == sum(len(sequence) for sequence in sequences[10:20])
+
+def test_encoded_offsets_start_at_zero(sequences, batch):
+    buffer, offsets = batch[10:20].encoded()
+    expected_buffer, expected_offsets = encode_sequences(sequences[10:20])
+    np.testing.assert_array_equal(buffer, expected_buffer)
+    np.testing.assert_array_equal(offsets, expected_offsets)
+    np.testing.assert_array_equal(encode_sequences(batch[10:20])[1], expected_offsets)
+
+@pytest.mark.parametrize('indices', [
+    [0, 3, 4, 10, 49],  # increasing, copied through a mask of the bases
+    [49, 3, 10, 0],  # unsorted
+    [5, 5, 2, 5],  # repeated
+    [7],
+    [],
+])
+def test_take(sequences, batch, indices):
+    expected = [sequences[i] for i in indices]
+    assert batch.take(indices).tolist() == expected
+    assert batch[np.array(indices, dtype=np.int64)].tolist() == expected
+    # the same from a view with non-zero offsets
+    shifted = [i - 1 for i in indices if i > 0]
+    assert batch[1:].take(shifted).tolist() == [sequences[i + 1] for i in shifted]
+
+def test_boolean_mask_and_step_slices(sequences, batch):
+    mask = np.array([len(sequence) % 3 == 0 for sequence in sequences])
+    assert batch[mask].tolist() == [sequence for sequence, keep in zip(sequences, mask) if keep]
+    assert batch[5:45][mask[5:45]].tolist() == [sequence for sequence, keep in zip(sequences[5:45], mask[5:45]) if keep]
+    assert batch[::3].tolist() == sequences[::3]
+    assert batch[::-1].tolist() == sequences[::-1]
+    with pytest.raises(IndexError):
+        batch[mask[1:]]
+
+def test_join_rows(sequences, batch):
+    other = random_sequences(50, min_length=0, max_length=10, seed=5)
+    # batches given as views with non-zero offsets
+    joined = SequenceBatch.join_rows([batch[:], SequenceBatch.from_sequences(other + other)[50:]])
+    assert joined.tolist() == concatenate_sequences([sequences, other]) == [a + b for a, b in zip(sequences, other)]
+    assert SequenceBatch.join_rows([batch]).tolist() == sequences
+    with pytest.raises(ValueError):
+        SequenceBatch.join_rows([batch, batch[1:]])
+
+def test_concatenate(sequences, batch):
+    assert SequenceBatch.concatenate([batch[:10], batch[30:], batch[10:30]]).tolist() == sequences[:10] + sequences[30:] + sequences[10:30]
+    assert SequenceBatch.concatenate([]).tolist() == []
+
+def test_from_arrow(sequences):
+    pyarrow = pytest.importorskip('pyarrow')
+    chunked = pyarrow.chunked_array([sequences[:20], sequences[20:]])
+    assert SequenceBatch.from_arrow(chunked).tolist() == sequences
+    assert SequenceBatch.from_arrow(pyarrow.array(sequences)[5:25]).tolist() == sequences[5:25]
+
+def test_from_integers_and_repeat():
+    numbers = [0, 7, 9, 10, 99, 100, 12345, 10 ** 18, 2 ** 63 - 1]
+    assert SequenceBatch.from_integers(numbers).tolist() == [str(number) for number in numbers]
+    assert SequenceBatch.from_integers([]).tolist() == []
+    assert SequenceBatch.repeat('>seq_', 3).tolist() == ['>seq_'] * 3
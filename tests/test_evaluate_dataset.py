@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from genbenchQC import evaluate_dataset
+from genbenchQC.utils import input_utils
+from tests.helpers import random_sequences
+
+@pytest.fixture
+def csv_file(tmp_path):
+    sequences = random_sequences(300, alphabet='ACGTN', n_duplicates=30)
+    path = tmp_path / 'sequences.csv'
+    pd.DataFrame({'first': sequences, 'second': sequences[::-1], 'label': np.arange(len(sequences)) % 7}).to_csv(path, index=False)
+    return path
+
+@pytest.fixture
+def reads(monkeypatch):
+    """
+    Columns of every read of a CSV/TSV file.
+    """
+    columns = []
+    iter_csv_chunks = input_utils.iter_csv_chunks
+
+    def counting(file_path, input_format, read_columns, *args, **kwargs):
+        columns.append(read_columns)
+        return iter_csv_chunks(file_path, input_format, read_columns, *args, **kwargs)
+
+    monkeypatch.setattr(input_utils, 'iter_csv_chunks', counting)
+    return columns
+
+def run(csv_file, out_folder, **kwargs):
+    evaluate_dataset.run([str(csv_file)], 'csv', out_folder=str(out_folder), sequence_column=['first', 'second'], regression=True,
+                         report_types=['simple'], engine='numpy', chunk_size=37, log_level='WARNING', **kwargs)
+    return {path.name: path.read_text() for path in out_folder.glob('*.csv')}
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_streaming_reads_the_file_once(csv_file, tmp_path, reads, workers):
+    expected = run(csv_file, tmp_path / 'in_memory')
+    reads.clear()
+    # the statistics of both labels and all three groups of sequence columns are fed from one read
+    assert run(csv_file, tmp_path / 'streaming', streaming=True, workers=workers) == expected
+    assert reads == [['label'], ['first', 'second', 'label']]
+    assert len(expected) == 3
+
+def test_streaming_with_cache_and_snapshots(csv_file, tmp_path, reads):
+    expected = run(csv_file, tmp_path / 'in_memory')
+    assert run(csv_file, tmp_path / 'cached', streaming=True, cache_dir=str(tmp_path / 'cache')) == expected
+    reads.clear()
+    # all statistics are cached, only the labels are read
+    assert run(csv_file, tmp_path / 'cached_again', streaming=True, cache_dir=str(tmp_path / 'cache')) == expected
+    assert reads == [['label']]
+
+    # the second run of each continues the snapshots of the first one, with the indices of the sampled sequences
+    options = {'max_sequences_for_distributions': 50}
+    for index in range(2):
+        in_memory = run(csv_file, tmp_path / f'in_memory_{index}', snapshot_dir=str(tmp_path / 'in_memory_snapshots'), **options)
+        streaming = run(csv_file, tmp_path / f'streaming_{index}', snapshot_dir=str(tmp_path / 'snapshots'), streaming=True, **options)
+        assert streaming == in_memory
+    for path in (tmp_path / 'snapshots').glob('*.npz'):
+        with np.load(path) as snapshot, np.load(tmp_path / 'in_memory_snapshots' / path.name) as expected:
+            assert int(snapshot['n_sequences']) == int(expected['n_sequences'])
+            np.testing.assert_array_equal(snapshot['sample_keys'], expected['sample_keys'])
@@ -0,0 +1,138 @@
+import pandas as pd
+import pytest
+
+from genbenchQC.utils import input_utils
+from genbenchQC.utils.input_utils import (read_fasta, iter_fasta, write_fasta, iter_csv_file, iter_csv_chunks, read_csv_file,
+                                          read_labels, partition_by_label, iter_label_partitions)
+from tests.helpers import random_sequences
+
+@pytest.fixture
+def sequences():
+    return random_sequences(100, alphabet='ACGTN')
+
+@pytest.mark.parametrize('chunk_size', [1, 30, 1000])
+def test_fasta_chunks_match_whole_file(tmp_path, sequences, chunk_size):
+    path = tmp_path / 'sequences.fasta'
+    write_fasta(sequences, path)
+    chunks = list(iter_fasta(path, chunk_size=chunk_size))
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    assert [sequence for chunk in chunks for sequence in chunk] == list(read_fasta(path)) == sequences
+
+@pytest.mark.parametrize('chunk_size', [1, 30, 1000])
+def test_csv_chunks_of_one_label(tmp_path, sequences, chunk_size):
+    df = pd.DataFrame({'sequence': sequences, 'label': ['a', 'b', 'c', 'b'] * 25})
+    path = tmp_path / 'sequences.csv'
+    df.to_csv(path, index=False)
+    chunks = iter_csv_file(str(path), 'csv', ['sequence'], label_column='label', label='b', chunk_size=chunk_size)
+    assert [sequence for chunk in chunks for sequence in chunk] == df['sequence'][df['label'] == 'b'].tolist()
+
+@pytest.fixture(params=['arrow', 'pandas'])
+def csv_engine(request, monkeypatch):
+    if request.param == 'arrow':
+        pytest.importorskip('pyarrow')
+    else:
+        monkeypatch.setattr(input_utils, '_arrow_csv', lambda: None)
+    return request.param
+
+@pytest.mark.parametrize('input_format', ['csv', 'tsv.gz'])
+@pytest.mark.parametrize('chunk_size', [1, 30, 1000])
+def test_csv_chunks_match_pandas(tmp_path, sequences, csv_engine, input_format, chunk_size):
+    # lowercase sequences, an unused column and missing labels
+    df = pd.DataFrame({'sequence': [sequence.lower() for sequence in sequences], 'unused': range(len(sequences)),
+                       'label': ['a', None, '1', 'b'] * 25})
+    path = tmp_path / f'sequences.{input_format}'
+    df.to_csv(path, index=False, sep='\t' if input_format == 'tsv.gz' else ',')
+    expected = pd.read_csv(path, sep='\t' if input_format == 'tsv.gz' else ',', usecols=['sequence', 'label'], dtype=str)
+    expected['sequence'] = expected['sequence'].str.upper()
+
+    chunks = list(iter_csv_chunks(str(path), input_format, ['sequence', 'label'], ['sequence'], chunk_size=chunk_size))
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+    pd.testing.assert_frame_equal(read_csv_file(str(path), input_format, ['sequence'], 'label'), expected)
+    pd.testing.assert_series_equal(read_labels(str(path), input_format, 'label'), expected['label'])
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 30, 1000])
+def test_csv_chunks_gather_small_batches(tmp_path, sequences, monkeypatch, chunk_size):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'sequences.csv'
+    pd.DataFrame({'sequence': sequences, 'label': ['a', 'b'] * 50}).to_csv(path, index=False)
+    expected = read_csv_file(str(path), 'csv', ['sequence'], 'label')
+    iter_delimited_batches = input_utils._iter_delimited_batches
+
+    def small_batches(*args):
+        # batches of 3 rows, so chunks are gathered from several batches and batches are split among chunks
+        for batch in iter_delimited_batches(*args):
+            yield from (batch.slice(start, 3) for start in range(0, batch.num_rows, 3))
+
+    monkeypatch.setattr(input_utils, '_iter_delimited_batches', small_batches)
+    chunks = list(iter_csv_chunks(str(path), 'csv', ['sequence', 'label'], ['sequence'], chunk_size=chunk_size))
+    assert [len(chunk) for chunk in chunks[:-1]] == [chunk_size] * (len(chunks) - 1)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+    pd.testing.assert_frame_equal(read_csv_file(str(path), 'csv', ['sequence'], 'label'), expected)
+
+def test_read_empty_csv_file(tmp_path, csv_engine):
+    path = tmp_path / 'empty.csv'
+    path.write_text('sequence,label\n')
+    df = read_csv_file(str(path), 'csv', ['sequence'], 'label')
+    assert list(df.columns) == ['sequence', 'label'] and df.empty
+
+def write_columnar(df, path, input_format):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.feather
+    import pyarrow.parquet
+    # several row groups, with an integer label column
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    if input_format == 'parquet':
+        pyarrow.parquet.write_table(table, path, row_group_size=16)
+    else:
+        pyarrow.feather.write_feather(table, path, chunksize=16)
+    return path
+
+@pytest.mark.parametrize('input_format', ['parquet', 'feather', 'arrow'])
+def test_columnar_files_match_csv(tmp_path, sequences, input_format):
+    df = pd.DataFrame({'sequence': [sequence.lower() for sequence in sequences], 'other': sequences[::-1], 'label': [0, 1, 2, 1] * 25})
+    csv_path = tmp_path / 'sequences.csv'
+    df.to_csv(csv_path, index=False)
+    path = str(write_columnar(df, tmp_path / f'sequences.{input_format}', input_format))
+
+    pd.testing.assert_frame_equal(read_csv_file(path, input_format, ['sequence', 'other'], 'label'),
+                                  read_csv_file(str(csv_path), 'csv', ['sequence', 'other'], 'label'))
+    # the label is compared as a string
+    filtered = read_csv_file(path, input_format, ['sequence'], 'label', label='1')
+    assert filtered['sequence'].tolist() == df['sequence'][df['label'] == 1].str.upper().tolist()
+    for chunk_size in [7, 1000]:
+        chunks = list(iter_csv_file(path, input_format, ['sequence', 'other'], label_column='label', label='2', chunk_size=chunk_size))
+        assert [s for chunk in chunks for s in chunk] == list(iter_csv_file(str(csv_path), 'csv', ['sequence', 'other'], label_column='label', label='2'))[0].tolist()
+    shards = [s for index in (1, 2, 3) for chunk in iter_csv_file(path, input_format, ['sequence'], chunk_size=5, shard=(index, 3)) for s in chunk]
+    assert shards == [sequence.upper() for sequence in sequences]
+
+def test_columnar_file_without_column(tmp_path, sequences):
+    path = str(write_columnar(pd.DataFrame({'sequence': sequences}), tmp_path / 'sequences.parquet', 'parquet'))
+    with pytest.raises(ValueError):
+        read_csv_file(path, 'parquet', ['sequence'], 'label')
+
+def test_partition_by_label(sequences):
+    df = pd.DataFrame({'sequence': sequences, 'other': sequences[::-1], 'label': ['b', 'a', 'c', 'a'] * 25})
+    partitions = partition_by_label(df, ['sequence', 'other'], 'label')
+    assert list(partitions) == ['b', 'a', 'c']
+    for label, columns in partitions.items():
+        for column in ['sequence', 'other']:
+            assert columns[column].tolist() == df[column][df['label'] == label].tolist()
+    assert list(partition_by_label(df, ['sequence'], 'label', labels=['c', 'a'])) == ['c', 'a']
+    with pytest.raises(ValueError):
+        partition_by_label(df, ['sequence'], 'label', labels=['d'])
+
+@pytest.mark.parametrize('chunk_size', [1, 30, 1000])
+def test_label_partitions_match_partition_by_label(tmp_path, sequences, chunk_size):
+    df = pd.DataFrame({'sequence': sequences, 'other': sequences[::-1], 'label': ['b', 'a', 'c', 'a'] * 25})
+    path = tmp_path / 'sequences.csv'
+    df.to_csv(path, index=False)
+    expected = partition_by_label(df, ['sequence', 'other'], 'label', labels=['a', 'b'])
+    partitions = list(iter_label_partitions(str(path), 'csv', ['sequence', 'other'], 'label', labels=['a', 'b'], chunk_size=chunk_size))
+    for label in ['a', 'b']:
+        for column in ['sequence', 'other']:
+            assert [s for partition in partitions if label in partition for s in partition[label][column]] == expected[label][column].tolist()
+    assert all(set(partition) <= {'a', 'b'} for partition in partitions)
+    # labels transformed chunk by chunk
+    partitions = iter_label_partitions(str(path), 'csv', ['sequence'], 'label', label_transform=lambda labels: labels.str.upper(), chunk_size=chunk_size)
+    assert {label for partition in partitions for label in partition} == {'A', 'B', 'C'}
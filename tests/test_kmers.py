@@ -0,0 +1,97 @@
+from collections import Counter
+
+import pytest
+
+from genbenchQC.utils.encoding import encode_sequences
+from genbenchQC.utils.kmers import KmerSpectrum, MAX_DENSE_K, MAX_K, jensen_shannon_divergence
+from genbenchQC.utils.testing import flag_kmer_spectrum, flag_significant_differences
+from tests.helpers import random_sequences
+
+def naive_counts(sequences, k):
+    """
+    K-mers of the sequences that consist of ACGT only.
+    """
+    counts = Counter()
+    for sequence in sequences:
+        sequence = sequence.upper()
+        for start in range(len(sequence) - k + 1):
+            kmer = sequence[start:start + k]
+            if set(kmer) <= set('ACGT'):
+                counts[kmer] += 1
+    return dict(counts)
+
+def spectrum_of(sequences, k):
+    spectrum = KmerSpectrum(k)
+    spectrum.update_encoded(*encode_sequences(sequences))
+    return spectrum
+
+@pytest.fixture
+def sequences():
+    return random_sequences(300, min_length=1, max_length=80, alphabet='ACGTNacgt', seed=2)
+
+@pytest.mark.parametrize('k', [1, 3, MAX_DENSE_K, MAX_DENSE_K + 1, 8, MAX_K])
+def test_counts_match_naive_counting(sequences, k):
+    spectrum = spectrum_of(sequences, k)
+    expected = naive_counts(sequences, k)
+    assert spectrum.to_dict()['Counts'] == expected
+    assert spectrum.n_kmers == sum(expected.values())
+    assert spectrum.to_dict()['Number of distinct k-mers'] == len(expected)
+
+def test_dense_and_sparse_switch(sequences):
+    dense, sparse = spectrum_of(sequences, MAX_DENSE_K), spectrum_of(sequences, MAX_DENSE_K + 1)
+    assert dense.dense and len(dense.counts) == 4 ** MAX_DENSE_K
+    assert not sparse.dense and len(sparse.counts) == len(naive_counts(sequences, MAX_DENSE_K + 1))
+    # sparse spectra keep their k-mers sorted
+    assert (sparse.kmers[1:] > sparse.kmers[:-1]).all()
+
+@pytest.mark.parametrize('k', [0, MAX_K + 1])
+def test_rejects_unsupported_sizes(k):
+    with pytest.raises(ValueError):
+        KmerSpectrum(k)
+
+@pytest.mark.parametrize('k', [3, 8])
+def test_merge_matches_single_spectrum(sequences, k):
+    merged = spectrum_of(sequences[:100], k).merge(spectrum_of(sequences[100:], k))
+    assert merged.to_dict() == spectrum_of(sequences, k).to_dict()
+
+def test_merge_rejects_different_sizes(sequences):
+    with pytest.raises(ValueError):
+        spectrum_of(sequences, 3).merge(spectrum_of(sequences, 4))
+
+@pytest.mark.parametrize('k', [3, 8])
+def test_arrays_round_trip(sequences, k):
+    spectrum = spectrum_of(sequences, k)
+    restored = KmerSpectrum.from_arrays(spectrum.to_arrays('kmers'), 'kmers', k)
+    assert restored.to_dict() == spectrum.to_dict()
+
+@pytest.mark.parametrize('k', [2, 8])
+def test_jensen_shannon_divergence_bounds(sequences, k):
+    spectrum = spectrum_of(sequences, k)
+    assert jensen_shannon_divergence(spectrum, spectrum_of(sequences[::-1], k)) == pytest.approx(0, abs=1e-12)
+    assert jensen_shannon_divergence(spectrum_of(['A' * 50], k), spectrum_of(['C' * 50], k)) == pytest.approx(1)
+    assert 0 < jensen_shannon_divergence(spectrum, spectrum_of(sequences[:50], k)) < 1
+
+def test_flag_kmer_spectrum(sequences):
+    stats = {'K-mer spectrum': {2: spectrum_of(sequences, 2), 3: spectrum_of(sequences, 3)}}
+    divergences, passed = flag_kmer_spectrum(stats, {'K-mer spectrum': {3: spectrum_of(sequences[::-1], 3)}}, 0.01)
+    assert list(divergences) == [3] and passed
+    divergences, passed = flag_kmer_spectrum(stats, {'K-mer spectrum': {2: spectrum_of(['AC' * 40], 2)}}, 0.01)
+    assert divergences[2] > 0.01 and not passed
+
+def test_flag_kmer_spectrum_skips_empty_spectra(sequences, caplog):
+    stats = {'K-mer spectrum': {2: spectrum_of(sequences, 2), 8: spectrum_of(sequences, 8)}}
+    # sequences shorter than 8 bases and sequences of N only have no k-mers
+    other = {'K-mer spectrum': {2: spectrum_of(sequences[::-1], 2), 8: spectrum_of(['ACGT', 'NNNNNNNNNN'], 8)}}
+    divergences, passed = flag_kmer_spectrum(stats, other, 0.01)
+    assert list(divergences) == [2] and passed
+    assert 'Not enough data' in caplog.text
+    divergences, passed = flag_kmer_spectrum(other, other, 0.01)
+    assert list(divergences) == [2] and passed
+
+def test_kmer_spectra_are_flagged_with_their_own_threshold(sequences):
+    stats1 = {'K-mer spectrum': {2: spectrum_of(sequences, 2)}}
+    stats2 = {'K-mer spectrum': {2: spectrum_of(['AC' * 40], 2)}}
+    results = flag_significant_differences(None, stats1, None, stats2, threshold=0.01, kmer_threshold=100)
+    assert list(results) == ['K-mer spectrum'] and results['K-mer spectrum'][1]
+    results = flag_significant_differences(None, stats1, None, stats2, threshold=100, kmer_threshold=0.01)
+    assert not results['K-mer spectrum'][1]
@@ -0,0 +1,96 @@
+import pytest
+
+from genbenchQC.merge_statistics import merge_partial_statistics
+from genbenchQC.utils.input_utils import write_fasta, iter_fasta
+from genbenchQC.utils.snapshots import update_snapshots
+from genbenchQC.utils.statistics import SequenceStatistics
+from tests.helpers import random_sequences, assert_statistics_equal
+
+N_SHARDS = 3
+
+@pytest.fixture
+def fasta_file(tmp_path):
+    path = tmp_path / 'sequences.fasta'
+    write_fasta(random_sequences(400, alphabet='ACGTN', n_duplicates=40), path)
+    return path
+
+def streamed_statistics(path, shard=None, **kwargs):
+    chunks = iter_fasta(path, chunk_size=50, shard=shard)
+    return SequenceStatistics.from_chunks(chunks, str(path), 'label', keep_sequences=True, **kwargs)
+
+def save_shards(path, tmp_path, n_shards=N_SHARDS, **kwargs):
+    partials = []
+    for index in range(1, n_shards + 1):
+        partial_path = tmp_path / f'{index}_of_{n_shards}.npz'
+        streamed_statistics(path, shard=(index, n_shards), **kwargs).save_partial(partial_path, shard=(index, n_shards))
+        seq_stats, shard = SequenceStatistics.load_partial(partial_path)
+        partials.append((shard, seq_stats))
+    return partials
+
+def test_shards_cover_the_file(fasta_file):
+    shards = [sequence for index in range(1, 8) for chunk in iter_fasta(fasta_file, shard=(index, 7)) for sequence in chunk]
+    assert shards == [sequence for chunk in iter_fasta(fasta_file) for sequence in chunk]
+
+@pytest.mark.parametrize('options', [{}, {'kmer_sizes': [3]}])
+def test_merged_shards_match_single_run(fasta_file, tmp_path, options):
+    expected, _ = streamed_statistics(fasta_file, **options).compute()
+    # the order of the partial statistics does not matter
+    partials = save_shards(fasta_file, tmp_path, **options)[::-1]
+    merged, _ = merge_partial_statistics(partials).compute()
+    assert_statistics_equal(expected, merged)
+
+SAMPLED_STATISTICS = ['Per sequence nucleotide content', 'Per sequence dinucleotide content', 'Per sequence GC content', 'Sequence lengths']
+
+def test_merged_shards_keep_sample_size(fasta_file, tmp_path):
+    # each shard samples with its own seed, so only the size of the merged sample matches a single run
+    expected, _ = streamed_statistics(fasta_file, max_sequences_for_distributions=100).compute()
+    merged, _ = merge_partial_statistics(save_shards(fasta_file, tmp_path, max_sequences_for_distributions=100)).compute()
+    assert_statistics_equal(expected, merged, ignore=SAMPLED_STATISTICS)
+    for name in SAMPLED_STATISTICS:
+        assert len(merged[name]) == len(expected[name]) == 100
+
+def test_partial_statistics_round_trip(fasta_file, tmp_path):
+    seq_stats = streamed_statistics(fasta_file)
+    seq_stats.save_partial(tmp_path / 'whole.npz')
+    loaded, shard = SequenceStatistics.load_partial(tmp_path / 'whole.npz')
+    assert shard is None
+    assert (loaded.filename, loaded.label) == (str(fasta_file), 'label')
+    assert_statistics_equal(streamed_statistics(fasta_file).compute()[0], loaded.compute()[0])
+
+def test_merge_rejects_repeated_shards(fasta_file, tmp_path):
+    partials = save_shards(fasta_file, tmp_path)
+    with pytest.raises(ValueError, match='more than once'):
+        merge_partial_statistics(partials + partials[:1])
+
+def test_merge_rejects_missing_shards(fasta_file, tmp_path):
+    partials = save_shards(fasta_file, tmp_path)
+    with pytest.raises(ValueError, match='Missing'):
+        merge_partial_statistics(partials[1:])
+
+def test_merge_rejects_different_splits(fasta_file, tmp_path):
+    partials = save_shards(fasta_file, tmp_path, n_shards=3)
+    with pytest.raises(ValueError, match='different splits'):
+        merge_partial_statistics(partials[:2] + save_shards(fasta_file, tmp_path, n_shards=2)[1:])
+
+def test_merge_rejects_whole_input_with_shards(fasta_file, tmp_path):
+    streamed_statistics(fasta_file).save_partial(tmp_path / 'whole.npz')
+    whole, shard = SequenceStatistics.load_partial(tmp_path / 'whole.npz')
+    with pytest.raises(ValueError, match='whole input'):
+        merge_partial_statistics([(shard, whole)] + save_shards(fasta_file, tmp_path))
+
+@pytest.mark.parametrize('max_sequences', [None, 50])
+def test_snapshot_update_matches_full_recompute(tmp_path, max_sequences):
+    sequences = random_sequences(300, alphabet='ACGTN', n_duplicates=30)
+    options = {'engine': 'numpy', 'kmer_sizes': [2], 'max_sequences_for_distributions': max_sequences}
+    snapshot_dir = tmp_path / 'snapshots'
+    # duplicates of the first part appear in the second part
+    update_snapshots([SequenceStatistics(sequences[:200], 'first.fasta', 'label', **options)], snapshot_dir)
+    [updated] = update_snapshots([SequenceStatistics(sequences[200:], 'second.fasta', 'label', **options)], snapshot_dir)
+    expected, _ = SequenceStatistics(sequences, 'first.fasta', 'label', **options).compute()
+    assert_statistics_equal(expected, updated.compute()[0])
+
+def test_snapshot_update_rejects_other_options(tmp_path):
+    sequences = random_sequences(100)
+    update_snapshots([SequenceStatistics(sequences, 'first.fasta', 'label', engine='numpy')], tmp_path)
+    with pytest.raises(ValueError):
+        update_snapshots([SequenceStatistics(sequences, 'second.fasta', 'label', engine='numpy', kmer_sizes=[3])], tmp_path)
@@ -0,0 +1,190 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+from Bio import SeqIO, bgzf
+
+from genbenchQC import pack_sequences
+from genbenchQC.utils.compression import detect_compression
+from genbenchQC.utils.fasta import iter_fasta_blocks, read_fasta_encoded
+from genbenchQC.utils.fastq import QualityProfile, iter_fastq_blocks
+from genbenchQC.utils.input_utils import (read_fasta, iter_fasta, read_csv_file, iter_csv_file, read_sequence_file, iter_sequence_file,
+                                          is_sequence_file, write_fasta)
+from genbenchQC.utils.packed import PackedSequences
+from tests.helpers import random_sequences
+
+@pytest.fixture(scope='module')
+def sequences():
+    # long enough for records to span several BGZF blocks and zstd frames
+    return random_sequences(200, min_length=1, max_length=2000, alphabet='ACGTNacgtn', seed=3)
+
+def fasta_text(sequences, line_length=60):
+    records = []
+    for i, sequence in enumerate(sequences):
+        lines = [sequence[start:start + line_length] for start in range(0, len(sequence), line_length)]
+        records.append('\n'.join([f'>record {i} with a description'] + lines))
+    return ('\n'.join(records) + '\n').encode('ascii')
+
+def quality_string(sequence):
+    return ''.join(chr(33 + (i * 7 + len(sequence)) % 41) for i in range(len(sequence)))
+
+def fastq_text(sequences):
+    # quality strings may start with '@', like headers
+    return ''.join(f'@read{i}\n{sequence}\n+\n@{quality_string(sequence)[1:]}\n' for i, sequence in enumerate(sequences)).encode('ascii')
+
+def expected_quality_sums(sequences):
+    sums = np.zeros(max(len(sequence) for sequence in sequences), dtype=np.int64)
+    for sequence in sequences:
+        quality = '@' + quality_string(sequence)[1:]
+        sums[:len(quality)] += np.frombuffer(quality.encode('ascii'), dtype=np.uint8) - 33
+    return sums
+
+def write_compressed(data, path, compression):
+    if compression is None:
+        path.write_bytes(data)
+    elif compression == 'gzip':
+        path.write_bytes(gzip.compress(data))
+    elif compression == 'bgzf':
+        with bgzf.BgzfWriter(str(path), 'wb') as writer:
+            writer.write(data)
+    else:
+        zstandard = pytest.importorskip('zstandard')
+        compressor = zstandard.ZstdCompressor()
+        if compression == 'zstd':
+            path.write_bytes(compressor.compress(data))
+        else:
+            # independent frames, as written by seekable zstd tools
+            path.write_bytes(b''.join(compressor.compress(data[start:start + 10000]) for start in range(0, len(data), 10000)))
+    return path
+
+COMPRESSIONS = [None, 'gzip', 'bgzf', 'zstd', 'zstd-frames']
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_detect_compression(tmp_path, compression):
+    path = write_compressed(b'>record\nACGT\n', tmp_path / 'sequences.fasta', compression)
+    assert detect_compression(path) == (compression.split('-')[0] if compression is not None else None)
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_fasta_readers_match_plain_input(tmp_path, sequences, compression):
+    path = write_compressed(fasta_text(sequences), tmp_path / 'sequences.fasta', compression)
+    expected = [sequence.upper() for sequence in sequences]
+    assert read_fasta(path).tolist() == expected
+    assert [s for chunk in iter_fasta(path, chunk_size=7) for s in chunk] == expected
+    # blocks much smaller than the records
+    assert [s.decode('ascii') for block in iter_fasta_blocks(path, block_size=100) for s in block] == expected
+    buffer, offsets = read_fasta_encoded(path)
+    assert buffer.tobytes().decode('ascii') == ''.join(expected)
+    np.testing.assert_array_equal(np.diff(offsets), [len(sequence) for sequence in sequences])
+
+@pytest.mark.parametrize('n_shards', [1, 3, 7])
+def test_fasta_shards_match_whole_file(tmp_path, sequences, n_shards):
+    path = tmp_path / 'sequences.fasta'
+    path.write_bytes(fasta_text(sequences))
+    shards = [s for index in range(1, n_shards + 1) for chunk in iter_fasta(path, shard=(index, n_shards)) for s in chunk]
+    assert shards == [sequence.upper() for sequence in sequences]
+
+def test_fasta_blocks_of_empty_file(tmp_path):
+    path = tmp_path / 'empty.fasta'
+    path.write_bytes(b'')
+    assert [s for block in iter_fasta_blocks(path) for s in block] == []
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_fastq_readers_match_plain_input(tmp_path, sequences, compression):
+    path = write_compressed(fastq_text(sequences), tmp_path / 'sequences.fastq', compression)
+    expected = [sequence.upper() for sequence in sequences]
+    qualities = QualityProfile()
+    assert read_sequence_file(path, 'fastq', qualities=qualities).tolist() == expected
+    np.testing.assert_array_equal(qualities.sums, expected_quality_sums(sequences))
+    np.testing.assert_array_equal(qualities.counts, [sum(len(s) > i for s in sequences) for i in range(len(qualities.counts))])
+
+    qualities = QualityProfile()
+    blocks = iter_fastq_blocks(path, block_size=100, qualities=qualities)
+    assert [s.decode('ascii') for block in blocks for s in block] == expected
+    np.testing.assert_array_equal(qualities.sums, expected_quality_sums(sequences))
+    assert [s for chunk in iter_sequence_file(path, 'fastq', chunk_size=7) for s in chunk] == expected
+
+def test_fastq_rejects_truncated_records(tmp_path, sequences):
+    path = tmp_path / 'sequences.fastq'
+    path.write_bytes(fastq_text(sequences).rsplit(b'\n+\n', 1)[0])
+    with pytest.raises(ValueError):
+        read_sequence_file(path, 'fastq')
+
+def test_fastq_cannot_be_sharded(tmp_path, sequences):
+    path = write_compressed(fastq_text(sequences), tmp_path / 'sequences.fastq', None)
+    with pytest.raises(ValueError):
+        iter_sequence_file(path, 'fastq', shard=(1, 2))
+
+def test_quality_profiles_merge(sequences):
+    qualities = [b'@' + quality_string(sequence)[1:].encode('ascii') for sequence in sequences]
+    whole = QualityProfile()
+    whole.update(qualities)
+    first, second = QualityProfile(), QualityProfile()
+    first.update(qualities[:100])
+    second.update(qualities[100:])
+    merged = first.merge(second)
+    np.testing.assert_array_equal(merged.sums, whole.sums)
+    np.testing.assert_array_equal(merged.counts, whole.counts)
+    restored = QualityProfile.from_arrays(whole.to_arrays('quality'), 'quality')
+    np.testing.assert_array_equal(restored.to_frame()['Mean quality'], whole.sums / whole.counts)
+
+def test_quality_profile_of_equal_length_reads(sequences):
+    # reads of equal length are summed as a matrix instead of per position
+    qualities = [b'@' + quality_string(sequence)[1:50].encode('ascii') for sequence in sequences if len(sequence) >= 50]
+    profile = QualityProfile()
+    profile.update(qualities)
+    expected = sum(np.frombuffer(quality, dtype=np.uint8).astype(np.int64) - 33 for quality in qualities)
+    np.testing.assert_array_equal(profile.sums, expected)
+    np.testing.assert_array_equal(profile.counts, [len(qualities)] * 50)
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_compressed_csv_matches_plain_input(tmp_path, sequences, compression):
+    df = pd.DataFrame({'sequence': sequences, 'label': ['a', 'b'] * 100})
+    path = write_compressed(df.to_csv(index=False).encode('ascii'), tmp_path / 'sequences.csv', compression)
+    read = read_csv_file(str(path), 'csv', ['sequence'], 'label')
+    assert read['sequence'].tolist() == [sequence.upper() for sequence in sequences]
+    assert read['label'].tolist() == df['label'].tolist()
+
+@pytest.mark.parametrize('input_format', ['fasta', 'fastq'])
+def test_packed_sequence_files_match_input(tmp_path, sequences, input_format):
+    text = fasta_text(sequences) if input_format == 'fasta' else fastq_text(sequences)
+    path = write_compressed(text, tmp_path / f'sequences.{input_format}', None)
+    pack_sequences.run(str(path), input_format, chunk_size=30)
+    packed_path = str(path.with_suffix('.gbqc'))
+    expected = read_sequence_file(path, input_format).tolist()
+
+    assert is_sequence_file(packed_path, 'packed')
+    assert PackedSequences(packed_path).source_format == input_format
+    assert read_sequence_file(packed_path, 'packed').tolist() == expected
+    assert [s for chunk in iter_sequence_file(packed_path, 'packed', chunk_size=11) for s in chunk.tolist()] == expected
+    shards = [s for index in (1, 2, 3) for chunk in iter_sequence_file(packed_path, 'packed', shard=(index, 3)) for s in chunk.tolist()]
+    assert shards == expected
+    # still readable as a table with a sequence column
+    assert read_csv_file(packed_path, 'packed', ['sequence'])['sequence'].tolist() == expected
+
+def test_packed_csv_matches_input(tmp_path, sequences):
+    labels = ['a', 'b', None, 'b'] * 50
+    df = pd.DataFrame({'sequence': sequences, 'other': sequences[::-1], 'label': labels})
+    path = tmp_path / 'sequences.csv'
+    df.to_csv(path, index=False)
+    pack_sequences.run(str(path), 'csv', sequence_column=['sequence', 'other'], label_column='label', chunk_size=30)
+    packed = PackedSequences(path.with_suffix('.gbqc'))
+
+    assert not is_sequence_file(path.with_suffix('.gbqc'), 'packed')
+    assert packed.sequences('sequence') == [sequence.upper() for sequence in sequences]
+    assert packed.sequences('other', 10, 20) == [sequence.upper() for sequence in sequences[::-1][10:20]]
+    # missing labels are read as None
+    assert packed.labels().tolist() == labels
+    chunks = iter_csv_file(str(path.with_suffix('.gbqc')), 'packed', ['sequence'], label_column='label', label='b', chunk_size=7)
+    assert [s for chunk in chunks for s in chunk] == [sequence.upper() for sequence, label in zip(sequences, labels) if label == 'b']
+
+@pytest.mark.parametrize('indices', [None, [5 * i for i in range(200)], [f'{i}_train' for i in range(200)]])
+def test_write_fasta_is_parsed_by_biopython(tmp_path, sequences, indices):
+    path = tmp_path / 'written.fasta'
+    write_fasta(sequences, path, indices=indices)
+    records = list(SeqIO.parse(path, 'fasta'))
+    names = range(len(sequences)) if indices is None else indices
+    assert [record.id for record in records] == [f'seq_{name}' for name in names]
+    assert [str(record.seq) for record in records] == sequences
+    # each sequence on a single line
+    assert len(path.read_text().splitlines()) == 2 * len(sequences)
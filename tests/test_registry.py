@@ -0,0 +1,42 @@
+import pytest
+
+from genbenchQC.utils.registry import STATISTICS, resolve_statistics, statistic_slug
+from genbenchQC.utils.statistics import SequenceStatistics
+from tests.helpers import random_sequences
+
+def test_all_statistics_by_default():
+    assert resolve_statistics() == list(STATISTICS)
+
+def test_requested_statistics_with_dependencies():
+    assert resolve_statistics(['per_position_nucleotide_content']) == ['Per position nucleotide content', 'Sequence lengths']
+
+def test_skipped_statistics_with_dependents():
+    resolved = resolve_statistics(skip_stats=[statistic_slug('Sequence lengths')])
+    assert 'Sequence lengths' not in resolved
+    assert 'Per position nucleotide content' not in resolved
+    assert 'Per position reversed nucleotide content' not in resolved
+    assert 'Per sequence GC content' in resolved
+
+def test_rejects_unknown_statistics():
+    with pytest.raises(ValueError):
+        resolve_statistics(['per_sequence_entropy'])
+
+@pytest.mark.parametrize('engine', ['python', 'numpy'])
+def test_only_requested_statistics_are_computed(engine):
+    stats, _ = SequenceStatistics(random_sequences(50), 'sequences.fasta', 'label', engine=engine,
+                                  statistics=['per_sequence_gc_content', 'k_mer_spectrum'], kmer_sizes=[2]).compute()
+    assert 'Per sequence GC content' in stats
+    assert 'K-mer spectrum' in stats
+    assert 'Per sequence nucleotide content' not in stats
+    assert 'Sequence duplication levels' not in stats
+
+def test_skipped_dinucleotides_in_streamed_and_derived_statistics():
+    columns = [random_sequences(50, seed=seed) for seed in range(2)]
+    options = {'engine': 'numpy', 'skip_stats': ['per_sequence_dinucleotide_content']}
+    column_statistics = [SequenceStatistics.from_chunks([column[:20], column[20:]], 'pairs.csv', 'label', **options) for column in columns]
+    for column in column_statistics:
+        stats, _ = column.compute()
+        assert 'Per sequence dinucleotide content' not in stats
+    stats, _ = SequenceStatistics.from_columns(column_statistics, columns, 'pairs.csv', 'label', **options).compute()
+    assert 'Per sequence dinucleotide content' not in stats
+    assert 'Per sequence nucleotide content' in stats
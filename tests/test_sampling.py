@@ -0,0 +1,28 @@
+import numpy as np
+
+from genbenchQC.utils.sampling import sampling_keys, select_sample, sample_sequences, shard_seed
+
+def test_keys_do_not_depend_on_chunks():
+    keys = sampling_keys(np.arange(1000), seed=5)
+    np.testing.assert_array_equal(np.concatenate([sampling_keys(np.arange(0, 300), 5), sampling_keys(np.arange(300, 1000), 5)]), keys)
+    assert len(np.unique(keys)) == len(keys)
+    assert not np.array_equal(sampling_keys(np.arange(1000), seed=6), keys)
+
+def test_select_sample():
+    keys = sampling_keys(np.arange(1000))
+    selected = select_sample(keys, 100)
+    assert len(selected) == 100
+    assert (np.diff(selected) > 0).all()
+    # the sample holds the smallest keys, so a sample of the union of two parts is a sample of samples of the parts
+    assert keys[selected].max() < np.delete(keys, selected).min()
+    first, second = select_sample(keys[:400], 100), 400 + select_sample(keys[400:], 100)
+    union = np.concatenate([first, second])
+    np.testing.assert_array_equal(union[select_sample(keys[union], 100)], selected)
+    np.testing.assert_array_equal(select_sample(keys[:50], 100), np.arange(50))
+
+def test_sample_sequences_is_reproducible():
+    sequences = [f'seq{i}' for i in range(1000)]
+    sample = sample_sequences(sequences, 10, seed=2)
+    assert sample == sample_sequences(sequences, 10, seed=2)
+    assert sample == sorted(sample, key=sequences.index)
+    assert shard_seed(2, (1, 3)) != shard_seed(2, (2, 3))
@@ -0,0 +1,145 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from genbenchQC.utils.sketches import HyperLogLog, SpaceSaving, TDigest, IntegerHistogram
+from tests.helpers import chunked
+
+def numbered_sequences(n, start=0):
+    return [f'seq{i}' for i in range(start, start + n)]
+
+@pytest.mark.parametrize('n', [100, 5000, 200000])
+def test_hyperloglog_estimate_within_error(n):
+    sketch = HyperLogLog(precision=14)
+    # every sequence twice, duplicates must not change the estimate
+    for chunk in chunked(numbered_sequences(n) * 2, 50000):
+        sketch.update(chunk)
+    assert abs(sketch.estimate() - n) <= 4 * sketch.relative_error * n + 1
+
+def test_hyperloglog_merge_matches_single_sketch():
+    whole, first, second = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    whole.update(numbered_sequences(30000))
+    first.update(numbered_sequences(20000))
+    second.update(numbered_sequences(20000, start=10000))
+    np.testing.assert_array_equal(first.merge(second).registers, whole.registers)
+    assert first.estimate() == whole.estimate()
+
+def test_hyperloglog_rejects_invalid_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=10)
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(14))
+
+def skewed_sequences(n, seed=0):
+    # Zipf-like counts, so a few sequences are frequent and most are rare
+    rng = np.random.default_rng(seed)
+    return [f'seq{i}' for i in rng.zipf(1.5, size=n)]
+
+def assert_space_saving_bounds(sketch, sequences):
+    counts = Counter(sequences)
+    assert sketch.max_error <= len(sequences) / sketch.capacity
+    for sequence, (count, error) in sketch.items.items():
+        assert count - error <= counts[sequence] <= count
+    # every sequence more frequent than the bound on the overestimates is tracked
+    for sequence, count in counts.items():
+        if count > len(sequences) / sketch.capacity:
+            assert sequence in sketch.items
+
+def test_space_saving_bounds():
+    sequences = skewed_sequences(20000)
+    sketch = SpaceSaving(capacity=100)
+    for chunk in chunked(sequences, 1000):
+        sketch.update(chunk)
+    assert sketch.truncated
+    assert len(sketch.items) <= 100
+    assert_space_saving_bounds(sketch, sequences)
+
+def test_space_saving_merge_bounds():
+    sequences = skewed_sequences(20000)
+    sketches = []
+    for chunk in chunked(sequences, 5000):
+        sketch = SpaceSaving(capacity=100)
+        for part in chunked(chunk, 500):
+            sketch.update(part)
+        sketches.append(sketch)
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    assert merged.n_sequences == len(sequences)
+    assert_space_saving_bounds(merged, sequences)
+
+def test_space_saving_exact_without_truncation():
+    sequences = skewed_sequences(2000)
+    sketch = SpaceSaving(capacity=len(set(sequences)))
+    for chunk in chunked(sequences, 100):
+        sketch.update(chunk)
+    assert not sketch.truncated
+    assert sketch.max_error == 0
+    assert sketch.top(min_count=2) == {s: c for s, c in sorted(Counter(sequences).items(), key=lambda item: (-item[1], item[0])) if c >= 2}
+
+def rank_errors(sketch, values, quantiles):
+    """
+    Differences between the requested quantiles and the ranks of the estimated quantiles among the values.
+    """
+    values = np.sort(values)
+    ranks = np.searchsorted(values, sketch.quantile(quantiles), side='right') / len(values)
+    return np.abs(ranks - quantiles)
+
+QUANTILES = np.array([0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999])
+
+def test_tdigest_quantiles():
+    values = np.random.default_rng(0).lognormal(size=100000)
+    sketch = TDigest(compression=200)
+    for chunk in np.array_split(values, 20):
+        sketch.update(chunk)
+    assert len(sketch.values) <= 200
+    assert sketch.n == len(values)
+    assert sketch.min == values.min() and sketch.max == values.max()
+    assert rank_errors(sketch, values, QUANTILES).max() < 0.01
+    assert sketch.quantile(0) == values.min() and sketch.quantile(1) == values.max()
+
+def test_tdigest_merge():
+    values = np.random.default_rng(1).normal(size=100000)
+    sketches = []
+    for chunk in np.array_split(values, 8):
+        sketch = TDigest()
+        sketch.update(chunk)
+        sketches.append(sketch)
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    assert merged.n == len(values)
+    assert merged.min == values.min() and merged.max == values.max()
+    assert rank_errors(merged, values, QUANTILES).max() < 0.01
+    assert merged.merge(TDigest()).n == len(values)
+
+def test_tdigest_weights():
+    values = np.arange(100, dtype=np.float64)
+    weighted, repeated = TDigest(), TDigest()
+    weighted.update(values, np.full(100, 3))
+    repeated.update(np.repeat(values, 3))
+    assert weighted.n == repeated.n == 300
+    np.testing.assert_allclose(weighted.quantile(QUANTILES), repeated.quantile(QUANTILES), atol=1)
+
+def test_integer_histogram_quantiles():
+    values = np.random.default_rng(0).integers(50, 300, size=10001)
+    histogram = IntegerHistogram()
+    for chunk in np.array_split(values, 7):
+        histogram.update(chunk)
+    assert histogram.n == len(values)
+    assert histogram.min == values.min() and histogram.max == values.max()
+    np.testing.assert_allclose(histogram.quantile(QUANTILES), np.percentile(values, QUANTILES * 100))
+    # as many evenly spaced quantiles as values give the values themselves
+    np.testing.assert_array_equal(histogram.quantile(np.linspace(0, 1, len(values))), np.sort(values))
+
+def test_integer_histogram_merge():
+    values = np.random.default_rng(1).integers(0, 1000, size=5000)
+    whole, first, second = IntegerHistogram(), IntegerHistogram(), IntegerHistogram()
+    whole.update(values)
+    first.update(values[:1234])
+    second.update(values[1234:], np.ones(len(values) - 1234))
+    first.merge(second)
+    np.testing.assert_array_equal(first.values, whole.values)
+    np.testing.assert_array_equal(first.weights, whole.weights)
+    np.testing.assert_allclose(first.quantile(QUANTILES), np.percentile(values, QUANTILES * 100))
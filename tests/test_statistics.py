@@ -0,0 +1,154 @@
+import functools
+import itertools
+
+import numpy as np
+import pytest
+
+from genbenchQC.utils import accumulator, parallel, statistics
+from genbenchQC.utils.statistics import SequenceStatistics, accumulate_together
+from genbenchQC.utils.concatenation import concatenate_sequences
+from genbenchQC.utils.encoding import SequenceBatch, iter_sequence_chunks
+from genbenchQC.utils.testing import flag_significant_differences
+from tests.helpers import random_sequences, chunked, assert_statistics_equal
+
+@pytest.fixture
+def sequences():
+    return random_sequences(500, alphabet='ACGTN', n_duplicates=30)
+
+def compute(sequences, **kwargs):
+    return SequenceStatistics(sequences, 'sequences.fasta', 'label', **kwargs).compute()
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'kmer_sizes': [2, 8]},
+    {'skip_stats': ['per_sequence_dinucleotide_content', 'per_position_nucleotide_content']},
+    {'max_sequences_for_distributions': 100, 'sampling_seed': 3},
+])
+def test_numpy_engine_matches_python_engine(sequences, options):
+    python_stats, python_end = compute(sequences, engine='python', **options)
+    numpy_stats, numpy_end = compute(sequences, engine='numpy', **options)
+    assert python_end == numpy_end
+    assert_statistics_equal(python_stats, numpy_stats)
+
+def test_python_engine_counts_positions_in_chunks(sequences, monkeypatch):
+    expected, _ = compute(sequences, engine='numpy')
+    monkeypatch.setattr(statistics, 'iter_sequence_chunks', functools.partial(iter_sequence_chunks, max_bases=100))
+    chunked_stats, _ = compute(sequences, engine='python')
+    for name in ['Per position nucleotide content', 'Per position reversed nucleotide content']:
+        assert_statistics_equal({name: expected[name]}, {name: chunked_stats[name]})
+
+@pytest.mark.parametrize('options', [{}, {'kmer_sizes': [3]}, {'max_sequences_for_distributions': 100}])
+def test_numpy_engine_counts_in_chunks(sequences, monkeypatch, options):
+    expected, _ = compute(sequences, engine='numpy', **options)
+    monkeypatch.setattr(accumulator, 'iter_sequence_chunks', functools.partial(iter_sequence_chunks, max_bases=100))
+    chunked_stats, _ = compute(sequences, engine='numpy', **options)
+    assert_statistics_equal(expected, chunked_stats)
+
+def test_many_symbols():
+    # pairs of 20 symbols do not fit the int8 codes
+    sequences = random_sequences(200, alphabet='ACDEFGHIKLMNPQRSTVWY', seed=2)
+    assert_statistics_equal(compute(sequences, engine='python')[0], compute(sequences, engine='numpy')[0])
+
+def test_batch_matches_list(sequences):
+    assert_statistics_equal(compute(sequences, engine='numpy')[0], compute(SequenceBatch.from_sequences(sequences), engine='numpy')[0])
+
+def test_checks_match_python_engine():
+    datasets = [random_sequences(400, alphabet='ACGTN', seed=5), random_sequences(300, max_length=50, seed=6)]
+    results = {}
+    for engine in ['python', 'numpy']:
+        first, second = [SequenceStatistics(sequences, 'sequences.fasta', 'label', engine=engine) for sequences in datasets]
+        first.compute()
+        second.compute()
+        assert first.stats['Per sequence nucleotide content'].dtypes.unique().tolist() == [np.float64]
+        results[engine] = flag_significant_differences(first.duplicates, first.stats, second.duplicates, second.stats,
+                                                        threshold=0.015, kmer_threshold=0.01, end_position=30)
+    # the checks see the same float64 values with both engines, only the order of the bases differs
+    assert normalized(results['numpy']) == normalized(results['python'])
+
+def normalized(value):
+    if isinstance(value, dict):
+        return sorted((str(key), normalized(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [normalized(item) for item in value]
+    return repr(value)
+
+def test_rejects_unknown_engine(sequences):
+    with pytest.raises(ValueError):
+        SequenceStatistics(sequences, 'sequences.fasta', 'label', engine='fortran')
+
+def test_rejects_unsupported_kmer_sizes(sequences):
+    with pytest.raises(ValueError):
+        SequenceStatistics(sequences, 'sequences.fasta', 'label', kmer_sizes=[3, 13])
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 10000])
+def test_streaming_matches_in_memory(sequences, chunk_size):
+    options = {'kmer_sizes': [3], 'max_sequences_for_distributions': 200}
+    expected, _ = compute(sequences, engine='numpy', **options)
+    streamed, _ = SequenceStatistics.from_chunks(chunked(sequences, chunk_size), 'sequences.fasta', 'label', **options).compute()
+    assert_statistics_equal(expected, streamed)
+
+# sketched distributions depend on how the sequences are split among the workers, see test_sketches.py for their bounds
+@pytest.mark.parametrize('options', [{}, {'kmer_sizes': [3]}, {'max_sequences_for_distributions': 100}])
+def test_workers_match_single_worker(sequences, options):
+    single, _ = compute(sequences, engine='numpy', workers=1, **options)
+    parallel, _ = compute(sequences, engine='numpy', workers=3, **options)
+    assert_statistics_equal(single, parallel)
+
+@pytest.mark.parametrize('options', [{}, {'approximate_duplicates': True}])
+def test_workers_feed_shared_memory_in_parts(sequences, monkeypatch, options):
+    single, _ = compute(sequences, engine='numpy', **options)
+    # parts of about 3 * 4 * 100 bases, each copied to its own shared memory block
+    monkeypatch.setattr(parallel, 'CHUNK_BASES', 100)
+    parallel_stats, _ = compute(sequences, engine='numpy', workers=3, **options)
+    assert_statistics_equal(single, parallel_stats)
+
+def test_streaming_workers_match_single_worker(sequences):
+    single, _ = SequenceStatistics.from_chunks(chunked(sequences, 100), 'sequences.fasta', 'label').compute()
+    parallel, _ = SequenceStatistics.from_chunks(chunked(sequences, 100), 'sequences.fasta', 'label', workers=3).compute()
+    assert_statistics_equal(single, parallel)
+
+def test_sampled_distributions(sequences):
+    stats, _ = compute(sequences, engine='numpy', max_sequences_for_distributions=100)
+    assert len(stats['Sequence lengths']) == 100
+    assert stats['Number of sequences'] == len(sequences)
+    other_seed, _ = compute(sequences, engine='numpy', max_sequences_for_distributions=100, sampling_seed=1)
+    assert not stats['Sequence lengths'].equals(other_seed['Sequence lengths'])
+
+def test_sketched_distributions_approximate_exact_ones(sequences):
+    exact, _ = compute(sequences, engine='numpy')
+    sketched, _ = compute(sequences, engine='numpy', sketch_distributions=True)
+    assert set(sketched.pop('Distribution sketches')) == {'Per sequence nucleotide content', 'Per sequence dinucleotide content',
+                                                          'Per sequence GC content', 'Sequence lengths'}
+    assert_statistics_equal(exact, sketched, ignore=['Per sequence nucleotide content', 'Per sequence dinucleotide content',
+                                                      'Per sequence GC content', 'Sequence lengths'])
+    # lengths are summarized by an exact histogram, contents by t-digests
+    assert sorted(sketched['Sequence lengths'].iloc[:, 0]) == sorted(exact['Sequence lengths'].iloc[:, 0])
+    quantiles = [10, 25, 50, 75, 90]
+    np.testing.assert_allclose(np.percentile(sketched['Per sequence GC content'], quantiles),
+                               np.percentile(exact['Per sequence GC content'], quantiles), atol=2)
+
+@pytest.mark.parametrize('options', [{}, {'kmer_sizes': [2]}, {'max_sequences_for_distributions': 100}])
+def test_from_columns_matches_concatenated_sequences(options):
+    columns = [random_sequences(300, alphabet='ACGTN', seed=seed) for seed in range(3)]
+    column_statistics = [SequenceStatistics(column, 'pairs.csv', 'label', engine='numpy', **options) for column in columns]
+    for column in column_statistics:
+        column.compute()
+    derived, _ = SequenceStatistics.from_columns(column_statistics, columns, 'pairs.csv', 'label', engine='numpy', **options).compute()
+    expected, _ = compute(concatenate_sequences(columns), engine='numpy', **options)
+    assert_statistics_equal(expected, derived, ignore=['Filename'])
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_accumulate_together_matches_separate_streams(workers):
+    options = {'kmer_sizes': [3], 'max_sequences_for_distributions': 100, 'workers': workers}
+    groups = [random_sequences(300, alphabet='ACGTN', n_duplicates=20, seed=seed) for seed in range(2)]
+    # sequences shared by the groups, each occurring in only one of them before the other
+    groups[0] += groups[1][:5]
+    groups[1] += groups[0][:5]
+    separate = [SequenceStatistics.from_chunks(chunked(group, 50), 'sequences.csv', label, **options) for label, group in enumerate(groups)]
+    together = [SequenceStatistics.from_chunks(None, 'sequences.csv', label, **options) for label in range(2)]
+    # the first group has no sequences in the last chunks
+    accumulate_together(together, itertools.zip_longest(chunked(groups[0], 50), chunked(groups[1], 30)))
+    for expected, streamed in zip(separate, together):
+        assert_statistics_equal(expected.compute()[0], streamed.compute()[0])
+    # the text of each shared sequence is kept by the group seeing it second
+    assert sorted(together[0].duplicates.shared_sequences(together[1].duplicates)) == sorted(set(groups[0]) & set(groups[1]))
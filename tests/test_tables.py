@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from genbenchQC.utils.tables import compact_counts, CountTable, LazyStatistics
+
+@pytest.mark.parametrize('max_value, dtype', [(0, np.uint16), (65535, np.uint16), (65536, np.uint32), (2 ** 32, np.uint64)])
+def test_compact_counts_dtype(max_value, dtype):
+    counts = compact_counts(np.array([0, max_value], dtype=np.int64))
+    assert counts.dtype == dtype
+    assert counts.tolist() == [0, max_value]
+
+def test_count_table_values():
+    counts = np.array([[1, 3], [2, 2], [0, 0]], dtype=np.int64)
+    lengths = np.array([4, 8, 0])
+    np.testing.assert_allclose(CountTable(counts, ['A', 'C'], totals='rows').values(np.float64)[:2], [[0.25, 0.75], [0.5, 0.5]])
+    np.testing.assert_allclose(CountTable(counts, ['A', 'C'], totals=lengths, scale=100).values(np.float64)[:2], [[25, 75], [25, 25]])
+    np.testing.assert_array_equal(CountTable(counts, ['A', 'C']).values(np.float64), counts)
+    assert CountTable(counts, ['A', 'C']).counts.dtype == np.uint16
+
+def test_lazy_statistics_derive_frames():
+    table = CountTable(np.array([[1, 3], [2, 2]]), ['A', 'C'], totals='rows')
+    stats = LazyStatistics({'Table': table, 'Number of sequences': 2})
+    frame = stats['Table']
+    assert isinstance(frame, pd.DataFrame)
+    assert list(frame.columns) == ['A', 'C']
+    assert stats.raw('Table') is table
+    assert stats['Number of sequences'] == 2
+    # frames are built on every access, so modifying one does not change the statistic
+    frame['A'] = 0
+    assert stats['Table']['A'].tolist() == [0.25, 0.5]